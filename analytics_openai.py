@@ -0,0 +1,564 @@
+import re
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from cache_openai import normalize_question
+from utils_openai import format_currency
+from sketches_openai import distinct_count, DatasetSketch, LOW_CARDINALITY
+
+# Quantidade de valores guardados nas listas de mais/menos frequentes
+TOP_K = 5
+
+# Aproximação usada para converter o orçamento de tokens do contexto em caracteres
+CHARS_PER_TOKEN = 4
+
+# Linhas da prévia exibida em cada aba de "Dados Carregados"
+PREVIEW_ROWS = 10
+
+# Colunas monetárias e de quantidade, que devem ser numéricas após a carga
+MONEY_PREFIXES = ('valor', 'preco', 'preço')
+NUMERIC_NAMES = ('quantidade',)
+
+# Intenções respondidas localmente, na ordem em que são testadas.
+# As expressões rodam sobre a pergunta normalizada (sem acentos, minúscula).
+INTENT_PATTERNS = [
+    ('top_suppliers', re.compile(
+        r'fornecedor.*\b(maior|maiores|top|principais)\b.*\b(montante|valor|recebid\w*|vendas)\b'
+        r'|\b(maior|maiores|top|principais)\b.*\bfornecedor')),
+    ('top_products', re.compile(
+        r'produtos? mais (vendidos?|comprados?)|produto.*\b(maior|maiores|top|principais)\b.*\b(valor|quantidade)\b'
+        r'|\b(maior|maiores|top|principais)\b.*\bprodutos?\b')),
+    ('total_value', re.compile(
+        r'soma total|total de todos os valores|valor total (das|de todas as) notas')),
+    ('dtypes', re.compile(r'\btipos? (de )?dados\b|\btipo de cada (coluna|variavel)')),
+    ('range', re.compile(r'\bintervalo\b|\bminimo\b.*\bmaximo\b')),
+    ('central', re.compile(r'tendencia central|\bmedia\b.*\bmediana\b')),
+    ('variability', re.compile(r'variabilidade|desvio padrao|\bvariancia\b')),
+    ('frequent', re.compile(r'\bmais frequentes?\b|\bmenos frequentes?\b|\bmoda\b')),
+    ('correlation', re.compile(r'\bcorrelac')),
+    ('outliers', re.compile(r'^(existem|existe|quais|quantos|ha)\b.*\b(atipicos?|outliers?)\b')),
+    ('distribution', re.compile(r'distribuicao de cada (variavel|coluna)|\bhistogramas?\b')),
+]
+
+# Palavras aceitas em qualquer pergunta respondida localmente
+COMMON_WORDS = {
+    'qual', 'quais', 'e', 'o', 'a', 'os', 'as', 'sao', 'de', 'do', 'da', 'dos', 'das', 'no', 'na', 'nos', 'nas',
+    'um', 'uma', 'que', 'com', 'ou', 'cada', 'ha', 'existe', 'existem', 'quantos', 'quantas', 'dados',
+    'variavel', 'variaveis', 'coluna', 'colunas',
+}
+
+# Vocabulário de cada intenção: as palavras das perguntas padrão (get_sample_questions) e dos
+# sinônimos das expressões acima. Qualquer outra palavra (produto, coluna, ano, outro N, "por",
+# "so", "para"...) pode pedir filtro ou agrupamento que a resposta pré-calculada ignora, e a
+# pergunta vai para o LLM. Os rankings locais mostram 5 linhas.
+INTENT_WORDS = {
+    'top_suppliers': {'fornecedor', 'fornecedores', 'maior', 'maiores', 'top', 'principais', 'montante', 'valor',
+                      'total', 'recebido', 'vendas', 'volume', 'teve', 'cnpj', '5'},
+    'top_products': {'produto', 'produtos', 'mais', 'vendido', 'vendidos', 'comprado', 'comprados', 'maior',
+                     'maiores', 'top', 'principais', 'valor', 'quantidade', '5'},
+    'total_value': {'soma', 'total', 'todos', 'todas', 'valor', 'valores', 'nota', 'notas', 'fiscal', 'fiscais'},
+    'dtypes': {'tipo', 'tipos', 'numericos', 'categoricos'},
+    'range': {'intervalo', 'minimo', 'maximo'},
+    'central': {'medida', 'medidas', 'tendencia', 'central', 'media', 'mediana'},
+    'variability': {'variabilidade', 'desvio', 'padrao', 'variancia'},
+    'frequent': {'valor', 'valores', 'mais', 'menos', 'frequente', 'frequentes', 'moda'},
+    'correlation': {'correlacao', 'entre'},
+    'outliers': {'valor', 'valores', 'atipico', 'atipicos', 'outlier', 'outliers'},
+    'distribution': {'distribuicao', 'distribuicoes', 'histograma', 'histogramas'},
+}
+
+
+def _column_kind(series: pd.Series) -> str:
+    """Classifica a coluna em numérica, data, categórica ou texto"""
+    if pd.api.types.is_bool_dtype(series):
+        return 'categorical'
+    if pd.api.types.is_numeric_dtype(series):
+        return 'numeric'
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return 'datetime'
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return 'categorical'
+    return 'text'
+
+
+def build_profile(df: pd.DataFrame) -> dict:
+    """
+    Calcula, uma única vez no carregamento, as estatísticas usadas pelas respostas locais
+
+    Args:
+        df: DataFrame carregado
+
+    Returns:
+        dict: 'rows', 'columns' (estatísticas por coluna), 'correlation',
+            'valor_total' e 'top_suppliers'
+    """
+    profile = {'rows': len(df), 'columns': {}, 'correlation': None, 'valor_total': None, 'top_suppliers': None}
+
+    for col in df.columns:
+        series = df[col]
+        kind = _column_kind(series)
+        stats = {'dtype': str(series.dtype), 'kind': kind, 'nulls': int(series.isna().sum())}
+
+        if kind == 'numeric':
+            values = series.dropna().astype(float)
+            if len(values):
+                q1, median, q3 = np.percentile(values.to_numpy(), [25, 50, 75])
+                iqr = q3 - q1
+                stats.update({
+                    'min': float(values.min()), 'max': float(values.max()),
+                    'mean': float(values.mean()), 'median': float(median),
+                    'std': float(values.std()), 'var': float(values.var()),
+                    'q1': float(q1), 'q3': float(q3),
+                    'outliers': int(((values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)).sum())
+                })
+            # Colunas numéricas grandes usam HyperLogLog em vez da contagem exata de distintos
+            stats['distinct'], stats['distinct_approx'] = distinct_count(series)
+        elif kind == 'datetime':
+            stats.update({'min': series.min(), 'max': series.max()})
+
+        if kind != 'numeric' or stats['distinct'] <= LOW_CARDINALITY:
+            counts = series.value_counts(dropna=True)
+            stats['distinct'], stats['distinct_approx'] = int(len(counts)), False
+            stats['top_values'] = list(counts.head(TOP_K).items())
+            stats['bottom_values'] = list(counts.tail(TOP_K).items())[::-1]
+
+        profile['columns'][col] = stats
+
+    numeric = df.select_dtypes(include='number')
+    if numeric.shape[1] >= 2:
+        profile['correlation'] = numeric.corr()
+
+    columns = {str(col).lower(): col for col in df.columns}
+    if 'valor_total' in columns and pd.api.types.is_numeric_dtype(df[columns['valor_total']]):
+        value_col = columns['valor_total']
+        profile['valor_total'] = float(df[value_col].sum())
+
+        supplier_cols = [columns[name] for name in ('nome_fornecedor', 'cnpj_fornecedor') if name in columns]
+        if supplier_cols:
+            ranking = (df.groupby(supplier_cols, observed=True, dropna=False)[value_col]
+                       .agg(['sum', 'count'])
+                       .sort_values('sum', ascending=False)
+                       .head(10))
+            profile['top_suppliers'] = ranking.reset_index()
+
+    return profile
+
+
+def build_dataset_summary(df: pd.DataFrame, total_rows: Optional[int] = None,
+                          sketch: Optional[DatasetSketch] = None) -> dict:
+    """
+    Resumo de um arquivo para a interface, calculado uma vez no carregamento
+
+    Args:
+        df: DataFrame carregado (ou a amostra, para arquivos fora de memória)
+        total_rows: Linhas do arquivo completo, quando df é só uma amostra
+        sketch: Sketches do arquivo completo; as somas saem deles quando df é uma amostra
+
+    Returns:
+        dict: 'rows', 'columns', 'preview' (primeiras linhas), 'sample' (df é amostra),
+            'totals' (soma exata de cada coluna monetária numérica) e 'dtype_warnings'
+            (colunas monetárias ou de quantidade que ficaram como texto)
+    """
+    sample = total_rows is not None
+    summary = {
+        'rows': total_rows if sample else len(df),
+        'columns': df.shape[1],
+        'preview': df.head(PREVIEW_ROWS).copy(),
+        'sample': sample,
+        'totals': {},
+        'dtype_warnings': [],
+    }
+    for col in df.columns:
+        name = str(col).lower()
+        money = name.startswith(MONEY_PREFIXES)
+        if not money and name not in NUMERIC_NAMES:
+            continue
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            summary['dtype_warnings'].append(col)
+        elif money:
+            # A soma da amostra não vale para o arquivo: usa o total acumulado nos sketches
+            column = sketch.columns.get(col) if sample and sketch is not None else None
+            if not sample:
+                summary['totals'][col] = float(df[col].sum())
+            elif column is not None and column.numeric:
+                summary['totals'][col] = float(column.total)
+    return summary
+
+
+def _compact(value) -> str:
+    """Formata um valor de forma curta para o contexto enviado ao LLM"""
+    if isinstance(value, (float, np.floating)):
+        return str(int(value)) if float(value).is_integer() and abs(value) < 1e15 else f"{value:.6g}"
+    text = str(value)
+    return text if len(text) <= 30 else text[:27] + '...'
+
+
+def _column_context(col, stats: dict, rows: int) -> str:
+    """Uma linha com tipo, nulos, faixa, distintos e valores mais comuns da coluna"""
+    parts = [f"- {col} [{stats['dtype']}]"]
+    if rows and stats['nulls']:
+        parts.append(f"nulos {stats['nulls'] / rows:.1%}")
+    if 'min' in stats:
+        parts.append(f"min {_compact(stats['min'])} máx {_compact(stats['max'])}")
+    if 'mean' in stats:
+        parts.append(f"média {_compact(stats['mean'])} mediana {_compact(stats['median'])}")
+    if 'distinct' in stats:
+        parts.append(f"{'~' if stats.get('distinct_approx') else ''}{stats['distinct']} distintos")
+    if stats.get('top_values') and stats['distinct'] < rows:
+        top = ', '.join(f"{_compact(value)} ({count / rows:.0%})" for value, count in stats['top_values'][:3])
+        parts.append(f"top: {top}")
+    return ' | '.join(parts)
+
+
+def build_context_block(profiles: dict, max_tokens: int = 1200) -> str:
+    """
+    Serializa os perfis dos dados num bloco de texto compacto para o prompt do agente
+
+    Cada arquivo recebe uma parte igual do orçamento. As colunas entram com estatísticas
+    enquanto couberem, depois apenas com nome e tipo, e o restante é resumido numa contagem.
+
+    Args:
+        profiles: Perfis por tipo de arquivo (ver build_profile)
+        max_tokens: Orçamento aproximado de tokens do bloco
+
+    Returns:
+        str: Bloco de contexto
+    """
+    budget = max_tokens * CHARS_PER_TOKEN // max(len(profiles), 1)
+    blocks = []
+
+    for name, profile in profiles.items():
+        rows = profile['rows']
+        lines = [f"- {str(name).title()}: {rows} registros, {len(profile['columns'])} colunas"]
+        if profile['valor_total'] is not None:
+            lines.append(f"  Soma de valor_total: {_compact(profile['valor_total'])}")
+        used = sum(len(line) + 1 for line in lines)
+
+        columns = list(profile['columns'].items())
+        detailed = 0
+        for col, stats in columns:
+            line = '  ' + _column_context(col, stats, rows)
+            if used + len(line) + 1 > budget:
+                break
+            lines.append(line)
+            used += len(line) + 1
+            detailed += 1
+
+        # Colunas que não couberam com estatísticas entram só com nome e tipo
+        short = []
+        for col, stats in columns[detailed:]:
+            item = f"{col} [{stats['dtype']}]"
+            if used + len(item) + 2 > budget:
+                break
+            short.append(item)
+            used += len(item) + 2
+        if short:
+            lines.append(f"  Outras colunas: {', '.join(short)}")
+        remaining = len(columns) - detailed - len(short)
+        if remaining:
+            lines.append(f"  ... e mais {remaining} colunas")
+
+        blocks.append('\n'.join(lines))
+
+    return '\n'.join(blocks)
+
+
+def _percent(value: float) -> str:
+    """Percentual com uma casa decimal no padrão brasileiro"""
+    return f"{value:.1%}".replace('.', ',')
+
+
+def build_sketch_profile(sketch: DatasetSketch) -> dict:
+    """
+    Converte os sketches de um arquivo no mesmo formato de build_profile (modo aproximado)
+
+    Contagens, mínimo, máximo, média, desvio e soma são exatos; quantis e atípicos vêm do
+    t-digest, distintos do HyperLogLog, mais frequentes do Count-Min e correlação da amostra.
+
+    Args:
+        sketch: Sketches do arquivo
+
+    Returns:
+        dict: Perfil com 'approximate' e 'error_bounds' (texto com as margens de erro)
+    """
+    profile = {'rows': sketch.rows, 'columns': {}, 'correlation': None, 'valor_total': None,
+               'top_suppliers': None, 'approximate': True}
+
+    for col, column in sketch.columns.items():
+        # O tipo final (após optimize_dtypes) prevalece: códigos numéricos podem virar categoria
+        kind = 'categorical' if column.dtype == 'category' else 'numeric' if column.numeric else 'text'
+        stats = {'dtype': column.dtype, 'kind': kind, 'nulls': column.nulls,
+                 'distinct': column.hll.count(), 'distinct_approx': True}
+
+        if kind == 'numeric' and column.count:
+            digest = column.digest
+            q1, median, q3 = (digest.quantile(q) for q in (0.25, 0.5, 0.75))
+            iqr = q3 - q1
+            var = column.m2 / (column.count - 1) if column.count > 1 else 0.0
+            outside = digest.cdf(q1 - 1.5 * iqr) + 1 - digest.cdf(q3 + 1.5 * iqr)
+            stats.update({
+                'min': digest.min, 'max': digest.max, 'mean': column.mean, 'median': median,
+                'std': float(np.sqrt(var)), 'var': var, 'q1': q1, 'q3': q3,
+                'outliers': int(round(outside * column.count))
+            })
+
+        if kind != 'numeric' or stats['distinct'] <= LOW_CARDINALITY:
+            stats['top_values'] = column.frequent.top_k(TOP_K)
+            # O Count-Min não identifica os menos frequentes
+            stats['bottom_values'] = []
+
+        profile['columns'][col] = stats
+
+    sample = sketch.reservoir.sample
+    if sample is not None:
+        numeric = sample[[col for col, stats in profile['columns'].items() if stats['kind'] == 'numeric']]
+        if numeric.shape[1] >= 2:
+            profile['correlation'] = numeric.corr()
+
+    columns = {str(col).lower(): col for col in sketch.columns}
+    if 'valor_total' in columns and sketch.columns[columns['valor_total']].numeric:
+        profile['valor_total'] = sketch.columns[columns['valor_total']].total
+
+    bounds = []
+    digest = next((column.digest for column in sketch.columns.values() if column.numeric), None)
+    if digest is not None:
+        bounds.append(f"quantis, mediana e atípicos com erro típico de posto abaixo de "
+                      f"{_percent(1 / digest.compression)} (t-digest, δ={digest.compression})")
+    column = next(iter(sketch.columns.values()), None)
+    if column is not None:
+        bounds.append(f"distintos ±{_percent(1.04 / np.sqrt(column.hll.m))}")
+        bounds.append(f"frequências superestimadas em no máximo {_percent(column.frequent.epsilon)} do total "
+                      f"com {1 - column.frequent.delta:.0%} de confiança")
+    bounds.append(f"correlação sobre amostra aleatória de {0 if sample is None else len(sample)} linhas")
+    profile['error_bounds'] = '; '.join(bounds)
+    return profile
+
+
+def classify_intent(question: str) -> Optional[str]:
+    """
+    Identifica se a pergunta corresponde a uma análise padrão respondida localmente
+
+    A expressão da intenção precisa casar e todas as palavras da pergunta precisam estar no
+    vocabulário dela: "Qual o maior fornecedor de parafusos em 2023?" casa com top_suppliers,
+    mas pede um filtro, então vai para o LLM.
+
+    Args:
+        question: Pergunta do usuário
+
+    Returns:
+        str: Nome da intenção ou None para perguntas abertas (que vão para o LLM)
+    """
+    normalized = normalize_question(question)
+    words = set(re.findall(r'\w+', normalized))
+    for intent, pattern in INTENT_PATTERNS:
+        if pattern.search(normalized):
+            return intent if words <= COMMON_WORDS | INTENT_WORDS[intent] else None
+    return None
+
+
+def _format_number(value) -> str:
+    """Formata números no padrão brasileiro para as tabelas"""
+    if isinstance(value, (int, np.integer)):
+        return f"{value:,}".replace(",", ".")
+    if isinstance(value, (float, np.floating)):
+        return f"{value:,.4f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    return str(value)
+
+
+def _stats_table(profile: dict, keys: list, labels: list, kinds: tuple = ('numeric',)) -> Optional[str]:
+    """Monta uma tabela markdown com as estatísticas escolhidas de cada coluna"""
+    rows = []
+    for col, stats in profile['columns'].items():
+        if stats['kind'] in kinds and all(key in stats for key in keys):
+            rows.append([col] + [_format_number(stats[key]) for key in keys])
+    if not rows:
+        return None
+    return pd.DataFrame(rows, columns=['Coluna'] + labels).to_markdown(index=False)
+
+
+def _answer_dtypes(profile: dict) -> str:
+    """Tipo de cada coluna e sua classificação"""
+    labels = {'numeric': 'Numérico', 'datetime': 'Data', 'categorical': 'Categórico', 'text': 'Texto/Categórico'}
+    table = pd.DataFrame(
+        [[col, stats['dtype'], labels[stats['kind']]] for col, stats in profile['columns'].items()],
+        columns=['Coluna', 'Tipo (pandas)', 'Classificação']
+    ).to_markdown(index=False)
+    numeric = sum(1 for stats in profile['columns'].values() if stats['kind'] == 'numeric')
+    return f"{numeric} coluna(s) numérica(s) e {len(profile['columns']) - numeric} não numérica(s).\n\n{table}"
+
+
+def _answer_frequent(profile: dict) -> Optional[str]:
+    """Valores mais e menos frequentes das colunas categóricas e de baixa cardinalidade"""
+    parts = []
+    for col, stats in profile['columns'].items():
+        if not stats.get('top_values'):
+            continue
+        top = ', '.join(f"{value} ({count})" for value, count in stats['top_values'])
+        bottom = ', '.join(f"{value} ({count})" for value, count in stats['bottom_values'])
+        parts.append(f"- **{col}** — mais frequentes: {top}" + (f"; menos frequentes: {bottom}" if bottom else ''))
+    return '\n'.join(parts) if parts else None
+
+
+def _answer_correlation(profile: dict) -> Optional[str]:
+    """Pares com maior correlação e código do mapa de calor"""
+    corr = profile['correlation']
+    if corr is None:
+        return None
+    pairs = corr.where(np.triu(np.ones(corr.shape, dtype=bool), k=1)).stack().dropna()
+    pairs = pairs.reindex(pairs.abs().sort_values(ascending=False).index).head(10)
+    lines = [f"- {a} × {b}: {value:.3f}" for (a, b), value in pairs.items()]
+    return ("Pares de variáveis numéricas com maior correlação (Pearson):\n" + '\n'.join(lines) +
+            "\n\n```python\n"
+            "corr = df.select_dtypes(include='number').corr()\n"
+            "plt.figure(figsize=(8, 6))\n"
+            "plt.imshow(corr, cmap='coolwarm', vmin=-1, vmax=1)\n"
+            "plt.colorbar()\n"
+            "plt.xticks(range(len(corr.columns)), corr.columns, rotation=90)\n"
+            "plt.yticks(range(len(corr.columns)), corr.columns)\n"
+            "plt.tight_layout()\n"
+            "```")
+
+
+def _answer_outliers(profile: dict) -> Optional[str]:
+    """Contagem de valores atípicos por coluna e código do boxplot"""
+    table = _stats_table(profile, ['q1', 'q3', 'outliers'], ['Q1', 'Q3', 'Valores atípicos (1,5×IQR)'])
+    if table is None:
+        return None
+    return (f"Valores atípicos pelo critério do intervalo interquartil:\n\n{table}\n\n```python\n"
+            "num = df.select_dtypes(include='number')\n"
+            "plt.figure(figsize=(10, 5))\n"
+            "plt.boxplot([num[c].dropna() for c in num.columns])\n"
+            "plt.xticks(range(1, len(num.columns) + 1), num.columns, rotation=90)\n"
+            "plt.tight_layout()\n"
+            "```")
+
+
+def _answer_distribution(profile: dict) -> Optional[str]:
+    """Quartis por coluna e código dos histogramas"""
+    table = _stats_table(profile, ['min', 'q1', 'median', 'q3', 'max'],
+                         ['Mínimo', 'Q1', 'Mediana', 'Q3', 'Máximo'])
+    if table is None:
+        return None
+    return (f"Resumo da distribuição das variáveis numéricas:\n\n{table}\n\n```python\n"
+            "df.select_dtypes(include='number').hist(bins=30, figsize=(12, 8))\n"
+            "plt.tight_layout()\n"
+            "```")
+
+
+def _answer_total_value(profile: dict) -> Optional[str]:
+    """Soma da coluna valor_total"""
+    if profile['valor_total'] is None:
+        return None
+    return f"A soma de valor_total é {format_currency(profile['valor_total'])}."
+
+
+def _answer_top_suppliers(profile: dict) -> Optional[str]:
+    """Ranking dos fornecedores por valor_total"""
+    ranking = profile['top_suppliers']
+    if ranking is None or ranking.empty:
+        return None
+    table = ranking.head(5).copy()
+    leader = ' / '.join(str(value) for value in table.iloc[0, :-2])
+    table['sum'] = table['sum'].map(format_currency)
+    table = table.rename(columns={'sum': 'Valor total', 'count': 'Notas'})
+    return (f"O fornecedor com maior montante é **{leader}** "
+            f"({table.iloc[0]['Valor total']}).\n\n{table.to_markdown(index=False)}")
+
+
+def _answer_invoice_index(intent: str, invoice_index) -> Optional[str]:
+    """Rankings de fornecedores e produtos a partir do índice cabeçalho↔itens (já agregados na carga)"""
+    if intent == 'top_suppliers':
+        ranking = invoice_index.top_suppliers(5)
+        if ranking is None or ranking.empty:
+            return None
+        leader = ranking.index[0]
+        table = ranking.reset_index()
+        for col in ('valor_notas', 'valor_itens'):
+            table[col] = table[col].map(format_currency)
+        table['quantidade'] = table['quantidade'].map(_format_number)
+        text = f"O fornecedor com maior montante é **{leader}** ({table.iloc[0]['valor_notas']})."
+    elif intent == 'top_products':
+        ranking = invoice_index.top_products(5)
+        if ranking is None or ranking.empty:
+            return None
+        table = ranking.reset_index()
+        leader = table.iloc[0]['descricao'] if 'descricao' in table.columns else ranking.index[0]
+        table['valor_total'] = table['valor_total'].map(format_currency)
+        table['quantidade'] = table['quantidade'].map(_format_number)
+        text = f"O produto de maior valor é **{leader}** ({table.iloc[0]['valor_total']})."
+    else:
+        return None
+    return f"{text}\n\n{table.to_markdown(index=False)}"
+
+
+def _answer_single(intent: str, profile: dict) -> Optional[str]:
+    """Resposta de uma intenção para um único DataFrame"""
+    if intent == 'dtypes':
+        return _answer_dtypes(profile)
+    if intent == 'range':
+        return _stats_table(profile, ['min', 'max'], ['Mínimo', 'Máximo'], kinds=('numeric', 'datetime'))
+    if intent == 'central':
+        return _stats_table(profile, ['mean', 'median'], ['Média', 'Mediana'])
+    if intent == 'variability':
+        return _stats_table(profile, ['std', 'var'], ['Desvio padrão', 'Variância'])
+    if intent == 'frequent':
+        return _answer_frequent(profile)
+    if intent == 'correlation':
+        return _answer_correlation(profile)
+    if intent == 'outliers':
+        return _answer_outliers(profile)
+    if intent == 'distribution':
+        return _answer_distribution(profile)
+    if intent == 'total_value':
+        return _answer_total_value(profile)
+    if intent == 'top_suppliers':
+        return _answer_top_suppliers(profile)
+    return None
+
+
+def answer_fast_path(question: str, profiles: dict, invoice_index=None) -> Optional[tuple]:
+    """
+    Responde perguntas padrão de análise exploratória a partir dos perfis pré-calculados
+
+    Args:
+        question: Pergunta do usuário
+        profiles: Perfis (build_profile) por tipo de arquivo
+        invoice_index: Índice cabeçalho↔itens (InvoiceIndex), quando os dois arquivos estão carregados
+
+    Returns:
+        tuple: (resposta em markdown, com código de gráfico entre ``` quando fizer sentido;
+            tipo de arquivo ao qual o gráfico se refere ou None) ou None se a pergunta
+            precisar do LLM
+    """
+    intent = classify_intent(question)
+    if intent is None or not profiles:
+        return None
+
+    # Rankings que cruzam cabeçalho e itens saem do índice, sem refazer o join
+    if invoice_index is not None:
+        answer = _answer_invoice_index(intent, invoice_index)
+        if answer is not None:
+            return answer, None
+
+    answers = []
+    chart = None
+    chart_file_type = None
+    for file_type, profile in profiles.items():
+        answer = _answer_single(intent, profile)
+        if answer is None:
+            continue
+        # Só um gráfico é exibido pela interface; os demais blocos de código são descartados
+        if '```' in answer:
+            text, code = answer.split('```', 1)
+            if chart is None:
+                chart, chart_file_type = '```' + code, file_type
+            answer = text.strip()
+        if profile.get('approximate'):
+            answer += f"\n\n_Valores aproximados (modo sketch): {profile['error_bounds']}._"
+        answers.append(f"**{file_type.title()}**\n\n{answer}" if len(profiles) > 1 else answer)
+
+    if not answers:
+        return None
+    return '\n\n'.join(answers) + (f"\n\n{chart}" if chart else ''), chart_file_type
@@ -0,0 +1,128 @@
+import asyncio
+import os
+import random
+from typing import Awaitable, Callable, Optional
+
+
+# Status HTTP que indicam falha transitória (limite de requisições ou indisponibilidade)
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def batch_settings_from_env() -> dict:
+    """
+    Lê BATCH_CONCURRENCY, BATCH_MAX_RETRIES e BATCH_RETRY_BASE_SECONDS
+
+    Returns:
+        dict: Configuração padrão do modo de perguntas em lote
+    """
+    return {
+        'concurrency': max(1, int(os.getenv("BATCH_CONCURRENCY", "4"))),
+        'max_retries': max(0, int(os.getenv("BATCH_MAX_RETRIES", "3"))),
+        'base_delay': float(os.getenv("BATCH_RETRY_BASE_SECONDS", "1.0")),
+    }
+
+
+def _openai_module():
+    """SDK da OpenAI, importado só quando há um erro a classificar (o import custa ~1s na partida)"""
+    try:
+        import openai
+        return openai
+    except ImportError:
+        return None
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Indica se o erro do LLM é transitório e vale uma nova tentativa
+
+    Args:
+        error: Exceção levantada pela chamada ao modelo
+
+    Returns:
+        bool: True para limite de requisições, timeouts e erros 5xx
+    """
+    openai = _openai_module()
+    if openai is not None and isinstance(error, (openai.RateLimitError, openai.APITimeoutError,
+                                                 openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    return status in RETRYABLE_STATUS or isinstance(error, asyncio.TimeoutError)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Tempo de espera sugerido pelo servidor (cabeçalho Retry-After), se houver"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+async def run_with_retry(call: Callable[[], Awaitable], max_retries: int = 3, base_delay: float = 1.0,
+                         max_delay: float = 30.0) -> tuple:
+    """
+    Executa uma corrotina com novas tentativas e backoff exponencial com jitter
+
+    O Retry-After do servidor, quando informado, é usado como espera mínima.
+
+    Args:
+        call: Função sem argumentos que cria a corrotina a cada tentativa
+        max_retries: Quantidade máxima de novas tentativas
+        base_delay: Espera (s) antes da primeira nova tentativa
+        max_delay: Espera máxima (s) entre tentativas
+
+    Returns:
+        tuple: (resultado, número de tentativas)
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return await call(), attempt
+        except Exception as e:
+            if attempt > max_retries or not is_retryable_error(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+            await asyncio.sleep(max(delay, retry_after_seconds(e) or 0.0))
+
+
+def build_batch_report(batch: dict) -> str:
+    """
+    Monta o relatório consolidado (Markdown) de uma execução em lote
+
+    Args:
+        batch: Resultado de CSVAnalysisAgent.query_batch
+
+    Returns:
+        str: Relatório com resumo, tempos por pergunta e respostas
+    """
+    results = batch['results']
+    serial_seconds = sum(result['seconds'] for result in results)
+    errors = [result for result in results if result['error']]
+    sources = {}
+    for result in results:
+        sources[result['source']] = sources.get(result['source'], 0) + 1
+
+    lines = [
+        "# Relatório de Análise Exploratória",
+        "",
+        f"- Perguntas: {len(results)} ({len(errors)} com erro)",
+        f"- Concorrência: {batch['concurrency']}",
+        f"- Tempo total: {batch['seconds']:.1f}s (soma dos tempos individuais: {serial_seconds:.1f}s)",
+        f"- Origem das respostas: {', '.join(f'{source}: {count}' for source, count in sorted(sources.items()))}",
+        "",
+        "| # | Pergunta | Origem | Tempo (s) | Tentativas |",
+        "|---|---|---|---|---|",
+    ]
+    for i, result in enumerate(results, 1):
+        question = result['question'].replace('|', '\\|')
+        lines.append(f"| {i} | {question} | {result['source']} | {result['seconds']:.2f} | {result['attempts']} |")
+
+    for i, result in enumerate(results, 1):
+        lines += ["", f"## {i}. {result['question']}", ""]
+        lines.append(f"**Erro:** {result['error']}" if result['error'] else result['answer'])
+
+    return "\n".join(lines)
+
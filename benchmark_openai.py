@@ -0,0 +1,1121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks de desempenho do CSV Agent
+
+Uso:
+    python benchmark_openai.py ingest --rows 100000 1000000 5000000
+    python benchmark_openai.py ingest-parallel --files 8 --rows 500000 --workers 1 2 4 8
+    python benchmark_openai.py currency --rows 1000000
+    python benchmark_openai.py batch --questions 29 --concurrency 1 4 8 --latency 0.5
+    python benchmark_openai.py context --rows 100000 --budgets 0 600 1200
+    python benchmark_openai.py sketch --rows 1000000 5000000
+    python benchmark_openai.py join --rows 1000000 --lookups 1000
+    python benchmark_openai.py charts --rows 100000 1000000 --timeout 60
+    python benchmark_openai.py generate --rows 1000000 --encoding latin-1 --output dados/
+    python benchmark_openai.py suite --rows 10000 100000 --output baseline.json
+    python benchmark_openai.py suite --rows 10000 100000 --baseline baseline.json --tolerance 0.25
+    python benchmark_openai.py sessions --sessions 5 --rows 1000000
+    python benchmark_openai.py llm-pool --callers 16 --latency 0.5 --max-concurrency 4
+    python benchmark_openai.py importtime --repeat 3 --budget-ms 2000
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+def generate_items_csv(path: str, rows: int, seed: int = 42) -> str:
+    """
+    Gera um CSV sintético de itens de nota fiscal
+
+    Args:
+        path: Caminho de saída
+        rows: Quantidade de linhas
+        seed: Semente do gerador aleatório
+
+    Returns:
+        str: Caminho do arquivo gerado
+    """
+    rng = np.random.default_rng(seed)
+    block = 500000
+    header = True
+
+    for start in range(0, rows, block):
+        n = min(block, rows - start)
+        quantidade = rng.integers(1, 500, n)
+        valor_unitario = np.round(rng.uniform(0.5, 5000, n), 2)
+        df = pd.DataFrame({
+            'numero_nf': rng.integers(1, max(rows // 5, 2), n),
+            'item': np.arange(start, start + n) % 20 + 1,
+            'codigo_produto': rng.integers(1000, 99999, n),
+            'descricao': rng.choice(['PARAFUSO', 'PORCA', 'ARRUELA', 'CABO', 'TINTA', 'LIXA'], n),
+            'quantidade': quantidade,
+            'unidade': rng.choice(['UN', 'KG', 'CX', 'M'], n),
+            'valor_unitario': valor_unitario,
+            'valor_total': np.round(quantidade * valor_unitario, 2),
+            'ncm': rng.integers(10000000, 99999999, n),
+            'cfop': rng.choice([5102, 5405, 6102, 6108], n),
+        })
+        df.to_csv(path, mode='w' if header else 'a', header=header, index=False)
+        header = False
+
+    return path
+
+
+# Fornecedores e produtos com acentos, para exercitar as variantes latin-1
+SUPPLIERS = ['COMÉRCIO DE FERRAGENS SÃO JOÃO LTDA', 'DISTRIBUIDORA AÇOFORTE S.A.', 'ELÉTRICA PARANÁ EIRELI',
+             'TINTAS CORAÇÃO LTDA', 'MADEIREIRA IGUAÇU LTDA', 'FERRAMENTAS JOSÉ & FILHOS', 'HIDRÁULICA GOIÂNIA ME',
+             'PARAFUSOS MACEIÓ LTDA']
+PRODUCTS = ['PARAFUSO SEXTAVADO AÇO', 'PORCA ZINCADA', 'ARRUELA LISA', 'CABO ELÉTRICO 2,5MM', 'TINTA ACRÍLICA',
+            'LIXA D\'ÁGUA', 'CONEXÃO PVC', 'FITA ISOLANTE', 'BROCA AÇO RÁPIDO', 'VÁLVULA DE PRESSÃO']
+BRL_SEPARATORS = str.maketrans(',.', '.,')
+
+
+def format_brl(values: np.ndarray) -> list:
+    """Valores no formato brasileiro, com ponto de milhar e vírgula decimal (ex.: 1.234,56)"""
+    return [f"{value:,.2f}".translate(BRL_SEPARATORS) for value in values.tolist()]
+
+
+def generate_nota_fiscal_csvs(directory: str, rows: int, seed: int = 42, encoding: str = 'utf-8',
+                              brazilian: bool = True) -> dict:
+    """
+    Gera um par cabeçalho/itens de notas fiscais com as colunas de CsvValidator
+
+    Cada nota tem em média 5 itens (rows // 5 notas). No formato brasileiro o separador é ';',
+    os valores usam vírgula decimal e ponto de milhar e as datas são dd/mm/aaaa.
+
+    Args:
+        directory: Pasta de saída
+        rows: Linhas do arquivo de itens
+        seed: Semente do gerador aleatório (mesma semente, mesmos arquivos)
+        encoding: 'utf-8' ou 'latin-1'
+        brazilian: Formato brasileiro (False gera CSV com vírgula e ponto decimal)
+
+    Returns:
+        dict: Caminhos {'cabecalho': ..., 'itens': ...}
+    """
+    rng = np.random.default_rng(seed)
+    notes = max(rows // 5, 1)
+    sep = ';' if brazilian else ','
+    money = format_brl if brazilian else (lambda values: values)
+    suffix = encoding.replace('-', '')
+    paths = {'cabecalho': os.path.join(directory, f"cabecalho_{rows}_{suffix}.csv"),
+             'itens': os.path.join(directory, f"itens_{rows}_{suffix}.csv")}
+    block = 500000
+
+    for start in range(0, notes, block):
+        n = min(block, notes - start)
+        valor_total = np.round(rng.lognormal(7, 1.5, n), 2)
+        desconto = np.round(valor_total * rng.choice([0, 0, 0.05, 0.1], n), 2)
+        acrescimo = np.round(valor_total * rng.choice([0, 0, 0, 0.02], n), 2)
+        dates = pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 730, n), unit='D')
+        cnpj = rng.integers(10 ** 7, 10 ** 8, n)
+        check = rng.integers(0, 100, n)
+        df = pd.DataFrame({
+            'numero': np.arange(start + 1, start + n + 1),
+            'serie': rng.choice([1, 2, 3], n),
+            'data_emissao': dates.strftime('%d/%m/%Y' if brazilian else '%Y-%m-%d'),
+            'cnpj_fornecedor': [f"{base // 10 ** 6:02d}.{base // 1000 % 1000:03d}.{base % 1000:03d}/0001-{digits:02d}"
+                                for base, digits in zip(cnpj.tolist(), check.tolist())],
+            'nome_fornecedor': rng.choice(SUPPLIERS, n),
+            'valor_total': money(valor_total),
+            'valor_liquido': money(np.round(valor_total - desconto + acrescimo, 2)),
+            'desconto': money(desconto),
+            'acrescimo': money(acrescimo),
+            'situacao': rng.choice(['AUTORIZADA', 'CANCELADA', 'DENEGADA'], n, p=[0.94, 0.05, 0.01]),
+        })
+        df.to_csv(paths['cabecalho'], mode='w' if start == 0 else 'a', header=start == 0, index=False,
+                  sep=sep, encoding=encoding)
+
+    for start in range(0, rows, block):
+        n = min(block, rows - start)
+        quantidade = rng.integers(1, 500, n)
+        valor_unitario = np.round(rng.uniform(0.5, 5000, n), 2)
+        df = pd.DataFrame({
+            'numero_nf': rng.integers(1, notes + 1, n),
+            'item': np.arange(start, start + n) % 20 + 1,
+            'codigo_produto': rng.integers(1000, 99999, n),
+            'descricao': rng.choice(PRODUCTS, n),
+            'quantidade': quantidade,
+            'unidade': rng.choice(['UN', 'KG', 'CX', 'M'], n),
+            'valor_unitario': money(valor_unitario),
+            'valor_total': money(np.round(quantidade * valor_unitario, 2)),
+            'ncm': rng.integers(10000000, 99999999, n),
+            'cfop': rng.choice([5102, 5405, 6102, 6108], n),
+        })
+        df.to_csv(paths['itens'], mode='w' if start == 0 else 'a', header=start == 0, index=False,
+                  sep=sep, encoding=encoding)
+
+    return paths
+
+
+def _measure_ingest(path: str) -> dict:
+    """Executa a ingestão no processo atual e mede tempo e pico de memória"""
+    from utils_openai import read_csv_chunked
+
+    start = time.perf_counter()
+    df = read_csv_chunked(path)
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss é informado em KB no Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        'rows': len(df),
+        'seconds': round(elapsed, 3),
+        'peak_rss_mb': round(peak_rss_mb, 1),
+        'frame_mb': round(df.memory_usage(deep=True).sum() / 1024 ** 2, 1),
+    }
+
+
+def bench_ingest(rows_list: list) -> list:
+    """Mede a ingestão para cada tamanho, cada um em processo isolado"""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in rows_list:
+            path = generate_items_csv(os.path.join(tmp_dir, f"itens_{rows}.csv"), rows)
+            output = subprocess.run(
+                [sys.executable, __file__, '_ingest_worker', path],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            result['us_per_row'] = round(result['seconds'] / rows * 1e6, 3)
+            results.append(result)
+            os.remove(path)
+    return results
+
+
+def bench_ingest_parallel(files: int, rows: int, workers_list: list, mode: str = 'process') -> list:
+    """Mede o tempo de parede da ingestão de vários arquivos para cada quantidade de workers"""
+    from utils_openai import ingest_jobs
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = [generate_items_csv(os.path.join(tmp_dir, f"itens_{i}.csv"), rows, seed=i) for i in range(files)]
+        jobs = [{'path': path, 'size': os.path.getsize(path)} for path in paths]
+
+        for workers in workers_list:
+            # Primeira rodada aquece o pool de processos (spawn + imports)
+            ingest_jobs(jobs[:workers], mode=mode, max_workers=workers)
+
+            start = time.perf_counter()
+            frames = ingest_jobs(jobs, mode=mode, max_workers=workers)
+            elapsed = time.perf_counter() - start
+
+            errors = [error for _, error in frames if error]
+            results.append({
+                'workers': workers,
+                'seconds': round(elapsed, 3),
+                'rows': sum(len(df) for df, _ in frames if df is not None),
+                'errors': len(errors),
+            })
+
+    baseline = results[0]['seconds'] if results else 0
+    for result in results:
+        result['speedup'] = round(baseline / result['seconds'], 2) if result['seconds'] else 0
+    return results
+
+
+def bench_currency(rows: int, seed: int = 42) -> dict:
+    """Compara a conversão de moeda célula a célula (apply) com a versão vetorizada"""
+    from utils_openai import parse_currency, parse_currency_series
+
+    rng = np.random.default_rng(seed)
+    values = rng.uniform(0, 100000, rows)
+    # Formato brasileiro: milhar com ponto, decimal com vírgula
+    text = pd.Series([f"R$ {v:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".") for v in values])
+
+    start = time.perf_counter()
+    per_cell = text.apply(lambda x: parse_currency(x) if pd.notna(x) else 0.0)
+    per_cell_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = parse_currency_series(text, fill_value=0.0)
+    vectorized_seconds = time.perf_counter() - start
+
+    return {
+        'rows': rows,
+        'apply_seconds': round(per_cell_seconds, 3),
+        'vectorized_seconds': round(vectorized_seconds, 3),
+        'speedup': round(per_cell_seconds / vectorized_seconds, 1) if vectorized_seconds else 0,
+        'equal': bool(np.allclose(per_cell.to_numpy(), vectorized.to_numpy())),
+    }
+
+
+class FakeChatHandler(BaseHTTPRequestHandler):
+    """
+    Servidor falso compatível com /v1/chat/completions da OpenAI
+
+    Responde após `latency` segundos e devolve 429 (com Retry-After) a cada
+    `rate_limit_every` requisições, para exercitar as novas tentativas. Com `script`,
+    cada pergunta reproduz as mesmas chamadas de ferramenta, em ordem, antes da resposta final.
+    """
+    latency = 0.5
+    rate_limit_every = 0
+    # Chamadas de ferramenta (nome, argumentos) repetidas a cada pergunta
+    script = []
+    lock = threading.Lock()
+    requests_seen = 0
+    # Requisições sendo atendidas agora e o maior valor observado
+    active = 0
+    peak_active = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        with FakeChatHandler.lock:
+            FakeChatHandler.active += 1
+            FakeChatHandler.peak_active = max(FakeChatHandler.peak_active, FakeChatHandler.active)
+        try:
+            self._respond()
+        finally:
+            with FakeChatHandler.lock:
+                FakeChatHandler.active -= 1
+
+    def _respond(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        with FakeChatHandler.lock:
+            FakeChatHandler.requests_seen += 1
+            seen = FakeChatHandler.requests_seen
+
+        if self.rate_limit_every and seen % self.rate_limit_every == 0:
+            payload = json.dumps({'error': {'message': 'Rate limit', 'type': 'rate_limit_error'}}).encode()
+            self.send_response(429)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Retry-After', '0.1')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        time.sleep(self.latency)
+        messages = body['messages']
+        question = next((message.get('content') or '' for message in reversed(messages)
+                         if message.get('role') == 'user'), '')
+        content = f"Resposta sintética para: {question.splitlines()[-1][:80] if question else ''}"
+        chunk = {'id': 'fake', 'created': 0, 'model': body.get('model', 'fake'), 'choices': [{'index': 0}]}
+
+        # O passo do roteiro é a quantidade de resultados de ferramenta já presentes na conversa
+        step = sum(1 for message in messages if message.get('role') in ('function', 'tool'))
+        functions = {function['name'] for function in body.get('functions') or []}
+        call = None
+        if step < len(self.script) and self.script[step][0] in functions:
+            name, arguments = self.script[step]
+            call = {'name': name, 'arguments': json.dumps(arguments)}
+        message = {'role': 'assistant', 'content': None, 'function_call': call} if call else \
+            {'role': 'assistant', 'content': content}
+        finish_reason = 'function_call' if call else 'stop'
+        # Tokens estimados pelos caracteres, para exercitar a contagem de uso do cliente
+        prompt_tokens = sum(len(str(message.get('content') or '')) for message in body['messages']) // 4
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': len(content) // 4,
+                 'total_tokens': prompt_tokens + len(content) // 4}
+
+        if body.get('stream'):
+            events = []
+            for delta, finish in ((message, None), ({}, finish_reason)):
+                chunk['object'] = 'chat.completion.chunk'
+                chunk['choices'][0].update(delta=delta, finish_reason=finish)
+                events.append(f"data: {json.dumps(chunk)}\n\n")
+            if (body.get('stream_options') or {}).get('include_usage'):
+                events.append(f"data: {json.dumps(dict(chunk, choices=[], usage=usage))}\n\n")
+            events.append("data: [DONE]\n\n")
+            # Com Content-Length a conexão pode ser reaproveitada (keep-alive em HTTP/1.1)
+            payload = ''.join(events).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        chunk['object'] = 'chat.completion'
+        chunk['choices'][0].update(message=message, finish_reason=finish_reason)
+        chunk['usage'] = usage
+        payload = json.dumps(chunk).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_fake_chat_server(latency: float = 0.5, rate_limit_every: int = 0,
+                           script: Optional[list] = None, keep_alive: bool = False) -> ThreadingHTTPServer:
+    """
+    Sobe o servidor falso numa porta livre e aponta OPENAI_BASE_URL para ele
+
+    Args:
+        latency: Tempo de resposta simulado (s)
+        rate_limit_every: Devolve 429 a cada N requisições (0 desativa)
+        script: Chamadas de ferramenta (nome, argumentos) feitas em toda pergunta antes da resposta
+        keep_alive: Responde em HTTP/1.1 mantendo as conexões abertas, como a API real
+
+    Returns:
+        ThreadingHTTPServer: Servidor em execução (chame shutdown() ao final)
+    """
+    FakeChatHandler.latency = latency
+    FakeChatHandler.rate_limit_every = rate_limit_every
+    FakeChatHandler.script = list(script or [])
+    FakeChatHandler.protocol_version = 'HTTP/1.1' if keep_alive else 'HTTP/1.0'
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeChatHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['OPENAI_BASE_URL'] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    return server
+
+
+def bench_batch(questions: int, concurrency_list: list, latency: float, rate_limit_every: int = 0) -> list:
+    """Mede o tempo de parede do modo em lote contra o servidor falso para cada concorrência"""
+    import asyncio
+    # Sem cache de respostas: todas as perguntas precisam chegar ao modelo
+    os.environ['RESPONSE_CACHE_MAX_ENTRIES'] = '0'
+    os.environ.setdefault('OPENAI_API_KEY', 'sk-fake')
+    os.environ.setdefault('BATCH_RETRY_BASE_SECONDS', '0.1')
+    server = start_fake_chat_server(latency, rate_limit_every)
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            agent = _load_benchmark_agent(generate_items_csv(os.path.join(tmp_dir, "itens.csv"), 1000))
+            # Perguntas que não casam com as respostas locais, para medir apenas o LLM
+            batch_questions = [f"Pergunta sintética número {i}" for i in range(questions)]
+
+            for concurrency in concurrency_list:
+                batch = asyncio.run(agent.query_batch(batch_questions, concurrency=concurrency))
+                results.append({
+                    'concurrency': concurrency,
+                    'seconds': round(batch['seconds'], 3),
+                    'errors': sum(1 for result in batch['results'] if result['error']),
+                    'retries': sum(max(result['attempts'] - 1, 0) for result in batch['results']),
+                })
+    finally:
+        server.shutdown()
+
+    baseline = results[0]['seconds'] if results else 0
+    for result in results:
+        result['speedup'] = round(baseline / result['seconds'], 2) if result['seconds'] else 0
+    return results
+
+
+def bench_llm_pool(callers: int, latency: float, max_concurrency: int) -> list:
+    """
+    Perguntas idênticas simultâneas contra o servidor falso: um ChatOpenAI novo por pergunta
+    (como antes) vs o pool do processo, sem e com junção das requisições em andamento
+
+    Args:
+        callers: Threads fazendo a mesma pergunta ao mesmo tempo
+        latency: Tempo de resposta simulado do servidor (s)
+        max_concurrency: Limite de chamadas simultâneas do pool
+
+    Returns:
+        list: dicts com mode, seconds, upstream (requisições que chegaram ao servidor),
+            peak_server (maior concorrência no servidor) e identical (todas as respostas iguais)
+    """
+    from langchain_core.messages import HumanMessage
+    from langchain_openai import ChatOpenAI
+    from llm_pool_openai import LLMPool
+
+    server = start_fake_chat_server(latency)
+    base_url = os.environ['OPENAI_BASE_URL']
+    messages = [HumanMessage("Qual fornecedor tem o maior valor total?")]
+
+    def fresh_model():
+        return ChatOpenAI(model='gpt-3.5-turbo', openai_api_key='sk-fake', base_url=base_url, temperature=0.1,
+                          streaming=True, stream_usage=True)
+
+    pool = LLMPool(max_concurrency=max_concurrency, coalesce=False, base_url=base_url)
+    coalescing_pool = LLMPool(max_concurrency=max_concurrency, coalesce=True, base_url=base_url)
+    modes = [
+        ('cliente novo', fresh_model),
+        ('pool', lambda: pool.chat_model('sk-fake')),
+        ('pool + junção', lambda: coalescing_pool.chat_model('sk-fake')),
+    ]
+    results = []
+    try:
+        for mode, get_model in modes:
+            # Conexões e imports aquecidos fora da medida
+            get_model().invoke(messages)
+            FakeChatHandler.requests_seen = FakeChatHandler.peak_active = 0
+            answers = [None] * callers
+            barrier = threading.Barrier(callers)
+
+            def ask(i):
+                barrier.wait()
+                answers[i] = get_model().invoke(messages).content
+
+            threads = [threading.Thread(target=ask, args=(i,)) for i in range(callers)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            results.append({
+                'mode': mode,
+                'seconds': round(time.perf_counter() - start, 3),
+                'upstream': FakeChatHandler.requests_seen,
+                'peak_server': FakeChatHandler.peak_active,
+                'identical': len(set(answers)) == 1 and answers[0] is not None,
+            })
+    finally:
+        server.shutdown()
+    return results
+
+
+def _load_benchmark_agent(path: str):
+    """Cria um CSVAnalysisAgent com o CSV de itens já carregado, fora do `streamlit run`"""
+    import streamlit as st
+    from main_openai import CSVAnalysisAgent
+
+    agent = CSVAnalysisAgent(os.environ['OPENAI_API_KEY'])
+    # O registro do DataFrame também atualiza o agente guardado na sessão do Streamlit
+    st.session_state.agent = agent
+    if not agent.load_csv_data(path, 'itens'):
+        raise RuntimeError("Falha ao carregar o CSV sintético")
+    return agent
+
+
+def bench_sessions(sessions: int, rows: int) -> list:
+    """
+    Várias sessões abrindo o mesmo arquivo: tempo de carga e memória residente do processo a cada sessão
+
+    Com o repositório compartilhado, só a primeira sessão lê o CSV e a memória cresce uma vez
+    (cada sessão ainda monta o próprio perfil e agente); sem ele, cada sessão somaria um frame_mb.
+
+    Returns:
+        list: dicts com session, seconds, rss_growth_mb (desde antes da primeira carga), frame_mb e
+            store_mb (memória residente do repositório)
+    """
+    def rss_mb():
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+
+    os.environ.setdefault('OPENAI_API_KEY', 'sk-fake')
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Cache colunar vazio: a primeira sessão lê o CSV de verdade
+        os.environ['CSV_CACHE_DIR'] = os.path.join(tmp_dir, 'cache')
+        path = generate_items_csv(os.path.join(tmp_dir, "itens.csv"), rows)
+        from dataset_store_openai import get_dataset_store
+
+        agents = []
+        baseline = rss_mb()
+        for session in range(1, sessions + 1):
+            start = time.perf_counter()
+            agents.append(_load_benchmark_agent(path))
+            seconds = time.perf_counter() - start
+            frame = agents[-1].dataframes['itens']
+            results.append({
+                'session': session,
+                'seconds': round(seconds, 3),
+                'rss_growth_mb': round(rss_mb() - baseline, 1),
+                'frame_mb': round(frame.memory_usage(deep=True).sum() / 1024 ** 2, 1),
+                'store_mb': round(get_dataset_store().get_stats()['resident_mb'], 1),
+            })
+    return results
+
+
+def bench_context(rows: int, budgets: list, questions: list, fake: bool) -> list:
+    """
+    Mede, para cada orçamento de contexto (0 = contexto antigo, só nomes de colunas),
+    o tamanho do contexto, as chamadas ao LLM, as execuções de ferramenta e os tokens de prompt por pergunta
+    """
+    from langchain_core.callbacks import BaseCallbackHandler
+    from analytics_openai import CHARS_PER_TOKEN
+
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        count_tokens = lambda text: len(encoding.encode(text))
+    except Exception:
+        # Sem tiktoken (ou sem acesso à rede para baixar o vocabulário), estima pelos caracteres
+        count_tokens = lambda text: len(text) // CHARS_PER_TOKEN
+
+    class UsageCounter(BaseCallbackHandler):
+        def __init__(self):
+            self.llm_calls = 0
+            self.tool_calls = 0
+            self.prompt_tokens = 0
+
+        def on_chat_model_start(self, serialized, messages, **kwargs):
+            self.llm_calls += 1
+            for batch in messages:
+                for message in batch:
+                    if isinstance(message.content, str):
+                        self.prompt_tokens += count_tokens(message.content)
+
+        def on_agent_action(self, action, **kwargs):
+            self.tool_calls += 1
+
+    os.environ['RESPONSE_CACHE_MAX_ENTRIES'] = '0'
+    server = None
+    if fake or not os.getenv('OPENAI_API_KEY'):
+        os.environ.setdefault('OPENAI_API_KEY', 'sk-fake')
+        server = start_fake_chat_server(latency=0.0)
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            agent = _load_benchmark_agent(generate_items_csv(os.path.join(tmp_dir, "itens.csv"), rows))
+            for budget in budgets:
+                os.environ['CONTEXT_MAX_TOKENS'] = str(budget)
+                counter = UsageCounter()
+                for question in questions:
+                    full_question = f"{agent._build_context()}\n\nPergunta: {question}"
+                    agent.create_general_agent().invoke({'input': full_question}, config={'callbacks': [counter]})
+                results.append({
+                    'budget': budget,
+                    'context_tokens': count_tokens(agent._build_context()),
+                    'llm_calls': round(counter.llm_calls / len(questions), 2),
+                    'tool_calls': round(counter.tool_calls / len(questions), 2),
+                    'prompt_tokens': round(counter.prompt_tokens / len(questions)),
+                })
+    finally:
+        if server is not None:
+            server.shutdown()
+    return results
+
+
+def bench_sketch(rows: int) -> dict:
+    """Compara o perfil exato (build_profile) com o perfil por sketches: tempo, memória e erro da mediana"""
+    from utils_openai import read_csv_chunked
+    from analytics_openai import build_profile, build_sketch_profile
+    from sketches_openai import DatasetSketch
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        df = read_csv_chunked(generate_items_csv(os.path.join(tmp_dir, "itens.csv"), rows))
+
+    start = time.perf_counter()
+    exact = build_profile(df)
+    exact_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sketch = DatasetSketch.from_dataframe(df)
+    approximate = build_sketch_profile(sketch)
+    sketch_seconds = time.perf_counter() - start
+
+    # Erro da mediana medido em posto (fração das linhas entre a mediana exata e a estimada)
+    rank_errors = []
+    for col, stats in approximate['columns'].items():
+        if 'median' in stats and 'median' in exact['columns'][col]:
+            values = df[col].to_numpy(dtype=np.float64)
+            rank_errors.append(abs((values <= stats['median']).mean() - (values <= exact['columns'][col]['median']).mean()))
+
+    return {
+        'rows': rows,
+        'exact_seconds': round(exact_seconds, 3),
+        'sketch_seconds': round(sketch_seconds, 3),
+        'frame_mb': round(df.memory_usage(deep=True).sum() / 1024 ** 2, 1),
+        'sketch_mb': round(sketch.memory_bytes() / 1024 ** 2, 2),
+        'median_rank_error': round(max(rank_errors), 5) if rank_errors else 0,
+    }
+
+
+def bench_join(rows: int, lookups: int, seed: int = 42) -> dict:
+    """Índice cabeçalho↔itens vs merge/groupby do pandas: montagem, busca de nota e ranking de fornecedores"""
+    from utils_openai import read_csv_chunked
+    from invoice_openai import InvoiceIndex
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        items = read_csv_chunked(generate_items_csv(os.path.join(tmp_dir, "itens.csv"), rows, seed))
+    rng = np.random.default_rng(seed)
+    notes = max(rows // 5, 2)
+    header = pd.DataFrame({
+        'numero': np.arange(1, notes + 1),
+        'nome_fornecedor': rng.choice([f"FORNECEDOR {i}" for i in range(200)], notes),
+        'valor_total': np.round(rng.uniform(10, 100000, notes), 2),
+    })
+    keys = rng.integers(1, notes, lookups)
+
+    start = time.perf_counter()
+    index = InvoiceIndex.build(header, items)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for key in keys:
+        index.lookup(key)
+    index_lookup = (time.perf_counter() - start) / lookups
+
+    start = time.perf_counter()
+    for key in keys:
+        header[header['numero'] == key], items[items['numero_nf'] == key]
+    pandas_lookup = (time.perf_counter() - start) / lookups
+
+    start = time.perf_counter()
+    index.top_suppliers(10)
+    index_ranking = time.perf_counter() - start
+
+    start = time.perf_counter()
+    joined = items.merge(header, left_on='numero_nf', right_on='numero', suffixes=('_item', ''))
+    joined.groupby('nome_fornecedor')['valor_total_item'].agg(['sum', 'count']).nlargest(10, 'sum')
+    pandas_ranking = time.perf_counter() - start
+
+    return {
+        'rows': rows,
+        'build_seconds': round(build_seconds, 3),
+        'index_lookup_ms': round(index_lookup * 1000, 3),
+        'pandas_lookup_ms': round(pandas_lookup * 1000, 3),
+        'index_ranking_ms': round(index_ranking * 1000, 3),
+        'pandas_ranking_ms': round(pandas_ranking * 1000, 1),
+    }
+
+
+# Gráficos típicos pedidos ao agente, do mais barato (histograma) ao mais caro (pontos por linha)
+CHART_BENCHMARKS = {
+    'hist': "plt.hist(df['valor_total'], bins=50)",
+    'scatter': "plt.scatter(df['quantidade'], df['valor_total'])",
+    'line': "plt.plot(df['data'], df['valor_total'].cumsum())",
+    'sns.scatter': "import seaborn as sns\nsns.scatterplot(data=df, x='quantidade', y='valor_total', hue='unidade')",
+    'sns.bar': "import seaborn as sns\nsns.barplot(data=df, x='unidade', y='valor_total')",
+    'sns.violin': "import seaborn as sns\nsns.violinplot(data=df, x='unidade', y='valor_unitario')",
+}
+
+
+def bench_charts(rows: int, timeout: float, max_points: int = 50000, seed: int = 42) -> list:
+    """Tempo de renderização com e sem a camada de redução (LTTB, hexbin, amostra estratificada)"""
+    from charts_openai import ChartRenderer, ChartError
+    from utils_openai import ColumnarCache
+
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'data': pd.date_range('2020-01-01', periods=rows, freq='min'),
+        'quantidade': rng.integers(1, 100, rows),
+        'valor_unitario': np.round(rng.lognormal(3, 1, rows), 2),
+        'unidade': rng.choice(['UN', 'CX', 'KG', 'LT', 'PC'], rows, p=[0.6, 0.2, 0.1, 0.07, 0.03]),
+    })
+    df['valor_total'] = df['quantidade'] * df['valor_unitario']
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Os dados chegam ao worker pelo arquivo Arrow mapeado, como no app
+        cache = ColumnarCache(tmp_dir)
+        cache.store('charts', df)
+        arrow_path = cache.path_for('charts')
+        renderers = {
+            'guarded': ChartRenderer(timeout=timeout, cpu_seconds=0, max_memory_mb=0, max_rows=0,
+                                     max_points=max_points, cache_entries=0),
+            'unguarded': ChartRenderer(timeout=timeout, cpu_seconds=0, max_memory_mb=0, max_rows=0,
+                                       max_points=0, cache_entries=0),
+        }
+        try:
+            # Sobe os workers antes de medir
+            for renderer in renderers.values():
+                renderer.render("plt.plot([0, 1])", df.head(2), 'warmup')
+            for name, code in CHART_BENCHMARKS.items():
+                result = {'rows': rows, 'chart': name}
+                for mode, renderer in renderers.items():
+                    start = time.perf_counter()
+                    try:
+                        renderer.render(code, df, 'charts', arrow_path=arrow_path)
+                        result[mode] = round(time.perf_counter() - start, 2)
+                    except ChartError:
+                        result[mode] = f">{timeout:g}"
+                results.append(result)
+        finally:
+            for renderer in renderers.values():
+                renderer.shutdown()
+    return results
+
+
+# Pergunta do pipeline completo (fora das respostas locais) e as ferramentas que o modelo falso aciona
+SUITE_QUESTION = "Qual a quantidade vendida por unidade de medida?"
+SUITE_SCRIPT = [
+    ('python_repl_ast', {'query': "df2.groupby('unidade')['quantidade'].sum()"}),
+    ('sql_query', {'__arg1': "SELECT unidade, sum(quantidade) AS quantidade FROM itens GROUP BY unidade"}),
+]
+
+# Diferenças absolutas abaixo disto (s) são ruído e nunca contam como regressão
+REGRESSION_FLOOR_SECONDS = 0.05
+
+
+def _suite_run(paths: dict) -> dict:
+    """Uma passada do pipeline, do arquivo à resposta, num agente novo; tempos por etapa (s)"""
+    import streamlit as st
+    from main_openai import CSVAnalysisAgent
+    from utils_openai import CsvValidator, clean_dataframe
+
+    timings = {}
+    validator = CsvValidator()
+    start = time.perf_counter()
+    file_types = {name: validator.identify_file_type(path) for name, path in paths.items()}
+    timings['identify_file_type'] = time.perf_counter() - start
+    if file_types != {name: name for name in paths}:
+        raise RuntimeError(f"Tipos identificados incorretamente: {file_types}")
+
+    agent = CSVAnalysisAgent(os.environ['OPENAI_API_KEY'])
+    st.session_state.agent = agent
+    for file_type, path in paths.items():
+        sniffed = validator.sniff(path)
+        start = time.perf_counter()
+        if not agent.load_csv_data(path, file_type, read_kwargs={'encoding': sniffed['encoding'],
+                                                                 'sep': sniffed['delimiter']}):
+            raise RuntimeError(f"Falha ao carregar {path}")
+        timings[f"ingest_{file_type}"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for df in agent.dataframes.values():
+        clean_dataframe(df)
+    timings['clean_dataframe'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    agent.create_general_agent()
+    timings['create_general_agent'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    answer = agent.query(SUITE_QUESTION)
+    timings['query'] = time.perf_counter() - start
+    if agent.last_response_source != 'llm' or str(answer).startswith('Erro'):
+        raise RuntimeError(f"Consulta não passou pelo agente: {answer}")
+
+    # Libera os DataFrames no repositório compartilhado: com orçamento zero, a próxima passada
+    # não os reaproveita e volta a ler os CSVs
+    agent.dataset_store.release_session(agent.session_id)
+    return timings
+
+
+def bench_suite(rows_list: list, encodings: list, repeat: int = 3, seed: int = 42) -> dict:
+    """
+    Pipeline completo sobre notas fiscais sintéticas, com o modelo falso reproduzindo as mesmas
+    chamadas de ferramenta: identificação, ingestão, limpeza, criação do agente e consulta
+
+    Cada etapa é a mediana de `repeat` passadas; caches em disco e o repositório compartilhado
+    de DataFrames ficam desligados para que todas as passadas façam o trabalho completo.
+
+    Returns:
+        dict: 'meta' (ambiente) e 'results' ({'<linhas>/<codificação>': {etapa: segundos}})
+    """
+    from dataset_store_openai import get_dataset_store
+
+    os.environ['CSV_CACHE_MAX_MB'] = '0'
+    os.environ['RESPONSE_CACHE_MAX_ENTRIES'] = '0'
+    os.environ['DATASET_STORE_MAX_MB'] = '0'
+    os.environ['OPENAI_API_KEY'] = 'sk-fake'
+    # O repositório pode já existir no processo (criado antes com outro orçamento)
+    get_dataset_store().max_bytes = 0
+    server = start_fake_chat_server(latency=0.0, script=SUITE_SCRIPT)
+
+    try:
+        git_commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        git_commit = None
+    report = {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_commit': git_commit,
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'results': {},
+    }
+    try:
+        for rows in rows_list:
+            for encoding in encodings:
+                with tempfile.TemporaryDirectory() as tmp_dir:
+                    start = time.perf_counter()
+                    paths = generate_nota_fiscal_csvs(tmp_dir, rows, seed, encoding)
+                    generate_seconds = time.perf_counter() - start
+                    runs = [_suite_run(paths) for _ in range(repeat)]
+                result = {stage: round(float(np.median([run[stage] for run in runs])), 4) for stage in runs[0]}
+                result['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+                result['generate_seconds'] = round(generate_seconds, 3)
+                report['results'][f"{rows}/{encoding}"] = result
+    finally:
+        server.shutdown()
+    return report
+
+
+def compare_with_baseline(report: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compara as etapas com a linha de base
+
+    Returns:
+        list: dicts com case, stage, baseline, current, ratio e regression (mais lento que
+            1 + tolerance vezes a base e acima do piso de ruído)
+    """
+    rows = []
+    for case, stages in report['results'].items():
+        for stage, current in stages.items():
+            previous = baseline.get('results', {}).get(case, {}).get(stage)
+            # Só etapas cronometradas; geração e pico de memória são informativos
+            if previous is None or stage in ('peak_rss_mb', 'generate_seconds'):
+                continue
+            ratio = current / previous if previous else float('inf')
+            rows.append({
+                'case': case, 'stage': stage, 'baseline': previous, 'current': current, 'ratio': round(ratio, 2),
+                'regression': ratio > 1 + tolerance and current - previous > REGRESSION_FLOOR_SECONDS,
+            })
+    return rows
+
+
+# Módulos que o main_openai só carrega na primeira pergunta ou no pré-aquecimento
+DEFERRED_MODULES = ('langchain_experimental.agents', 'langchain_openai', 'openai', 'matplotlib.pyplot', 'seaborn')
+
+# Primeira renderização completa da página, com a chave fictícia e sem pré-aquecimento
+FIRST_PAINT_SCRIPT = """
+import os, sys, time
+os.environ.update(OPENAI_API_KEY='sk-benchmark', PREWARM='0')
+start = time.perf_counter()
+for name in sys.argv[1:]:
+    __import__(name)
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file('main_openai.py', default_timeout=120).run()
+print(round(time.perf_counter() - start, 4), len(at.exception))
+"""
+
+
+def parse_importtime(stderr: str) -> dict:
+    """
+    Lê a saída de python -X importtime
+
+    Returns:
+        dict: módulo -> (próprio, acumulado) em microssegundos; em '__total__', a soma dos
+            acumulados sem recuo (inclui a partida do interpretador, como site e encodings)
+    """
+    modules = {}
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        own, cumulative = int(own), int(cumulative)
+        modules[name.strip()] = max(modules.get(name.strip(), (0, 0)), (own, cumulative))
+        # Sem recuo, o módulo foi importado pelo próprio comando
+        if not name[1:].startswith(' '):
+            total += cumulative
+    modules['__total__'] = (total, total)
+    return modules
+
+
+def bench_importtime(repeat: int = 3, top: int = 10) -> dict:
+    """
+    Tempo de importação do main_openai e da primeira renderização, com imports adiados (atual)
+    e com os módulos pesados importados de antemão (como era antes), cada medida em processo novo
+
+    Args:
+        repeat: Execuções por variante (vale a mediana)
+        top: Quantidade de módulos mais pesados listados
+
+    Returns:
+        dict: lazy/eager com import_ms e first_paint_s, e heaviest (módulo, ms acumulados) da variante atual
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PREWARM='0')
+    result = {}
+    for variant, preload in (('lazy', ()), ('eager', DEFERRED_MODULES)):
+        import_runs, paint_runs, modules = [], [], {}
+        code = ''.join(f"import {name}\n" for name in preload) + "import main_openai"
+        for _ in range(repeat):
+            stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=here, env=env,
+                                    check=True, capture_output=True, text=True).stderr
+            modules = parse_importtime(stderr)
+            import_runs.append(modules['__total__'][1] / 1000)
+            output = subprocess.run([sys.executable, '-c', FIRST_PAINT_SCRIPT, *preload], cwd=here, env=env,
+                                    check=True, capture_output=True, text=True).stdout
+            seconds, exceptions = output.split()
+            if int(exceptions):
+                raise RuntimeError(f"A página falhou na renderização ({variant})")
+            paint_runs.append(float(seconds))
+        result[variant] = {'import_ms': round(float(np.median(import_runs)), 1),
+                           'first_paint_s': round(float(np.median(paint_runs)), 3)}
+        if variant == 'lazy':
+            heaviest = sorted(((name, cumulative / 1000) for name, (_, cumulative) in modules.items()
+                               if name != '__total__' and '.' not in name and name != 'main_openai'),
+                              key=lambda item: item[1], reverse=True)
+            result['heaviest'] = [(name, round(ms, 1)) for name, ms in heaviest[:top]]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do CSV Agent")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = subparsers.add_parser('ingest', help="Tempo e pico de RSS da ingestão de CSV")
+    ingest_parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000, 5000000])
+
+    parallel_parser = subparsers.add_parser('ingest-parallel', help="Tempo de parede da ingestão paralela por núcleos")
+    parallel_parser.add_argument('--files', type=int, default=8)
+    parallel_parser.add_argument('--rows', type=int, default=500000)
+    parallel_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parallel_parser.add_argument('--mode', choices=['process', 'thread'], default='process')
+
+    currency_parser = subparsers.add_parser('currency', help="Conversão de moeda: apply vs vetorizada")
+    currency_parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+
+    batch_parser = subparsers.add_parser('batch', help="Perguntas em lote contra um servidor de chat falso")
+    batch_parser.add_argument('--questions', type=int, default=29)
+    batch_parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+    batch_parser.add_argument('--latency', type=float, default=0.5)
+    batch_parser.add_argument('--rate-limit-every', type=int, default=0)
+
+    context_parser = subparsers.add_parser('context', help="Tamanho do contexto, iterações e tokens por pergunta")
+    context_parser.add_argument('--rows', type=int, default=100000)
+    context_parser.add_argument('--budgets', type=int, nargs='+', default=[0, 600, 1200])
+    context_parser.add_argument('--questions', nargs='+', default=[
+        "Quais colunas têm valores nulos?",
+        "Qual o intervalo de valor_unitario?",
+        "Quais unidades aparecem nos itens?",
+    ])
+    context_parser.add_argument('--fake', action='store_true', help="Usa o servidor de chat falso em vez da OpenAI")
+
+    sketch_parser = subparsers.add_parser('sketch', help="Perfil exato vs sketches: tempo, memória e erro")
+    sketch_parser.add_argument('--rows', type=int, nargs='+', default=[1000000])
+
+    join_parser = subparsers.add_parser('join', help="Índice cabeçalho↔itens vs merge/groupby por pergunta")
+    join_parser.add_argument('--rows', type=int, nargs='+', default=[1000000])
+    join_parser.add_argument('--lookups', type=int, default=1000)
+
+    charts_parser = subparsers.add_parser('charts', help="Renderização de gráficos com e sem redução de pontos")
+    charts_parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    charts_parser.add_argument('--timeout', type=float, default=60.0)
+    charts_parser.add_argument('--max-points', type=int, default=50000)
+
+    generate_parser = subparsers.add_parser('generate', help="Gera cabeçalho/itens sintéticos de notas fiscais")
+    generate_parser.add_argument('--rows', type=int, default=100000)
+    generate_parser.add_argument('--encoding', choices=['utf-8', 'latin-1'], default='utf-8')
+    generate_parser.add_argument('--plain', action='store_true', help="Ponto decimal e vírgula como separador")
+    generate_parser.add_argument('--seed', type=int, default=42)
+    generate_parser.add_argument('--output', default='.')
+
+    suite_parser = subparsers.add_parser('suite', help="Pipeline completo com modelo falso, com linha de base em JSON")
+    suite_parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    suite_parser.add_argument('--encodings', nargs='+', choices=['utf-8', 'latin-1'], default=['utf-8', 'latin-1'])
+    suite_parser.add_argument('--repeat', type=int, default=3)
+    suite_parser.add_argument('--output', help="Grava os resultados em JSON (ex.: nova linha de base)")
+    suite_parser.add_argument('--baseline', help="JSON de uma execução anterior para comparar")
+    suite_parser.add_argument('--tolerance', type=float, default=0.25,
+                              help="Fração de lentidão aceita antes de acusar regressão")
+
+    sessions_parser = subparsers.add_parser('sessions', help="Memória e tempo com várias sessões abrindo o mesmo arquivo")
+    sessions_parser.add_argument('--sessions', type=int, default=5)
+    sessions_parser.add_argument('--rows', type=int, default=1000000)
+
+    pool_parser = subparsers.add_parser('llm-pool', help="Perguntas idênticas simultâneas: cliente novo vs pool com junção")
+    pool_parser.add_argument('--callers', type=int, default=16)
+    pool_parser.add_argument('--latency', type=float, default=0.5)
+    pool_parser.add_argument('--max-concurrency', type=int, default=4)
+
+    importtime_parser = subparsers.add_parser('importtime', help="Importação e primeira renderização, adiada vs antecipada")
+    importtime_parser.add_argument('--repeat', type=int, default=3)
+    importtime_parser.add_argument('--top', type=int, default=10)
+    importtime_parser.add_argument('--budget-ms', type=float,
+                                   help="Falha (saída 1) se a importação do main_openai passar deste tempo")
+
+    worker_parser = subparsers.add_parser('_ingest_worker')
+    worker_parser.add_argument('path')
+
+    args = parser.parse_args()
+
+    if args.command == '_ingest_worker':
+        print(json.dumps(_measure_ingest(args.path)))
+    elif args.command == 'ingest':
+        print(f"{'linhas':>10} {'segundos':>10} {'us/linha':>10} {'pico RSS (MB)':>14} {'frame (MB)':>11}")
+        for result in bench_ingest(args.rows):
+            print(f"{result['rows']:>10} {result['seconds']:>10} {result['us_per_row']:>10} "
+                  f"{result['peak_rss_mb']:>14} {result['frame_mb']:>11}")
+    elif args.command == 'ingest-parallel':
+        print(f"{'workers':>8} {'segundos':>10} {'speedup':>8} {'linhas':>10} {'erros':>6}")
+        for result in bench_ingest_parallel(args.files, args.rows, args.workers, args.mode):
+            print(f"{result['workers']:>8} {result['seconds']:>10} {result['speedup']:>8} "
+                  f"{result['rows']:>10} {result['errors']:>6}")
+    elif args.command == 'currency':
+        print(f"{'linhas':>10} {'apply (s)':>10} {'vetor (s)':>10} {'speedup':>8} {'iguais':>7}")
+        for rows in args.rows:
+            result = bench_currency(rows)
+            print(f"{result['rows']:>10} {result['apply_seconds']:>10} {result['vectorized_seconds']:>10} "
+                  f"{result['speedup']:>8} {str(result['equal']):>7}")
+    elif args.command == 'batch':
+        print(f"{'concorrência':>12} {'segundos':>10} {'speedup':>8} {'novas tentativas':>17} {'erros':>6}")
+        for result in bench_batch(args.questions, args.concurrency, args.latency, args.rate_limit_every):
+            print(f"{result['concurrency']:>12} {result['seconds']:>10} {result['speedup']:>8} "
+                  f"{result['retries']:>17} {result['errors']:>6}")
+    elif args.command == 'sketch':
+        print(f"{'linhas':>10} {'exato (s)':>10} {'sketch (s)':>11} {'frame (MB)':>11} {'sketch (MB)':>12} {'erro posto mediana':>19}")
+        for rows in args.rows:
+            result = bench_sketch(rows)
+            print(f"{result['rows']:>10} {result['exact_seconds']:>10} {result['sketch_seconds']:>11} "
+                  f"{result['frame_mb']:>11} {result['sketch_mb']:>12} {result['median_rank_error']:>19}")
+    elif args.command == 'join':
+        print(f"{'linhas':>10} {'índice (s)':>11} {'busca índice (ms)':>18} {'busca pandas (ms)':>18} "
+              f"{'ranking índice (ms)':>20} {'ranking pandas (ms)':>20}")
+        for rows in args.rows:
+            result = bench_join(rows, args.lookups)
+            print(f"{result['rows']:>10} {result['build_seconds']:>11} {result['index_lookup_ms']:>18} "
+                  f"{result['pandas_lookup_ms']:>18} {result['index_ranking_ms']:>20} {result['pandas_ranking_ms']:>20}")
+    elif args.command == 'charts':
+        print(f"{'linhas':>10} {'gráfico':>12} {'com redução (s)':>16} {'sem redução (s)':>16}")
+        for rows in args.rows:
+            for result in bench_charts(rows, args.timeout, args.max_points):
+                print(f"{result['rows']:>10} {result['chart']:>12} {result['guarded']:>16} {result['unguarded']:>16}")
+    elif args.command == 'generate':
+        os.makedirs(args.output, exist_ok=True)
+        paths = generate_nota_fiscal_csvs(args.output, args.rows, args.seed, args.encoding, not args.plain)
+        for file_type, path in paths.items():
+            print(f"{file_type}: {path} ({os.path.getsize(path) / 1024 ** 2:.1f} MB)")
+    elif args.command == 'suite':
+        report = bench_suite(args.rows, args.encodings, args.repeat)
+        stages = list(next(iter(report['results'].values())))
+        print(f"{'caso':>16} " + ' '.join(f"{stage:>20}" for stage in stages))
+        for case, result in report['results'].items():
+            print(f"{case:>16} " + ' '.join(f"{result[stage]:>20}" for stage in stages))
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2, ensure_ascii=False)
+            print(f"\nResultados gravados em {args.output}")
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as baseline_file:
+                comparison = compare_with_baseline(report, json.load(baseline_file), args.tolerance)
+            regressions = [row for row in comparison if row['regression']]
+            print(f"\n{'caso':>16} {'etapa':>20} {'base (s)':>10} {'atual (s)':>10} {'razão':>7}")
+            for row in comparison:
+                flag = '  ⚠️ regressão' if row['regression'] else ''
+                print(f"{row['case']:>16} {row['stage']:>20} {row['baseline']:>10} {row['current']:>10} "
+                      f"{row['ratio']:>7}{flag}")
+            if regressions:
+                print(f"\n{len(regressions)} etapa(s) mais lentas que a linha de base (tolerância {args.tolerance:.0%})")
+                sys.exit(1)
+    elif args.command == 'sessions':
+        print(f"{'sessão':>7} {'segundos':>10} {'Δ RSS (MB)':>11} {'frame (MB)':>11} {'repositório (MB)':>17}")
+        for result in bench_sessions(args.sessions, args.rows):
+            print(f"{result['session']:>7} {result['seconds']:>10} {result['rss_growth_mb']:>11} "
+                  f"{result['frame_mb']:>11} {result['store_mb']:>17}")
+    elif args.command == 'llm-pool':
+        print(f"{'modo':>14} {'segundos':>10} {'chamadas ao servidor':>21} {'pico no servidor':>17} {'iguais':>7}")
+        for result in bench_llm_pool(args.callers, args.latency, args.max_concurrency):
+            print(f"{result['mode']:>14} {result['seconds']:>10} {result['upstream']:>21} "
+                  f"{result['peak_server']:>17} {str(result['identical']):>7}")
+    elif args.command == 'importtime':
+        result = bench_importtime(args.repeat, args.top)
+        print(f"{'variante':>10} {'importação (ms)':>16} {'primeira renderização (s)':>26}")
+        for variant, label in (('eager', 'antecipada'), ('lazy', 'adiada')):
+            print(f"{label:>10} {result[variant]['import_ms']:>16} {result[variant]['first_paint_s']:>26}")
+        print(f"\n{'módulo':>30} {'acumulado (ms)':>15}")
+        for name, ms in result['heaviest']:
+            print(f"{name:>30} {ms:>15}")
+        if args.budget_ms is not None and result['lazy']['import_ms'] > args.budget_ms:
+            print(f"\nImportação acima do orçamento: {result['lazy']['import_ms']} ms > {args.budget_ms:g} ms")
+            sys.exit(1)
+    elif args.command == 'context':
+        print(f"{'orçamento':>10} {'tokens contexto':>16} {'chamadas LLM':>13} {'ferramentas':>12} {'tokens prompt':>14}")
+        for result in bench_context(args.rows, args.budgets, args.questions, args.fake):
+            print(f"{result['budget']:>10} {result['context_tokens']:>16} {result['llm_calls']:>13} "
+                  f"{result['tool_calls']:>12} {result['prompt_tokens']:>14}")
+
+
+if __name__ == "__main__":
+    main()
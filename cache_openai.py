@@ -0,0 +1,200 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import hashlib
+import unicodedata
+from typing import Optional, Callable
+
+import numpy as np
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normaliza a pergunta para a chave do cache
+
+    Remove acentos, caixa, espaços repetidos e pontuação final, de modo que
+    "Qual é a média?" e "qual e a media" caiam na mesma entrada.
+
+    Args:
+        question: Pergunta original
+
+    Returns:
+        str: Pergunta normalizada
+    """
+    text = unicodedata.normalize('NFKD', question)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r'\s+', ' ', text.lower()).strip()
+    return text.rstrip('?!. ')
+
+
+class ResponseCache:
+    """Cache persistente (SQLite) das respostas do agente, com camada exata e camada por similaridade"""
+
+    def __init__(self, db_path: str, ttl_seconds: float = 7 * 24 * 3600, max_entries: int = 1000,
+                 embed_fn: Optional[Callable[[str], list]] = None, similarity_threshold: float = 0.0):
+        """
+        Args:
+            db_path: Caminho do arquivo SQLite
+            ttl_seconds: Validade de cada resposta
+            max_entries: Quantidade máxima de respostas (as menos usadas são removidas)
+            embed_fn: Função que gera o embedding de um texto; None desativa a camada semântica
+            similarity_threshold: Similaridade de cosseno mínima para a camada semântica
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.stats = {'exact_hits': 0, 'semantic_hits': 0, 'misses': 0}
+
+        # Uma conexão compartilhada entre as threads do Streamlit, protegida por lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    question TEXT NOT NULL,
+                    dataset_key TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    embedding BLOB,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_responses_scope ON responses (dataset_key, model)"
+            )
+
+    @classmethod
+    def from_env(cls, embed_fn: Optional[Callable[[str], list]] = None) -> Optional['ResponseCache']:
+        """
+        Cria o cache a partir de RESPONSE_CACHE_PATH, RESPONSE_CACHE_TTL_HOURS,
+        RESPONSE_CACHE_MAX_ENTRIES e RESPONSE_CACHE_SEMANTIC_THRESHOLD
+
+        Args:
+            embed_fn: Função de embedding usada se o limiar semântico for maior que zero
+
+        Returns:
+            ResponseCache: Instância configurada ou None se o cache estiver desativado
+        """
+        max_entries = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+        if max_entries <= 0:
+            return None
+        threshold = float(os.getenv("RESPONSE_CACHE_SEMANTIC_THRESHOLD", "0"))
+        try:
+            return cls(
+                os.getenv("RESPONSE_CACHE_PATH", ".response_cache.sqlite3"),
+                ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_HOURS", "168")) * 3600,
+                max_entries=max_entries,
+                embed_fn=embed_fn if threshold > 0 else None,
+                similarity_threshold=threshold
+            )
+        except sqlite3.Error:
+            return None
+
+    @staticmethod
+    def make_key(question: str, dataset_key: str, model: str) -> str:
+        """Chave exata: pergunta normalizada, impressão digital dos dados e modelo"""
+        raw = f"{normalize_question(question)}\0{dataset_key}\0{model}"
+        return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+    def get(self, question: str, dataset_key: str, model: str) -> Optional[tuple]:
+        """
+        Procura uma resposta em cache
+
+        Args:
+            question: Pergunta do usuário
+            dataset_key: Impressão digital dos dados carregados
+            model: Nome do modelo
+
+        Returns:
+            tuple: (resposta, 'exact' ou 'semantic') ou None se não houver
+        """
+        now = time.time()
+        key = self.make_key(question, dataset_key, model)
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                self.stats['exact_hits'] += 1
+                return row[0], 'exact'
+
+        if self.embed_fn is not None:
+            match = self._semantic_lookup(question, dataset_key, model, now)
+            if match is not None:
+                self.stats['semantic_hits'] += 1
+                return match, 'semantic'
+
+        self.stats['misses'] += 1
+        return None
+
+    def _semantic_lookup(self, question: str, dataset_key: str, model: str, now: float) -> Optional[str]:
+        """Retorna a resposta da pergunta mais parecida, se a similaridade passar do limiar"""
+        try:
+            query = np.asarray(self.embed_fn(normalize_question(question)), dtype=np.float32)
+        except Exception:
+            return None
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, response, embedding FROM responses "
+                "WHERE dataset_key = ? AND model = ? AND embedding IS NOT NULL",
+                (dataset_key, model)
+            ).fetchall()
+        if not rows:
+            return None
+
+        matrix = np.stack([np.frombuffer(embedding, dtype=np.float32) for _, _, embedding in rows])
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        similarities = matrix @ query / np.where(norms == 0, 1.0, norms)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, rows[best][0]))
+        return rows[best][1]
+
+    def put(self, question: str, dataset_key: str, model: str, response: str) -> None:
+        """
+        Guarda uma resposta e remove as menos usadas além de max_entries
+
+        Args:
+            question: Pergunta do usuário
+            dataset_key: Impressão digital dos dados carregados
+            model: Nome do modelo
+            response: Resposta do agente
+        """
+        now = time.time()
+        embedding = None
+        if self.embed_fn is not None:
+            try:
+                embedding = np.asarray(self.embed_fn(normalize_question(question)), dtype=np.float32).tobytes()
+            except Exception:
+                embedding = None
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, question, dataset_key, model, response, embedding, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.make_key(question, dataset_key, model), question, dataset_key, model,
+                 response, embedding, now, now)
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self) -> None:
+        """Remove todas as respostas"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
@@ -0,0 +1,574 @@
+import io
+import os
+import re
+import signal
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # Windows: sem limites de CPU/memória no worker, só o timeout de parede
+    resource = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except ImportError:
+    pa = None
+
+from utils_openai import content_hash
+
+
+# Pontos de uma linha após o LTTB (bem acima da largura da figura em pixels)
+LTTB_POINTS = 4000
+
+# Tamanho da grade do hexbin que substitui dispersões grandes
+HEXBIN_GRIDSIZE = 120
+
+# Linhas mínimas por grupo na amostra estratificada (grupos pequenos não somem)
+MIN_STRATUM_ROWS = 100
+
+# Acima desta quantidade de grupos (ex.: cor contínua) a amostra é aleatória simples
+MAX_STRATA = 50
+
+# Funções do seaborn que desenham um elemento por linha e recebem amostra estratificada pelo hue;
+# histogramas, contagens e agregações continuam sobre os dados completos
+POINT_LEVEL_SEABORN = ('scatterplot', 'relplot', 'stripplot', 'swarmplot', 'kdeplot', 'violinplot',
+                       'jointplot', 'pairplot', 'lmplot', 'regplot', 'residplot')
+
+# Funções com vários painéis por figura: a amostra é dividida por este fator
+MULTI_PANEL_SEABORN = {'pairplot': 5, 'jointplot': 2, 'lmplot': 2}
+
+# Funções que calculam intervalo de confiança por bootstrap sobre todas as linhas; acima do
+# limite, sem errorbar explícito, usam ±2 erros padrão (mesmas médias, intervalo analítico)
+BOOTSTRAP_SEABORN = ('barplot', 'pointplot', 'lineplot')
+
+
+class ChartError(Exception):
+    """Falha ao gerar o gráfico (erro no código, tempo ou memória excedidos)"""
+
+
+class _CpuLimitExceeded(Exception):
+    """Levantada no worker quando o limite de CPU do gráfico é atingido (SIGXCPU)"""
+
+
+def _on_cpu_limit(signum, frame):
+    raise _CpuLimitExceeded()
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: escolhe os pontos que preservam a forma visual de uma série
+
+    Args:
+        x: Eixo x em ordem crescente (numérico)
+        y: Valores
+        n_out: Quantidade de pontos desejada
+
+    Returns:
+        np.ndarray: Posições escolhidas, em ordem, incluindo o primeiro e o último ponto
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        # Vértice seguinte do triângulo: média do próximo bucket (ou o último ponto)
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean() if next_end > end else x[-1]
+        next_y = y[end:next_end].mean() if next_end > end else y[-1]
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.nanargmax(areas)) if np.isfinite(areas).any() else start
+        selected[i + 1] = previous
+    return selected
+
+
+def stratified_positions(n: int, size: int, groups=None, seed: int = 0) -> np.ndarray:
+    """
+    Sorteia até size posições de 0..n-1, proporcionais por grupo e com um mínimo por grupo
+
+    Args:
+        n: Total de linhas
+        size: Tamanho da amostra
+        groups: Rótulo do grupo de cada linha (ex.: coluna usada como hue) ou None
+        seed: Semente, para o mesmo gráfico sair igual a cada execução
+
+    Returns:
+        np.ndarray: Posições em ordem crescente
+    """
+    rng = np.random.default_rng(seed)
+    if n <= size:
+        return np.arange(n)
+    if groups is None:
+        return np.sort(rng.choice(n, size, replace=False))
+
+    codes, uniques = pd.factorize(np.asarray(groups), use_na_sentinel=False)
+    if len(uniques) > MAX_STRATA:
+        return np.sort(rng.choice(n, size, replace=False))
+    counts = np.bincount(codes)
+    # Primeiro o mínimo de cada grupo, depois o restante proporcional (o total nunca passa de size)
+    floors = np.minimum(counts, MIN_STRATUM_ROWS)
+    spare = max(size - int(floors.sum()), 0)
+    quotas = floors + np.floor(spare * (counts - floors) / max(n - int(floors.sum()), 1)).astype(np.int64)
+    # Ordena por (grupo, chave aleatória) e pega as primeiras linhas de cada grupo
+    order = np.lexsort((rng.random(n), codes))
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    rank = np.arange(n) - np.repeat(starts, counts)
+    return np.sort(order[rank < np.repeat(quotas, counts)])
+
+
+def stratified_sample(df: pd.DataFrame, size: int, by=None, seed: int = 0) -> pd.DataFrame:
+    """
+    Amostra do DataFrame na ordem original, estratificada pela coluna 'by' quando informada
+
+    Args:
+        df: DataFrame completo
+        size: Tamanho máximo da amostra (0 desativa)
+        by: Nome da coluna de estratificação
+        seed: Semente da amostragem
+
+    Returns:
+        pd.DataFrame: O próprio df ou a amostra
+    """
+    if size <= 0 or len(df) <= size:
+        return df
+    groups = df[by] if by is not None and by in df.columns else None
+    return df.iloc[stratified_positions(len(df), size, groups, seed)]
+
+
+# Estado do worker: limite de pontos por elemento, avisos do gráfico atual e DataFrame mapeado
+_max_points = 0
+_notes = []
+_frame_cache = {}
+
+
+def _note(text: str) -> None:
+    """Registra um aviso sobre a redução de dados no gráfico atual"""
+    if text not in _notes:
+        _notes.append(text)
+
+
+def _is_vector(value) -> bool:
+    return isinstance(value, (pd.Series, pd.Index, np.ndarray, list)) and np.ndim(value) == 1
+
+
+def _guard_scatter(original):
+    """Dispersões acima do limite: hexbin se a cor é única, senão amostra estratificada pela cor"""
+    def scatter(ax, x, y, s=None, c=None, *args, **kwargs):
+        n = len(x) if _is_vector(x) else 0
+        if not _max_points or n <= _max_points:
+            return original(ax, x, y, s, c, *args, **kwargs)
+        per_point = [value for value in (s, c) if _is_vector(value) and len(value) == n]
+        per_point += [value for key, value in kwargs.items()
+                      if key in ('color', 'edgecolors', 'linewidths') and _is_vector(value) and len(value) == n]
+        if not per_point:
+            _note(f"dispersão com {n:,} pontos desenhada como hexbin (densidade)".replace(',', '.'))
+            return ax.hexbin(np.asarray(x), np.asarray(y), gridsize=HEXBIN_GRIDSIZE, mincnt=1, bins='log',
+                             cmap=kwargs.get('cmap') or 'viridis')
+        positions = stratified_positions(n, _max_points, c if _is_vector(c) and len(c) == n else None)
+        take = lambda value: (np.asarray(value)[positions] if _is_vector(value) and len(value) == n else value)
+        _note(f"dispersão com {n:,} pontos desenhada a partir de amostra de {len(positions):,}".replace(',', '.'))
+        kwargs = {key: take(value) for key, value in kwargs.items()}
+        return original(ax, take(x), take(y), take(s), take(c), *args, **kwargs)
+    return scatter
+
+
+def _reduce_line(x, y) -> tuple:
+    """Reduz uma linha acima do limite: LTTB quando x é crescente, senão um ponto a cada k"""
+    n = len(y)
+    x_values = np.arange(n) if x is None else np.asarray(x)
+    try:
+        x_numeric = (x_values.astype('datetime64[ns]').astype(np.int64) if np.issubdtype(x_values.dtype, np.datetime64)
+                     else x_values.astype(np.float64))
+        y_numeric = np.asarray(y, dtype=np.float64)
+        monotonic = bool(np.all(np.diff(x_numeric) >= 0))
+    except (TypeError, ValueError):
+        monotonic = False
+    if monotonic:
+        positions = lttb(x_numeric, y_numeric, LTTB_POINTS)
+        _note(f"linha com {n:,} pontos reduzida a {len(positions):,} por LTTB".replace(',', '.'))
+    else:
+        positions = np.arange(0, n, int(np.ceil(n / _max_points)))
+        _note(f"linha com {n:,} pontos reduzida a {len(positions):,}".replace(',', '.'))
+    return (None if x is None else x_values[positions]), np.asarray(y)[positions]
+
+
+def _guard_plot(original):
+    """Linhas acima do limite passam pelo LTTB; aceita as formas plot(y), plot(x, y) e plot(x, y, fmt, ...)"""
+    def plot(ax, *args, **kwargs):
+        if not _max_points:
+            return original(ax, *args, **kwargs)
+        args = list(args)
+        i = 0
+        while i < len(args):
+            if not _is_vector(args[i]):
+                i += 1
+                continue
+            has_x = i + 1 < len(args) and _is_vector(args[i + 1])
+            x, y = (args[i], args[i + 1]) if has_x else (None, args[i])
+            if len(y) > _max_points and (x is None or len(x) == len(y)):
+                x, y = _reduce_line(x, y)
+                if has_x:
+                    args[i], args[i + 1] = x, y
+                else:
+                    args[i] = y
+            i += 2 if has_x else 1
+        return original(ax, *args, **kwargs)
+    return plot
+
+
+def _guard_seaborn(original):
+    """Funções ponto a ponto do seaborn recebem amostra estratificada pelo hue acima do limite"""
+    def function(*args, **kwargs):
+        if not _max_points:
+            return original(*args, **kwargs)
+        args = list(args)
+        limit = _max_points // MULTI_PANEL_SEABORN.get(original.__name__, 1)
+        data_pos = 0 if args and isinstance(args[0], pd.DataFrame) else None
+        data = args[0] if data_pos is not None else kwargs.get('data')
+        hue = kwargs.get('hue')
+        if isinstance(data, pd.DataFrame) and len(data) > limit:
+            sample = stratified_sample(data, limit, by=hue if isinstance(hue, str) else None)
+            if data_pos is not None:
+                args[0] = sample
+            else:
+                kwargs['data'] = sample
+            _note(f"{original.__name__}: amostra estratificada de {len(sample):,} de {len(data):,} linhas"
+                  .replace(',', '.'))
+        elif data is None:
+            # Vetores soltos (x=df['a'], y=df['b'], hue=...) com o mesmo tamanho são amostrados juntos
+            keys = [key for key in ('x', 'y', 'hue', 'size', 'style', 'weights')
+                    if _is_vector(kwargs.get(key)) and len(kwargs[key]) > limit]
+            lengths = {len(kwargs[key]) for key in keys}
+            if len(lengths) == 1:
+                n = lengths.pop()
+                positions = stratified_positions(n, limit, kwargs['hue'] if 'hue' in keys else None)
+                for key in keys:
+                    value = kwargs[key]
+                    kwargs[key] = value.iloc[positions] if isinstance(value, pd.Series) else np.asarray(value)[positions]
+                _note(f"{original.__name__}: amostra estratificada de {len(positions):,} de {n:,} linhas"
+                      .replace(',', '.'))
+        return original(*args, **kwargs)
+    function.__name__ = original.__name__
+    function.__doc__ = original.__doc__
+    return function
+
+
+def _guard_errorbar(original):
+    """Intervalos de confiança por bootstrap viram ±2 erros padrão acima do limite de linhas"""
+    def function(*args, **kwargs):
+        data = args[0] if args and isinstance(args[0], pd.DataFrame) else kwargs.get('data')
+        vector = next((value for key, value in kwargs.items() if key in ('x', 'y') and _is_vector(value)), None)
+        n = len(data) if isinstance(data, pd.DataFrame) else (len(vector) if vector is not None else 0)
+        if _max_points and n > _max_points and 'errorbar' not in kwargs and 'ci' not in kwargs:
+            kwargs['errorbar'] = ('se', 2)
+            _note(f"{original.__name__}: intervalo de ±2 erros padrão em vez de bootstrap sobre {n:,} linhas"
+                  .replace(',', '.'))
+        return original(*args, **kwargs)
+    function.__name__ = original.__name__
+    function.__doc__ = original.__doc__
+    return function
+
+
+def install_plot_guards(max_points: int) -> None:
+    """
+    Instala a camada de redução de dados no matplotlib/seaborn do processo atual
+
+    Acima de max_points elementos, dispersões viram hexbin (ou amostra estratificada pela cor),
+    linhas passam pelo LTTB, as funções ponto a ponto do seaborn recebem amostra estratificada
+    e as de intervalo de confiança trocam o bootstrap pelo erro padrão. Histogramas e
+    agregações continuam exatos, sobre os dados completos.
+    """
+    global _max_points
+    _max_points = max_points
+    from matplotlib.axes import Axes
+    import seaborn as sns
+
+    if not getattr(Axes.scatter, '_plot_guard', False):
+        for name, guard in (('scatter', _guard_scatter), ('plot', _guard_plot)):
+            wrapped = guard(getattr(Axes, name))
+            wrapped._plot_guard = True
+            setattr(Axes, name, wrapped)
+        for name in POINT_LEVEL_SEABORN:
+            if hasattr(sns, name):
+                setattr(sns, name, _guard_seaborn(getattr(sns, name)))
+        for name in BOOTSTRAP_SEABORN:
+            if hasattr(sns, name):
+                setattr(sns, name, _guard_errorbar(getattr(sns, name)))
+
+
+def _init_chart_worker(max_memory_mb: int, max_points: int) -> None:
+    """
+    Prepara o processo worker: backend sem tela, bibliotecas já importadas, camada de redução
+    de dados e limite de memória
+
+    O limite de memória vale para o espaço de endereçamento, medido a partir do que o
+    worker já ocupa depois dos imports.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot  # noqa: F401
+    import seaborn  # noqa: F401
+
+    install_plot_guards(max_points)
+
+    if resource is None:
+        return
+    signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    if max_memory_mb > 0:
+        with open('/proc/self/statm') as fh:
+            baseline = int(fh.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+        limit = baseline + max_memory_mb * 1024 ** 2
+        resource.setrlimit(resource.RLIMIT_AS, (limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+
+
+def _load_frame(source) -> pd.DataFrame:
+    """DataFrame do gráfico: enviado pelo processo principal ou mapeado do arquivo Arrow do cache colunar"""
+    if isinstance(source, pd.DataFrame):
+        return source
+    if source not in _frame_cache:
+        # Só o último arquivo fica mapeado no worker
+        _frame_cache.clear()
+        with pa.memory_map(source, 'r') as mapped:
+            _frame_cache[source] = pa_ipc.open_file(mapped).read_all().to_pandas(split_blocks=True)
+    return _frame_cache[source]
+
+
+def _render_chart(code: str, source, cpu_seconds: int, dpi: int) -> tuple:
+    """Executa o código do gráfico no worker e devolve (PNG, avisos sobre redução de dados)"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    if resource is not None and cpu_seconds > 0:
+        # O limite de CPU é acumulado por processo: soma ao que o worker já usou
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = int(usage.ru_utime + usage.ru_stime) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (used + cpu_seconds, resource.RLIM_INFINITY))
+    _notes.clear()
+    try:
+        df = _load_frame(source)
+        exec(code, {"df": df, "plt": plt, "sns": sns, "pd": pd, "np": np})
+        buffer = io.BytesIO()
+        plt.gcf().savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+        return buffer.getvalue(), list(_notes)
+    except _CpuLimitExceeded:
+        raise ChartError(f"o gráfico excedeu o limite de {cpu_seconds}s de CPU")
+    except MemoryError:
+        _frame_cache.clear()
+        raise ChartError("o gráfico excedeu o limite de memória")
+    except Exception as e:
+        raise ChartError(f"{type(e).__name__}: {e}")
+    finally:
+        if resource is not None and cpu_seconds > 0:
+            resource.setrlimit(resource.RLIMIT_CPU, (resource.RLIM_INFINITY, resource.RLIM_INFINITY))
+        plt.close('all')
+
+
+def _stratify_column(df: pd.DataFrame, code: str):
+    """Coluna usada como hue no código, para a amostra manter todos os grupos"""
+    match = re.search(r"hue\s*=\s*['\"]([^'\"]+)['\"]", code)
+    return match.group(1) if match and match.group(1) in df.columns else None
+
+
+class ChartRenderer:
+    """Executa o código de gráfico gerado pelo LLM em processos separados, com limites e cache de figuras"""
+
+    def __init__(self, workers: int = 1, timeout: float = 30.0, cpu_seconds: int = 20, max_memory_mb: int = 1024,
+                 max_rows: int = 200000, max_points: int = 50000, cache_entries: int = 64, dpi: int = 100):
+        """
+        Args:
+            workers: Quantidade de processos do pool
+            timeout: Tempo máximo de parede (s) por gráfico; acima dele o worker é encerrado
+            cpu_seconds: Tempo máximo de CPU (s) por gráfico dentro do worker
+            max_memory_mb: Memória adicional permitida a cada worker
+            max_rows: Linhas enviadas ao worker quando os dados não podem ser mapeados do cache colunar;
+                DataFrames maiores recebem amostra estratificada
+            max_points: Pontos por dispersão/linha acima dos quais entram hexbin, LTTB e amostragem (0 desativa)
+            cache_entries: Quantidade de figuras PNG guardadas em memória (0 desativa)
+            dpi: Resolução das figuras
+        """
+        self.workers = workers
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.max_memory_mb = max_memory_mb
+        self.max_rows = max_rows
+        self.max_points = max_points
+        self.cache_entries = cache_entries
+        self.dpi = dpi
+        self.stats = {'renders': 0, 'hits': 0, 'errors': 0, 'timeouts': 0}
+        self._cache = OrderedDict()
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'ChartRenderer':
+        """Cria o renderizador a partir das variáveis CHART_*"""
+        return cls(
+            workers=max(1, int(os.getenv("CHART_WORKERS", "1"))),
+            timeout=float(os.getenv("CHART_TIMEOUT_SECONDS", "30")),
+            cpu_seconds=int(os.getenv("CHART_CPU_SECONDS", "20")),
+            max_memory_mb=int(os.getenv("CHART_MAX_MEMORY_MB", "1024")),
+            max_rows=int(os.getenv("CHART_MAX_ROWS", "200000")),
+            max_points=int(os.getenv("CHART_MAX_POINTS", "50000")),
+            cache_entries=int(os.getenv("CHART_CACHE_ENTRIES", "64"))
+        )
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Pool de workers (spawn, seguro dentro do servidor Streamlit), criado na primeira renderização"""
+        if self._pool is None:
+            # Os workers herdam o sys.path de quando são criados; fora de uma execução do script
+            # (ex.: pré-aquecimento em segundo plano) o Streamlit já removeu dele a pasta do app
+            module_dir = os.path.dirname(os.path.abspath(__file__))
+            if module_dir not in sys.path:
+                sys.path.append(module_dir)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=get_context('spawn'),
+                initializer=_init_chart_worker,
+                initargs=(self.max_memory_mb, self.max_points)
+            )
+        return self._pool
+
+    def _reset_pool(self, pool=None) -> None:
+        """
+        Encerra os workers (ex.: gráfico travado) para o próximo gráfico começar num pool novo
+
+        Args:
+            pool: Pool em que a falha ocorreu; se outra sessão já o trocou, o pool novo é mantido
+        """
+        if self._pool is None or (pool is not None and pool is not self._pool):
+            return
+        for process in list((self._pool._processes or {}).values()):
+            process.terminate()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+    def warm_up(self) -> None:
+        """Sobe os workers antes do primeiro gráfico; cada um já importa matplotlib e seaborn ao iniciar"""
+        with self._lock:
+            pool = self._get_pool()
+        futures = [pool.submit(os.getpid) for _ in range(self.workers)]
+        for future in futures:
+            future.result(timeout=self.timeout)
+
+    def shutdown(self) -> None:
+        """Encerra os workers do pool"""
+        with self._lock:
+            self._reset_pool()
+
+    def _can_map(self, arrow_path) -> bool:
+        """O arquivo Arrow é usado direto pelo worker se existir e couber com folga no limite de memória"""
+        if pa is None or not arrow_path or not os.path.exists(arrow_path):
+            return False
+        return self.max_memory_mb <= 0 or os.path.getsize(arrow_path) <= self.max_memory_mb * 1024 ** 2 // 2
+
+    def _submit(self, code: str, source, attempts: int = 3) -> tuple:
+        """
+        Executa o gráfico no pool e espera o resultado
+
+        O pool é compartilhado pelas sessões: quando o gráfico travado de outra sessão derruba os
+        workers, os gráficos que estavam na fila ou rodando ao lado são cancelados sem culpa e
+        voltam a ser enviados ao pool novo.
+
+        Returns:
+            tuple: (bytes PNG, avisos sobre redução de dados)
+
+        Raises:
+            ChartError: Erro no código ou limite de tempo/memória excedido
+        """
+        for attempt in range(attempts):
+            future = None
+            try:
+                with self._lock:
+                    pool = self._get_pool()
+                    future = pool.submit(_render_chart, code, source, self.cpu_seconds, self.dpi)
+                return future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                with self._lock:
+                    self.stats['timeouts'] += 1
+                    self._reset_pool(pool)
+                raise ChartError(f"o gráfico excedeu o limite de {self.timeout:.0f}s")
+            except (CancelledError, BrokenProcessPool):
+                with self._lock:
+                    # Pool trocado por outra sessão enquanto este gráfico esperava, ou já quebrado
+                    # antes do envio: o gráfico não chegou a falhar e vai para um pool novo
+                    retry = pool is not self._pool or future is None
+                    self._reset_pool(pool)
+                    if retry and attempt + 1 < attempts:
+                        continue
+                    self.stats['errors'] += 1
+                # O worker morreu (ex.: memória esgotada fora do Python); o pool é recriado no próximo gráfico
+                raise ChartError("o processo do gráfico foi encerrado (memória ou tempo esgotados)")
+            except ChartError:
+                with self._lock:
+                    self.stats['errors'] += 1
+                raise
+
+    def render(self, code: str, df: pd.DataFrame, dataset_key: str, arrow_path=None) -> tuple:
+        """
+        Gera o PNG do gráfico, reaproveitando a figura se o mesmo código já rodou sobre os mesmos dados
+
+        Args:
+            code: Código Python do gráfico (usa 'df' e 'plt')
+            df: DataFrame do gráfico
+            dataset_key: Impressão digital dos dados (hash do arquivo de origem)
+            arrow_path: Arquivo do cache colunar com os mesmos dados de df; o worker o mapeia em
+                memória e recebe os dados completos sem cópia pelo pipe
+
+        Returns:
+            tuple: (bytes PNG, dict com 'rows' (linhas vistas pelo código), 'notes' (reduções
+                aplicadas pela camada de dados) e 'cached')
+
+        Raises:
+            ChartError: Erro no código ou limite de tempo/memória excedido
+        """
+        source = arrow_path if self._can_map(arrow_path) else None
+        rows = len(df) if source or self.max_rows <= 0 else min(len(df), self.max_rows)
+        key = content_hash(f"{code.strip()}\0{dataset_key}\0{rows}\0{self.dpi}\0{self.max_points}".encode())
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats['hits'] += 1
+                png, notes = self._cache[key]
+                return png, {'rows': rows, 'notes': notes, 'cached': True}
+
+        if source is None:
+            source = stratified_sample(df, self.max_rows, by=_stratify_column(df, code))
+        png, notes = self._submit(code, source)
+
+        with self._lock:
+            self.stats['renders'] += 1
+            if self.cache_entries > 0:
+                self._cache[key] = (png, notes)
+                while len(self._cache) > self.cache_entries:
+                    self._cache.popitem(last=False)
+        return png, {'rows': rows, 'notes': notes, 'cached': False}
+
+
+# Um renderizador por processo do servidor: workers e cache de figuras são compartilhados entre sessões
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_chart_renderer() -> ChartRenderer:
+    """Renderizador compartilhado, criado a partir do ambiente no primeiro uso"""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = ChartRenderer.from_env()
+        return _renderer
@@ -0,0 +1,188 @@
+import os
+import threading
+import time
+from typing import Optional
+
+import pandas as pd
+
+from utils_openai import ColumnarCache
+
+
+class _Dataset:
+    """DataFrame base compartilhado e as sessões que o usam"""
+
+    def __init__(self, df: pd.DataFrame, source: str):
+        self.df = df
+        self.source = source
+        self.bytes = int(df.memory_usage(deep=True).sum())
+        self.sessions = set()
+        self.last_used = time.time()
+
+
+class DatasetStore:
+    """
+    DataFrames compartilhados pelas sessões do processo, indexados pelo hash do conteúdo do CSV
+
+    Cada sessão recebe uma visão própria do mesmo DataFrame (cópia rasa: com o copy-on-write do
+    pandas, ligado em configure_process, os dados só são copiados se a sessão alterar a visão),
+    então N pessoas abrindo o mesmo arquivo ocupam a memória de uma. Conjuntos que nenhuma sessão
+    usa continuam residentes até o orçamento de memória, e então vão para o cache colunar em
+    disco, de onde voltam por memory-map.
+    """
+
+    def __init__(self, max_bytes: int = 4 * 1024 ** 3, columnar_cache: Optional[ColumnarCache] = None):
+        """
+        Args:
+            max_bytes: Orçamento de memória dos DataFrames residentes
+            columnar_cache: Cache em disco usado para despejar e recarregar conjuntos (None só descarta)
+        """
+        self.max_bytes = max_bytes
+        self.columnar_cache = columnar_cache
+        self._datasets = {}
+        self._lock = threading.Lock()
+        self.stats = {'shared': 0, 'disk_loads': 0, 'spills': 0, 'evictions': 0}
+
+    @classmethod
+    def from_env(cls) -> 'DatasetStore':
+        """Cria o repositório a partir de DATASET_STORE_MAX_MB e do cache colunar (CSV_CACHE_DIR/CSV_CACHE_MAX_MB)"""
+        max_mb = float(os.getenv("DATASET_STORE_MAX_MB", "4096"))
+        return cls(int(max_mb * 1024 ** 2), ColumnarCache.from_env())
+
+    def get(self, key: str, session_id: str) -> Optional[pd.DataFrame]:
+        """
+        Visão do conjunto para a sessão, se ele já estiver residente ou despejado no cache colunar
+
+        Args:
+            key: Hash do conteúdo do CSV de origem
+            session_id: Sessão que passa a usar o conjunto
+
+        Returns:
+            pd.DataFrame: Visão do DataFrame compartilhado ou None se o conjunto for desconhecido
+        """
+        with self._lock:
+            dataset = self._datasets.get(key)
+            if dataset is not None:
+                if session_id not in dataset.sessions and dataset.sessions:
+                    self.stats['shared'] += 1
+                return self._attach(dataset, session_id)
+
+        if self.columnar_cache is None:
+            return None
+        # Fora do lock: a leitura é só um memory-map, mas não deve segurar as outras sessões
+        df = self.columnar_cache.load(key)
+        if df is None:
+            return None
+        with self._lock:
+            self.stats['disk_loads'] += 1
+        return self.put(key, df, session_id, source='disco')
+
+    def put(self, key: str, df: pd.DataFrame, session_id: str, source: str = 'csv') -> pd.DataFrame:
+        """
+        Registra o DataFrame de uma sessão; se outra sessão já registrou o mesmo conteúdo, usa o dela
+
+        Args:
+            key: Hash do conteúdo do CSV de origem
+            df: DataFrame já tipado
+            session_id: Sessão que usa o conjunto
+            source: Origem dos dados ('csv' ou 'disco'), para as estatísticas
+
+        Returns:
+            pd.DataFrame: Visão do DataFrame compartilhado para a sessão
+        """
+        with self._lock:
+            dataset = self._datasets.get(key)
+            if dataset is None:
+                dataset = self._datasets[key] = _Dataset(df, source)
+            elif session_id not in dataset.sessions and dataset.sessions:
+                self.stats['shared'] += 1
+            view = self._attach(dataset, session_id)
+            spill = self._evict()
+        self._spill(spill)
+        return view
+
+    def _attach(self, dataset: _Dataset, session_id: str) -> pd.DataFrame:
+        """Marca o uso pela sessão e devolve uma visão sem cópia (chamar com o lock)"""
+        dataset.sessions.add(session_id)
+        dataset.last_used = time.time()
+        return dataset.df.copy(deep=False)
+
+    def release(self, key: str, session_id: str) -> None:
+        """A sessão deixou de usar o conjunto (ele continua residente enquanto couber no orçamento)"""
+        with self._lock:
+            dataset = self._datasets.get(key)
+            if dataset is not None:
+                dataset.sessions.discard(session_id)
+            spill = self._evict()
+        self._spill(spill)
+
+    def release_session(self, session_id: str) -> None:
+        """Libera todos os conjuntos de uma sessão encerrada"""
+        with self._lock:
+            for dataset in self._datasets.values():
+                dataset.sessions.discard(session_id)
+            spill = self._evict()
+        self._spill(spill)
+
+    def _evict(self) -> list:
+        """
+        Tira da memória os conjuntos sem sessão, do uso mais antigo ao mais recente, até caber no
+        orçamento (chamar com o lock); conjuntos em uso nunca são removidos
+
+        Returns:
+            list: (chave, DataFrame) a gravar no cache colunar fora do lock
+        """
+        total = sum(dataset.bytes for dataset in self._datasets.values())
+        idle = sorted((dataset.last_used, key) for key, dataset in self._datasets.items() if not dataset.sessions)
+        spill = []
+        for _, key in idle:
+            if total <= self.max_bytes:
+                break
+            dataset = self._datasets.pop(key)
+            total -= dataset.bytes
+            self.stats['evictions'] += 1
+            spill.append((key, dataset.df))
+        return spill
+
+    def _spill(self, datasets: list) -> None:
+        """Grava no cache colunar os conjuntos despejados que ainda não estão em disco"""
+        if self.columnar_cache is None:
+            return
+        for key, df in datasets:
+            if not os.path.exists(self.columnar_cache.path_for(key)) and self.columnar_cache.store(key, df):
+                with self._lock:
+                    self.stats['spills'] += 1
+
+    def get_stats(self) -> dict:
+        """
+        Memória residente do repositório para o painel de operação
+
+        Returns:
+            dict: datasets, resident_mb, referenced_mb, budget_mb, over_budget, sessions, contadores
+                (shared, disk_loads, spills, evictions) e items (um dict por conjunto, do maior ao menor)
+        """
+        with self._lock:
+            items = [{'key': key[:12], 'rows': len(dataset.df), 'columns': dataset.df.shape[1],
+                      'mb': dataset.bytes / 1024 ** 2, 'sessions': len(dataset.sessions), 'source': dataset.source,
+                      'idle_seconds': time.time() - dataset.last_used if not dataset.sessions else 0.0}
+                     for key, dataset in self._datasets.items()]
+            sessions = set().union(*(dataset.sessions for dataset in self._datasets.values()))
+            counters = dict(self.stats)
+        resident = sum(item['mb'] for item in items)
+        referenced = sum(item['mb'] for item in items if item['sessions'])
+        return dict(counters, datasets=len(items), resident_mb=resident, referenced_mb=referenced,
+                    budget_mb=self.max_bytes / 1024 ** 2, over_budget=resident > self.max_bytes / 1024 ** 2,
+                    sessions=len(sessions), items=sorted(items, key=lambda item: item['mb'], reverse=True))
+
+
+# Repositório do processo, compartilhado por todas as sessões do Streamlit
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_dataset_store() -> DatasetStore:
+    """Repositório compartilhado, criado a partir do ambiente no primeiro uso"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DatasetStore.from_env()
+        return _store
@@ -0,0 +1,204 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from utils_openai import parse_currency_series, format_currency
+
+
+def _column(df: pd.DataFrame, name: str):
+    """Nome real da coluna (comparação sem diferenciar maiúsculas) ou None"""
+    columns = {str(col).lower(): col for col in df.columns}
+    return columns.get(name)
+
+
+def _numeric(df: pd.DataFrame, name: Optional[str]) -> np.ndarray:
+    """Coluna como float64 (valores em formato brasileiro são convertidos); zeros se não existir"""
+    if name is None:
+        return np.zeros(len(df))
+    series = df[name]
+    if not pd.api.types.is_numeric_dtype(series):
+        series = parse_currency_series(series, fill_value=0.0)
+    return series.to_numpy(dtype=np.float64, na_value=0.0)
+
+
+def _whole(values: np.ndarray) -> np.ndarray:
+    """Somas como inteiros quando não há casas decimais (quantidades em unidades)"""
+    return values.astype(np.int64) if np.all(np.mod(values, 1) == 0) else values
+
+
+def _join_keys(header_keys: pd.Series, item_keys: pd.Series) -> tuple:
+    """Chaves da nota nos dois arquivos com o mesmo tipo (texto quando um lado não é numérico)"""
+    if pd.api.types.is_numeric_dtype(header_keys) and pd.api.types.is_numeric_dtype(item_keys):
+        return header_keys.astype('float64'), item_keys.astype('float64')
+    return header_keys.astype(str).str.strip(), item_keys.astype(str).str.strip()
+
+
+class InvoiceIndex:
+    """
+    Índice cabeçalho↔itens de notas fiscais, montado uma vez no carregamento
+
+    Guarda um índice hash do número da nota no cabeçalho, as posições dos itens de cada nota
+    (ordenadas, em formato CSR) e rankings pré-calculados por fornecedor e por produto.
+    """
+
+    def __init__(self, header: pd.DataFrame, items: pd.DataFrame):
+        """
+        Args:
+            header: DataFrame de cabeçalho (precisa da coluna 'numero')
+            items: DataFrame de itens (precisa da coluna 'numero_nf')
+        """
+        self.header = header
+        self.items = items
+        header_key, item_key = _column(header, 'numero'), _column(items, 'numero_nf')
+        header_keys, item_keys = _join_keys(header[header_key], items[item_key])
+
+        # Índice hash: número da nota -> linha do cabeçalho (a primeira, se houver números repetidos)
+        self.header_index = pd.Index(header_keys.to_numpy())
+        self.header_rows = np.arange(len(header))
+        if not self.header_index.is_unique:
+            first = ~self.header_index.duplicated()
+            self.header_index, self.header_rows = self.header_index[first], np.flatnonzero(first)
+        found = self.header_index.get_indexer(item_keys.to_numpy())
+        positions = np.where(found >= 0, self.header_rows[np.maximum(found, 0)], -1)
+        matched = positions >= 0
+        self.items_matched = int(matched.sum())
+        self.items_unmatched = int(len(items) - self.items_matched)
+        self.invoices_with_items = int(np.count_nonzero(np.bincount(positions[matched], minlength=len(header))))
+
+        # Itens de cada nota: posições ordenadas por nota + início/fim de cada uma (lookup O(1))
+        invoice_codes, invoice_keys = pd.factorize(item_keys, sort=False)
+        order = np.argsort(invoice_codes, kind='stable')
+        self.item_order = order[invoice_codes[order] >= 0]
+        counts = np.bincount(invoice_codes[invoice_codes >= 0], minlength=len(invoice_keys))
+        self.item_offsets = np.r_[0, np.cumsum(counts)]
+        self.item_key_index = pd.Index(invoice_keys)
+
+        item_values = _numeric(items, _column(items, 'valor_total'))
+        item_quantities = _numeric(items, _column(items, 'quantidade'))
+        self.suppliers = self._supplier_table(positions, matched, item_values, item_quantities)
+        self.products = self._product_table(invoice_codes, item_values, item_quantities)
+
+    @classmethod
+    def build(cls, header: pd.DataFrame, items: pd.DataFrame) -> Optional['InvoiceIndex']:
+        """
+        Monta o índice se os dois arquivos tiverem as colunas de ligação
+
+        Returns:
+            InvoiceIndex: Índice ou None se faltar 'numero' no cabeçalho ou 'numero_nf' nos itens
+        """
+        if _column(header, 'numero') is None or _column(items, 'numero_nf') is None:
+            return None
+        return cls(header, items)
+
+    def _supplier_table(self, positions: np.ndarray, matched: np.ndarray,
+                        item_values: np.ndarray, item_quantities: np.ndarray) -> Optional[pd.DataFrame]:
+        """Notas, montante das notas, itens, quantidade e valor dos itens por fornecedor"""
+        supplier_col = _column(self.header, 'nome_fornecedor') or _column(self.header, 'cnpj_fornecedor')
+        if supplier_col is None:
+            return None
+
+        codes, names = pd.factorize(self.header[supplier_col], sort=False)
+        n = len(names)
+        valid = codes >= 0
+        header_values = _numeric(self.header, _column(self.header, 'valor_total'))
+        # Fornecedor de cada item, via a linha do cabeçalho da sua nota
+        item_suppliers = np.full(len(positions), -1)
+        item_suppliers[matched] = codes[positions[matched]]
+        item_valid = item_suppliers >= 0
+
+        table = pd.DataFrame({
+            'notas': np.bincount(codes[valid], minlength=n),
+            'valor_notas': np.bincount(codes[valid], weights=header_values[valid], minlength=n),
+            'itens': np.bincount(item_suppliers[item_valid], minlength=n),
+            'quantidade': _whole(np.bincount(item_suppliers[item_valid], weights=item_quantities[item_valid], minlength=n)),
+            'valor_itens': np.bincount(item_suppliers[item_valid], weights=item_values[item_valid], minlength=n),
+        }, index=pd.Index(names, name=supplier_col))
+        cnpj_col = _column(self.header, 'cnpj_fornecedor')
+        if cnpj_col is not None and cnpj_col != supplier_col:
+            first = pd.Series(np.arange(len(codes)))[valid].groupby(codes[valid]).first()
+            table.insert(0, 'cnpj_fornecedor', self.header[cnpj_col].to_numpy()[first.to_numpy()])
+        # Ordem do ranking: montante das notas; sem valor no cabeçalho, valor dos itens
+        order_by = 'valor_notas' if table['valor_notas'].any() else 'valor_itens'
+        return table.sort_values(order_by, ascending=False)
+
+    def _product_table(self, invoice_codes: np.ndarray, item_values: np.ndarray,
+                       item_quantities: np.ndarray) -> Optional[pd.DataFrame]:
+        """Itens, notas distintas, quantidade e valor por produto"""
+        product_col = _column(self.items, 'codigo_produto') or _column(self.items, 'descricao')
+        if product_col is None:
+            return None
+
+        codes, products = pd.factorize(self.items[product_col], sort=False)
+        n = len(products)
+        valid = codes >= 0
+        # Notas distintas por produto: pares (produto, nota) sem repetição, codificados em um único inteiro
+        paired = valid & (invoice_codes >= 0)
+        stride = int(invoice_codes.max(initial=-1)) + 1 or 1
+        pairs = pd.unique(codes[paired].astype(np.int64) * stride + invoice_codes[paired])
+
+        table = pd.DataFrame({
+            'itens': np.bincount(codes[valid], minlength=n),
+            'notas': np.bincount(pairs // stride, minlength=n),
+            'quantidade': _whole(np.bincount(codes[valid], weights=item_quantities[valid], minlength=n)),
+            'valor_total': np.bincount(codes[valid], weights=item_values[valid], minlength=n),
+        }, index=pd.Index(products, name=product_col))
+        description_col = _column(self.items, 'descricao')
+        if description_col is not None and description_col != product_col:
+            first = pd.Series(np.arange(len(codes)))[valid].groupby(codes[valid]).first()
+            table.insert(0, 'descricao', self.items[description_col].to_numpy()[first.to_numpy()])
+        return table.sort_values('valor_total', ascending=False)
+
+    def lookup(self, numero) -> tuple:
+        """
+        Cabeçalho e itens de uma nota
+
+        Args:
+            numero: Número da nota
+
+        Returns:
+            tuple: (linha do cabeçalho ou None, DataFrame com os itens da nota)
+        """
+        key = float(numero) if pd.api.types.is_numeric_dtype(self.header_index) else str(numero).strip()
+        header_row = None
+        if key in self.header_index:
+            header_row = self.header.iloc[self.header_rows[self.header_index.get_loc(key)]]
+        if key not in self.item_key_index:
+            return header_row, self.items.iloc[0:0]
+        item_pos = self.item_key_index.get_loc(key)
+        rows = self.item_order[self.item_offsets[item_pos]:self.item_offsets[item_pos + 1]]
+        return header_row, self.items.iloc[rows]
+
+    def top_suppliers(self, n: int = 10) -> Optional[pd.DataFrame]:
+        """Fornecedores de maior montante (ranking pré-calculado)"""
+        return None if self.suppliers is None else self.suppliers.head(n)
+
+    def top_products(self, n: int = 10) -> Optional[pd.DataFrame]:
+        """Produtos de maior valor (ranking pré-calculado)"""
+        return None if self.products is None else self.products.head(n)
+
+    def summary(self) -> dict:
+        """Métricas do vínculo para a interface"""
+        return {
+            'notas': len(self.header),
+            'notas_com_itens': self.invoices_with_items,
+            'itens_vinculados': self.items_matched,
+            'itens_sem_cabecalho': self.items_unmatched,
+            'fornecedores': 0 if self.suppliers is None else len(self.suppliers),
+            'produtos': 0 if self.products is None else len(self.products),
+        }
+
+    def context_text(self, n: int = 5) -> str:
+        """Resumo do vínculo e dos rankings para o contexto do agente"""
+        summary = self.summary()
+        lines = [f"Vínculo cabeçalho↔itens (numero = numero_nf): {summary['itens_vinculados']} itens vinculados, "
+                 f"{summary['itens_sem_cabecalho']} sem cabeçalho, {summary['notas_com_itens']} notas com itens."]
+        if self.suppliers is not None:
+            top = ', '.join(f"{name} ({format_currency(row['valor_notas'] or row['valor_itens'])})"
+                            for name, row in self.suppliers.head(n).iterrows())
+            lines.append(f"Maiores fornecedores: {top}")
+        if self.products is not None:
+            top = ', '.join(f"{row.get('descricao', name)} [{name}] ({format_currency(row['valor_total'])})"
+                            for name, row in self.products.head(n).iterrows())
+            lines.append(f"Produtos de maior valor: {top}")
+        return '\n'.join(lines)
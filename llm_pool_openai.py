@@ -0,0 +1,424 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import weakref
+from typing import Optional
+
+import httpx
+
+
+# Rotas da API cujas requisições idênticas em andamento são atendidas por uma única chamada
+COALESCED_PATHS = ('/chat/completions', '/completions', '/embeddings')
+
+# Intervalo de espera por uma vaga do semáforo no caminho assíncrono (s)
+ASYNC_POLL_SECONDS = 0.01
+
+
+class _Flight:
+    """Resposta de uma chamada em andamento, repassada ao líder e aos seguidores à medida que chega"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.status = None
+        self.headers = None
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.followers = 0
+
+    def start(self, status: int, headers) -> None:
+        with self.condition:
+            self.status, self.headers = status, headers
+            self.condition.notify_all()
+
+    def append(self, chunk: bytes) -> None:
+        with self.condition:
+            self.chunks.append(chunk)
+            self.condition.notify_all()
+
+    def finish(self, error: Optional[Exception] = None) -> None:
+        with self.condition:
+            if not self.done:
+                self.done, self.error = True, error
+                self.condition.notify_all()
+
+    def wait_headers(self, timeout: Optional[float]) -> None:
+        """Espera o status e os cabeçalhos do líder (ou repassa o erro dele)"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.status is not None or self.done, timeout):
+                raise httpx.ReadTimeout("Tempo esgotado aguardando a chamada compartilhada")
+            if self.status is None:
+                raise self.error or httpx.ReadError("A chamada compartilhada terminou sem resposta")
+
+
+class _LeaderStream(httpx.SyncByteStream):
+    """Corpo da resposta do líder: lê do servidor e guarda cada trecho para os seguidores"""
+
+    def __init__(self, transport: 'CoalescingTransport', key, flight: _Flight, upstream: httpx.SyncByteStream):
+        self.transport = transport
+        self.key = key
+        self.flight = flight
+        self.upstream = upstream
+        self._iterator = None
+        self._closed = False
+
+    def _chunks(self):
+        if self._iterator is None:
+            self._iterator = iter(self.upstream)
+        for chunk in self._iterator:
+            self.flight.append(chunk)
+            yield chunk
+        self.flight.finish()
+
+    def __iter__(self):
+        try:
+            yield from self._chunks()
+        except Exception as e:
+            self.flight.finish(e)
+            raise
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            # O líder desistiu antes do fim: termina a leitura para quem ainda espera a resposta
+            if not self.flight.done and self.flight.followers:
+                for _ in self._chunks():
+                    pass
+        except Exception as e:
+            self.flight.finish(e)
+        finally:
+            self.flight.finish(None if self.flight.done else httpx.ReadError("Resposta interrompida"))
+            self.upstream.close()
+            self.transport._land(self.key, self.flight)
+
+
+class _FollowerStream(httpx.SyncByteStream):
+    """Corpo da resposta de um seguidor: repete os trechos recebidos pelo líder"""
+
+    def __init__(self, flight: _Flight, timeout: Optional[float]):
+        self.flight = flight
+        self.timeout = timeout
+
+    def __iter__(self):
+        index = 0
+        while True:
+            with self.flight.condition:
+                if not self.flight.condition.wait_for(
+                        lambda: index < len(self.flight.chunks) or self.flight.done, self.timeout):
+                    raise httpx.ReadTimeout("Tempo esgotado aguardando a chamada compartilhada")
+                if index < len(self.flight.chunks):
+                    chunk = self.flight.chunks[index]
+                elif self.flight.error is not None:
+                    raise self.flight.error
+                else:
+                    return
+            index += 1
+            yield chunk
+
+
+class CoalescingTransport(httpx.BaseTransport):
+    """
+    Transporte HTTP síncrono com limite de chamadas simultâneas e junção de requisições idênticas
+
+    Requisições iguais (mesma rota, credencial e corpo) feitas enquanto uma delas está em andamento
+    não vão ao servidor: recebem a mesma resposta, inclusive em streaming, trecho a trecho.
+    """
+
+    def __init__(self, pool: 'LLMPool', transport: httpx.BaseTransport):
+        self.pool = pool
+        self.transport = transport
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _key(self, request: httpx.Request):
+        """Chave da requisição, ou None quando ela não pode ser compartilhada"""
+        if not self.pool.coalesce or request.method != 'POST' or not request.url.path.endswith(COALESCED_PATHS):
+            return None
+        digest = hashlib.sha256()
+        for part in (str(request.url), request.headers.get('authorization', ''),
+                     request.headers.get('openai-organization', '')):
+            digest.update(part.encode() + b'\0')
+        digest.update(request.read())
+        return digest.hexdigest()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = self._key(request)
+        flight = None
+        if key is not None:
+            with self._lock:
+                flight = self._in_flight.get(key)
+                following = flight is not None
+                if following:
+                    flight.followers += 1
+                else:
+                    flight = self._in_flight[key] = _Flight()
+            if following:
+                self.pool._count('coalesced')
+                timeout = (request.extensions.get('timeout') or {}).get('read')
+                flight.wait_headers(timeout)
+                return httpx.Response(flight.status, headers=flight.headers,
+                                      stream=_FollowerStream(flight, timeout), request=request)
+
+        self.pool._acquire()
+        try:
+            response = self.transport.handle_request(request)
+        except Exception as e:
+            self.pool._release()
+            if flight is not None:
+                flight.finish(e)
+                self._land(key, flight)
+            raise
+
+        if flight is None:
+            return httpx.Response(response.status_code, headers=response.headers,
+                                  stream=_ReleasingStream(self.pool, response.stream),
+                                  extensions=response.extensions, request=request)
+        flight.start(response.status_code, response.headers)
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=_ReleasingStream(self.pool, _LeaderStream(self, key, flight, response.stream)),
+                              extensions=response.extensions, request=request)
+
+    def _land(self, key, flight: _Flight) -> None:
+        """Tira a chamada concluída do mapa; requisições seguintes vão de novo ao servidor"""
+        with self._lock:
+            if self._in_flight.get(key) is flight:
+                del self._in_flight[key]
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Corpo que devolve a vaga do semáforo quando a resposta é fechada (a conexão fica livre)"""
+
+    def __init__(self, pool: 'LLMPool', stream):
+        self.pool = pool
+        self.stream = stream
+        self._released = False
+
+    def __iter__(self):
+        yield from self.stream
+
+    def close(self) -> None:
+        try:
+            self.stream.close()
+        finally:
+            if not self._released:
+                self._released = True
+                self.pool._release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, pool: 'LLMPool', stream):
+        self.pool = pool
+        self.stream = stream
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self.stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self.pool._release()
+
+
+class LimitingAsyncTransport(httpx.AsyncBaseTransport):
+    """
+    Transporte assíncrono que respeita o mesmo limite de chamadas simultâneas do caminho síncrono
+
+    Cada consulta em lote roda no seu próprio event loop (um asyncio.run por clique, em threads de
+    sessões diferentes); as conexões assíncronas só valem no loop que as abriu, então cada loop em
+    execução recebe o seu próprio pool de conexões, descartado quando o loop termina. A vaga é
+    disputada no semáforo do processo sem bloquear o loop, e as requisições não são juntadas.
+    """
+
+    def __init__(self, pool: 'LLMPool', limits: httpx.Limits):
+        self.pool = pool
+        self.limits = limits
+        self._transports = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        """Pool de conexões do event loop em execução"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # O transporte guarda referências ao loop, então os de loops encerrados saem aqui
+            for closed in [other for other in self._transports if other.is_closed()]:
+                del self._transports[closed]
+            if loop not in self._transports:
+                self._transports[loop] = httpx.AsyncHTTPTransport(limits=self.limits)
+            return self._transports[loop]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        transport = self._transport()
+        start = time.perf_counter()
+        while not self.pool._semaphore.acquire(blocking=False):
+            await asyncio.sleep(ASYNC_POLL_SECONDS)
+        self.pool._acquired(time.perf_counter() - start)
+        try:
+            response = await transport.handle_async_request(request)
+        except BaseException:
+            self.pool._release()
+            raise
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=_AsyncReleasingStream(self.pool, response.stream),
+                              extensions=response.extensions, request=request)
+
+    async def aclose(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.pop(loop, None)
+        if transport is not None:
+            await transport.aclose()
+
+
+class LLMPool:
+    """Clientes do LLM compartilhados pelo processo: conexões mantidas abertas, limite de chamadas e junção"""
+
+    def __init__(self, model: str = 'gpt-3.5-turbo', temperature: float = 0.1, max_concurrency: int = 8,
+                 max_connections: int = 20, keepalive_seconds: float = 60.0, coalesce: bool = True,
+                 base_url: Optional[str] = None):
+        """
+        Args:
+            model: Modelo usado por todas as sessões
+            temperature: Temperatura do modelo
+            max_concurrency: Máximo de chamadas ao servidor ao mesmo tempo; as demais esperam a vez
+            max_connections: Conexões HTTP abertas no pool (pelo menos max_concurrency)
+            keepalive_seconds: Tempo que uma conexão ociosa fica aberta para ser reutilizada
+            coalesce: Junta requisições idênticas em andamento numa única chamada
+            base_url: Servidor compatível com a API da OpenAI (None usa o padrão)
+        """
+        self.model = model
+        self.temperature = temperature
+        self.max_concurrency = max_concurrency
+        self.coalesce = coalesce
+        self.base_url = base_url
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._models = {}
+        self.stats = {'requests': 0, 'upstream': 0, 'coalesced': 0, 'in_flight': 0, 'peak_in_flight': 0,
+                      'wait_seconds': 0.0}
+
+        limits = httpx.Limits(max_connections=max(max_connections, max_concurrency),
+                              max_keepalive_connections=max(max_connections, max_concurrency),
+                              keepalive_expiry=keepalive_seconds)
+        self.http_client = httpx.Client(transport=CoalescingTransport(self, httpx.HTTPTransport(limits=limits)))
+        self.http_async_client = httpx.AsyncClient(transport=LimitingAsyncTransport(self, limits))
+
+    @classmethod
+    def from_env(cls) -> 'LLMPool':
+        """Cria o pool a partir de LLM_MODEL, LLM_TEMPERATURE, LLM_MAX_CONCURRENCY, LLM_MAX_CONNECTIONS,
+        LLM_KEEPALIVE_SECONDS, LLM_COALESCE e OPENAI_BASE_URL"""
+        return cls(
+            model=os.getenv("LLM_MODEL", "gpt-3.5-turbo"),
+            temperature=float(os.getenv("LLM_TEMPERATURE", "0.1")),
+            max_concurrency=max(int(os.getenv("LLM_MAX_CONCURRENCY", "8")), 1),
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+            keepalive_seconds=float(os.getenv("LLM_KEEPALIVE_SECONDS", "60")),
+            coalesce=os.getenv("LLM_COALESCE", "1") != "0",
+            base_url=os.getenv("OPENAI_BASE_URL") or None
+        )
+
+    def chat_model(self, openai_api_key: str, streaming: bool = True, max_retries: Optional[int] = None):
+        """
+        Modelo de chat sobre os clientes do pool, criado uma vez por chave de API
+
+        Args:
+            openai_api_key: Chave da API
+            streaming: Emite os tokens à medida que chegam
+            max_retries: Novas tentativas do próprio cliente da OpenAI (None mantém o padrão do SDK;
+                0 quando quem chama já repete a consulta)
+
+        Returns:
+            ChatOpenAI: Instância compartilhada (sem estado por consulta; os callbacks vão em cada chamada)
+        """
+        from langchain_openai import ChatOpenAI
+
+        key = ('chat', openai_api_key, streaming, max_retries)
+        retry_kwargs = {} if max_retries is None else {'max_retries': max_retries}
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = ChatOpenAI(
+                    model=self.model,
+                    openai_api_key=openai_api_key,
+                    base_url=self.base_url,
+                    temperature=self.temperature,
+                    streaming=streaming,
+                    # Com streaming, o uso de tokens só vem se pedido explicitamente
+                    stream_usage=True,
+                    http_client=self.http_client,
+                    http_async_client=self.http_async_client,
+                    **retry_kwargs
+                )
+            return self._models[key]
+
+    def embeddings(self, openai_api_key: str):
+        """Modelo de embeddings sobre os clientes do pool, criado uma vez por chave de API"""
+        from langchain_openai import OpenAIEmbeddings
+
+        key = ('embeddings', openai_api_key)
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = OpenAIEmbeddings(
+                    openai_api_key=openai_api_key,
+                    base_url=self.base_url,
+                    http_client=self.http_client,
+                    http_async_client=self.http_async_client
+                )
+            return self._models[key]
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats[name] += 1
+
+    def _acquire(self) -> None:
+        """Espera uma vaga para chamar o servidor"""
+        start = time.perf_counter()
+        self._semaphore.acquire()
+        self._acquired(time.perf_counter() - start)
+
+    def _acquired(self, waited: float) -> None:
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['upstream'] += 1
+            self.stats['wait_seconds'] += waited
+            self.stats['in_flight'] += 1
+            self.stats['peak_in_flight'] = max(self.stats['peak_in_flight'], self.stats['in_flight'])
+
+    def _release(self) -> None:
+        with self._lock:
+            self.stats['in_flight'] -= 1
+        self._semaphore.release()
+
+    def get_stats(self) -> dict:
+        """Requisições, chamadas ao servidor, requisições juntadas, chamadas em andamento e espera por vaga"""
+        with self._lock:
+            return dict(self.stats, max_concurrency=self.max_concurrency)
+
+    def close(self) -> None:
+        """Fecha as conexões do cliente síncrono (as do assíncrono são descartadas com cada event loop)"""
+        self.http_client.close()
+
+
+# Pool do processo, compartilhado por todas as sessões do Streamlit
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_llm_pool() -> LLMPool:
+    """Pool compartilhado, criado a partir do ambiente no primeiro uso"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = LLMPool.from_env()
+        return _pool
@@ -5,132 +5,534 @@ import pandas as pd
 import os
 import tempfile
 import re
-import matplotlib.pyplot as plt
-import seaborn as sns
+import time
+import asyncio
+import queue
+import threading
+import uuid
+import weakref
+from contextlib import closing
 
-try:
-    from langchain_experimental.agents import create_csv_agent
-except ImportError:
-    from langchain.agents import create_csv_agent
+from langchain_core.callbacks import BaseCallbackHandler
+from utils_openai import (
+    get_sample_questions,
+    CsvValidator, open_zip_upload, open_zip_member, zip_member_fingerprint, read_csv_chunked, file_fingerprint,
+    ingest_jobs, iter_csv_chunks, optimize_dtypes, extract_zip_member,
+    appended_tail_offset, read_csv_tail, append_rows,
+    content_hash, UploadRegistry, cleanup_orphaned_temp_files, remove_temp_path, TEMP_PREFIX,
+    ColumnarCache
+)
+from cache_openai import ResponseCache
+from analytics_openai import (
+    build_profile, build_sketch_profile, answer_fast_path, build_context_block, build_dataset_summary
+)
+from sketches_openai import DatasetSketch
+from sql_openai import SqlEngine, create_sql_tool
+from invoice_openai import InvoiceIndex
+from charts_openai import get_chart_renderer, ChartError
+from batch_openai import batch_settings_from_env, run_with_retry, build_batch_report
+from tracing_openai import Tracer, flatten_spans, traced, current_span
+from llm_pool_openai import get_llm_pool
+from dataset_store_openai import get_dataset_store
+from startup_openai import configure_process, start_warmup, warmup_state
 
-from langchain_openai import ChatOpenAI
-from langchain.agents.agent_types import AgentType
-from utils_openai import CsvValidator, extract_zip_file
-import warnings
-from dotenv import load_dotenv
+# LangChain agents, langchain_openai e o SDK da OpenAI (os imports mais pesados) são carregados
+# na primeira chamada ou pelo pré-aquecimento em segundo plano, não na importação deste módulo
+configure_process()
 
-load_dotenv()
+class StreamingEventsHandler(BaseCallbackHandler):
+    """Repassa tokens do LLM e ações do agente para uma fila consumida pela interface"""
 
-import streamlit as st
-import warnings
-warnings.filterwarnings("ignore")
+    def __init__(self, events):
+        self.events = events
+
+    def on_llm_new_token(self, token, **kwargs):
+        # Chamadas de função chegam com conteúdo vazio; só o texto da resposta é repassado
+        if token:
+            self.events.put(('token', token))
+
+    def on_agent_action(self, action, **kwargs):
+        self.events.put(('step', f"🔧 {action.tool}: {action.tool_input}"))
 
 class CSVAnalysisAgent:
     def __init__(self, openai_api_key=None):
         """Inicializa o agente de análise CSV com OpenAI GPT"""
         self.openai_api_key = openai_api_key
+        # Agentes específicos por tipo de arquivo, criados só quando uma consulta os usa
         self.agents = {}
+        self.last_file_type = None
         self.dataframes = {}
         self.file_info = {}
+        self._agent_cache = {}
+        self.agent_cache_stats = {'hits': 0, 'misses': 0}
+        self.columnar_cache = ColumnarCache.from_env()
+        self.ingest_mode = os.getenv("INGEST_MODE", "auto")
+        self.ingest_workers = int(os.getenv("INGEST_WORKERS", "0")) or None
+        # Uploads que só acrescentam linhas ao arquivo já carregado: lê apenas o final
+        self.incremental_append = os.getenv("INCREMENTAL_APPEND", "1") != "0"
+        self.model_name = get_llm_pool().model
+        self._embeddings = None
+        self.response_cache = ResponseCache.from_env(embed_fn=self._embed_question)
+        self.last_response_source = None
+        self.profiles = {}
+        # Prévia, dimensões e totais de cada arquivo para a interface, calculados uma vez na carga
+        self.summaries = {}
+        self.chart_file_type = None
+        self._context_cache = None
+        # Modo aproximado: respostas locais a partir de sketches de memória constante
+        self.approximate_mode = os.getenv("APPROXIMATE_MODE", "0") == "1"
+        self.sketches = {}
+        self.sketch_profiles = {}
+        # Motor SQL (DuckDB) para consultas e joins sobre os dados completos; arquivos acima de
+        # OUT_OF_CORE_MIN_MB ficam só no motor, com uma amostra em pandas (0 desativa)
+        self.sql_engine = SqlEngine.from_env()
+        self.out_of_core_min_bytes = float(os.getenv("OUT_OF_CORE_MIN_MB", "0")) * 1024 ** 2
+        self.out_of_core_sample_rows = int(os.getenv("OUT_OF_CORE_SAMPLE_ROWS", "100000"))
+        # Índice cabeçalho↔itens com agregados por fornecedor e produto (quando os dois estão em memória)
+        self.invoice_index = None
+        # Traços de tempo, memória, tokens e ferramentas por consulta e por carga (painel de desempenho)
+        self.tracer = Tracer.from_env()
+        # DataFrames compartilhados entre as sessões do processo: o mesmo arquivo ocupa a memória de uma
+        # cópia só; ao fim da sessão (agente coletado) os conjuntos dela são liberados
+        self.session_id = uuid.uuid4().hex
+        self.dataset_store = get_dataset_store()
+        self._dataset_keys = {}
+        weakref.finalize(self, self.dataset_store.release_session, self.session_id)
         
-    def create_llm(self):
-        """Cria uma instância do modelo OpenAI GPT"""
+    @traced('create_llm')
+    def create_llm(self, max_retries=None):
+        """Retorna o modelo OpenAI GPT do pool compartilhado pelo processo (max_retries: novas tentativas do cliente)"""
         if not self.openai_api_key:
             raise ValueError("OpenAI API Key é necessária para usar o agente")
         
         try:
-            llm = ChatOpenAI(
-                model="gpt-3.5-turbo",
-                openai_api_key=self.openai_api_key,
-                temperature=0.1
-            )
-            return llm
+            # Instância compartilhada pelo processo: mesmas conexões, limite de chamadas e junção
+            # de perguntas idênticas em andamento entre sessões
+            return get_llm_pool().chat_model(self.openai_api_key, max_retries=max_retries)
         except Exception as e:
             st.error(f"Erro ao criar modelo GPT: {str(e)}")
             return None
 
-    def load_csv_data(self, file_path, file_type, chunk_size=5000):
+    def _embed_question(self, text):
+        """Gera o embedding de uma pergunta para a camada semântica do cache de respostas"""
+        if self._embeddings is None:
+            self._embeddings = get_llm_pool().embeddings(self.openai_api_key)
+        return self._embeddings.embed_query(text)
+
+    @traced('load_csv_data', 'ingest', file_type='file_type',
+            file=lambda args: os.path.basename(str(args['file_path'])))
+    def load_csv_data(self, file_path, file_type, chunk_size=50000, read_kwargs=None):
         """
-        Carrega CSV em chunks, concatena todos os chunks no DataFrame completo e retorna True/False.
+        Carrega CSV em chunks, materializa o DataFrame completo uma única vez e retorna True/False.
+        read_kwargs (ex.: encoding e sep detectados por CsvValidator.sniff) são repassados ao pd.read_csv.
         """
         try:
-            total_rows = 0
-            df_full = pd.DataFrame()
-
-            # Lê o CSV em chunks
-            for chunk in pd.read_csv(file_path, encoding="utf-8", chunksize=chunk_size):
-                total_rows += len(chunk)
-                # Concatena o chunk completo
-                df_full = pd.concat([df_full, chunk], ignore_index=True)
-
-            # Guarda o DataFrame completo
-            self.dataframes[file_type] = df_full
-            st.session_state.agent.type = file_type
-            st.session_state.agent.dataframes[file_type] = df_full
-
-            # Metadados do arquivo
-            self.file_info[file_type] = {
-                'path': file_path,
-                'shape': (total_rows, df_full.shape[1]),
-                'columns': df_full.columns.tolist()
-            }
-
-            # Cria LLM
-            llm = self.create_llm()
-            if llm is None:
-                return False
+            fingerprint = file_fingerprint(file_path)
+            if self.uses_out_of_core(fingerprint['size']):
+                return self.load_out_of_core(file_path, file_type, file_path, fingerprint, chunk_size, read_kwargs)
+
+            # Reaproveita o DataFrame tipado já carregado por outra sessão ou guardado no cache colunar
+            df_full = self.dataset_store.get(fingerprint['hash'], self.session_id)
+
+            offset = self.appended_offset(file_type, file_path) if df_full is None else None
+            if offset is not None:
+                return self.append_csv_tail(file_path, file_type, file_path, fingerprint, offset, chunk_size,
+                                            read_kwargs)
+
+            sketch = None
+            if df_full is None:
+                df_full, sketch = self._read_csv_full(file_path, fingerprint, chunk_size, read_kwargs)
+
+            return self._register_dataframe(df_full, file_type, file_path, fingerprint, sketch)
+
+        except Exception as e:
+            st.error(f"Erro ao carregar arquivo {file_type}: {str(e)}")
+            return False
 
-            # Cria agente específico (agente agora terá acesso a todos os dados)
-            agent = create_csv_agent(
-                llm,
+    def _read_csv_full(self, file_path, fingerprint, chunk_size=50000, read_kwargs=None):
+        """
+        Lê o CSV inteiro em chunks, com barra de progresso, e o guarda no cache colunar
+
+        Returns:
+            tuple: (DataFrame, DatasetSketch montado durante a leitura no modo aproximado ou None)
+        """
+        progress_label = f"Carregando {os.path.basename(file_path)}..."
+        progress_bar = st.sidebar.progress(0.0, text=progress_label)
+        # No modo aproximado os sketches são atualizados durante a própria leitura
+        sketch = DatasetSketch() if self.approximate_mode else None
+        with self.tracer.span('read_csv'):
+            df_full = read_csv_chunked(
                 file_path,
-                verbose=True,
-                agent_type=AgentType.OPENAI_FUNCTIONS,
-                allow_dangerous_code=True,
-                handle_parsing_errors=True
+                chunk_size=chunk_size,
+                progress_callback=lambda fraction: progress_bar.progress(fraction, text=progress_label),
+                chunk_callback=sketch.update if sketch is not None else None,
+                **(read_kwargs or {})
+            )
+        progress_bar.empty()
+        if self.columnar_cache is not None:
+            self.columnar_cache.store(fingerprint['hash'], df_full)
+        return df_full, sketch
+
+    @traced('load_files_parallel', 'ingest', files=lambda args: len(args['jobs']))
+    def load_files_parallel(self, jobs, chunk_size=50000):
+        """
+        Carrega vários CSVs independentes em paralelo e registra cada um.
+
+        Args:
+            jobs: Lista de dicts com 'file_type', 'source', 'fingerprint', 'size' e
+                'path' (arquivo em disco) ou 'zip_data'/'member' (membro de ZIP em memória);
+                jobs em memória do mesmo tipo são concatenados num único DataFrame
+            chunk_size: Linhas por chunk na leitura
+
+        Returns:
+            list: (sucesso, mensagem de erro ou None) para cada job, na mesma ordem
+        """
+        frames = [None] * len(jobs)
+        errors = [None] * len(jobs)
+        out_of_core = {}
+
+        # Acertos no cache colunar e extensões de arquivos já carregados não precisam ir para os workers
+        appends = {}
+        pending = []
+        for i, job in enumerate(jobs):
+            if 'path' in job and self.uses_out_of_core(job['size']):
+                out_of_core[i] = job
+                continue
+            frames[i] = self.dataset_store.get(job['fingerprint']['hash'], self.session_id)
+            if frames[i] is None and 'path' in job:
+                offset = self.appended_offset(job['file_type'], job['path'])
+                if offset is not None:
+                    appends[i] = offset
+                    continue
+            if frames[i] is None:
+                pending.append(i)
+
+        with self.tracer.span('read_csv', files=len(pending)):
+            parsed = ingest_jobs(
+                [jobs[i] for i in pending],
+                mode=self.ingest_mode,
+                max_workers=self.ingest_workers,
+                chunk_size=chunk_size
             )
+        for i, (df, error) in zip(pending, parsed):
+            frames[i], errors[i] = df, error
+            if df is not None and self.columnar_cache is not None:
+                self.columnar_cache.store(jobs[i]['fingerprint']['hash'], df)
 
-            self.agents['csv'] = agent
-            return True
+        # Partições do mesmo tipo (ex.: itens mensais num ZIP) formam um único DataFrame;
+        # registradas uma a uma, cada partição substituiria a anterior
+        combined = {}
+        for file_type in {job['file_type'] for job in jobs}:
+            parts = [i for i, job in enumerate(jobs) if job['file_type'] == file_type and frames[i] is not None]
+            if len(parts) > 1:
+                combined[parts[0]] = parts
+
+        # O registro (e qualquer chamada ao Streamlit) fica na thread principal
+        results = []
+        registered = {}
+        for i, (job, df, error) in enumerate(zip(jobs, frames, errors)):
+            if i in registered:
+                results.append(registered[i])
+                continue
+            if i in out_of_core:
+                success = self.load_out_of_core(job['path'], job['file_type'], job['source'], job['fingerprint'],
+                                                chunk_size, job.get('read_kwargs'))
+                results.append((success, None if success else "Não foi possível registrar o arquivo no motor SQL"))
+                continue
+            if i in appends:
+                success = self.append_csv_tail(job['path'], job['file_type'], job['source'], job['fingerprint'],
+                                               appends[i], chunk_size, job.get('read_kwargs'))
+                results.append((success, None if success else "Não foi possível anexar as linhas novas"))
+                continue
+            if df is None:
+                results.append((False, error))
+                continue
+            try:
+                source, fingerprint = job['source'], job['fingerprint']
+                if i in combined:
+                    parts = combined[i]
+                    df = optimize_dtypes(pd.concat([frames[j] for j in parts], ignore_index=True))
+                    source = ' + '.join(os.path.basename(str(jobs[j]['source'])) for j in parts)
+                    fingerprint = {'size': sum(jobs[j]['fingerprint']['size'] for j in parts),
+                                   'hash': content_hash('\0'.join(jobs[j]['fingerprint']['hash']
+                                                                  for j in parts).encode())}
+                    st.sidebar.info(f"🧩 {job['file_type'].title()}: {len(parts)} arquivos combinados "
+                                    f"({len(df)} linhas)")
+                success = self._register_dataframe(df, job['file_type'], source, fingerprint)
+                result = (success, None if success else "Não foi possível registrar o arquivo")
+            except Exception as e:
+                result = (False, str(e))
+            results.append(result)
+            registered.update((j, result) for j in combined.get(i, ()))
+
+        return results
+
+    def appended_offset(self, file_type, file_path):
+        """
+        Posição das linhas novas quando o arquivo é o arquivo já carregado desse tipo com linhas
+        acrescentadas no final (mesmo conteúdo, byte a byte, até o tamanho anterior); senão None
+        """
+        info = self.file_info.get(file_type)
+        if not self.incremental_append or info is None or info.get('out_of_core') or file_type not in self.dataframes:
+            return None
+        try:
+            return appended_tail_offset(file_path, info.get('fingerprint') or {})
+        except OSError:
+            return None
+
+    @traced('append_csv_tail', 'ingest', file_type='file_type')
+    def append_csv_tail(self, file_path, file_type, source, fingerprint, offset, chunk_size=50000, read_kwargs=None):
+        """
+        Lê só as linhas novas de um arquivo que cresceu e as anexa ao DataFrame já tipado.
+        Os sketches do modo aproximado são atualizados apenas com as linhas novas; o perfil
+        exato (medianas e distintos não se somam) é recalculado sob demanda, e o cache
+        colunar passa a guardar o arquivo completo sob o hash novo. Se as linhas novas
+        mudariam o tipo de alguma coluna, o arquivo é relido inteiro.
+        """
+        try:
+            df_old = self.dataframes[file_type]
+            try:
+                tail = read_csv_tail(file_path, offset, df_old, chunk_size, **(read_kwargs or {}))
+            except ValueError as e:
+                print(f"Linhas novas de {file_type} mudam o tipo das colunas ({str(e)}); relendo o arquivo inteiro")
+                df_full, sketch = self._read_csv_full(file_path, fingerprint, chunk_size, read_kwargs)
+                return self._register_dataframe(df_full, file_type, source, fingerprint, sketch)
+            df_full = append_rows(df_old, tail)
+
+            # Sketches são mescláveis: basta acrescentar as linhas novas
+            sketch = self.sketches.get(file_type)
+            if sketch is not None:
+                sketch.update(tail)
+
+            if self.columnar_cache is not None:
+                self.columnar_cache.store(fingerprint['hash'], df_full)
+
+            st.sidebar.info(f"➕ {file_type.title()}: {len(tail)} linha(s) nova(s) anexada(s) a {len(df_old)}")
+            return self._register_dataframe(df_full, file_type, source, fingerprint, sketch, lazy_profile=True)
 
         except Exception as e:
-            st.error(f"Erro ao carregar arquivo {file_type}: {str(e)}")
+            st.error(f"Erro ao anexar linhas novas a {file_type}: {str(e)}")
+            return False
+
+    def uses_out_of_core(self, size):
+        """Indica se um arquivo desse tamanho (bytes) fica fora de memória, só no motor SQL"""
+        return self.sql_engine is not None and 0 < self.out_of_core_min_bytes <= size
+
+    @traced('load_out_of_core', 'ingest', file_type='file_type')
+    def load_out_of_core(self, file_path, file_type, source, fingerprint, chunk_size=50000, read_kwargs=None):
+        """
+        Registra um CSV grande no motor SQL sem materializá-lo em pandas.
+
+        Uma única passada em chunks monta os sketches (perfil aproximado) e uma amostra aleatória,
+        que vira o 'df' do agente; resultados exatos e joins ficam com a ferramenta sql_query.
+        """
+        try:
+            read_kwargs = read_kwargs or {}
+            progress_label = f"Analisando {os.path.basename(str(source))} (fora de memória)..."
+            progress_bar = st.sidebar.progress(0.0, text=progress_label)
+            try:
+                sketch = self._sketch_csv(file_path, progress_bar, progress_label, chunk_size, read_kwargs)
+            except UnicodeDecodeError:
+                # A codificação veio dos primeiros 64KB; um byte inválido em UTF-8 depois disso
+                # indica um arquivo latin-1, relido do início
+                if not read_kwargs.get('encoding', 'utf-8').lower().startswith('utf'):
+                    raise
+                read_kwargs = dict(read_kwargs, encoding='latin-1')
+                sketch = self._sketch_csv(file_path, progress_bar, progress_label, chunk_size, read_kwargs)
+            progress_bar.empty()
+
+            # O cache colunar, se já tiver o arquivo, evita reinterpretar o CSV a cada consulta
+            cache_path = self.columnar_cache.path_for(fingerprint['hash']) if self.columnar_cache is not None else None
+            if cache_path and os.path.exists(cache_path):
+                self.sql_engine.register_arrow(file_type, cache_path)
+            else:
+                self.sql_engine.register_csv(file_type, file_path, read_kwargs.get('encoding', 'utf-8'),
+                                             read_kwargs.get('sep', ','))
+
+            sample = sketch.reservoir.sample if sketch.reservoir.sample is not None else pd.DataFrame()
+            return self._register_dataframe(optimize_dtypes(sample), file_type, source, fingerprint, sketch,
+                                            total_rows=sketch.rows)
+
+        except Exception as e:
+            st.error(f"Erro ao carregar arquivo {file_type} fora de memória: {str(e)}")
             return False
 
+    def _sketch_csv(self, file_path, progress_bar, progress_label, chunk_size, read_kwargs):
+        """Uma passada em chunks pelo CSV montando sketches e a amostra aleatória"""
+        sketch = DatasetSketch(reservoir_size=self.out_of_core_sample_rows)
+        for chunk in iter_csv_chunks(
+            file_path,
+            chunk_size=chunk_size,
+            progress_callback=lambda fraction: progress_bar.progress(fraction, text=progress_label),
+            **read_kwargs
+        ):
+            sketch.update(chunk)
+        return sketch
+
+    @traced('register_dataframe', file_type='file_type', rows=lambda args: len(args['df_full']))
+    def _register_dataframe(self, df_full, file_type, source, fingerprint, sketch=None, total_rows=None,
+                            lazy_profile=False):
+        """
+        Registra um DataFrame já carregado; o agente específico sobre ele só é criado na
+        primeira consulta que o usar (use_general_agent=False).
+        sketch (DatasetSketch montado durante a leitura) é usado no modo aproximado; sem ele,
+        os sketches são montados percorrendo o DataFrame. total_rows indica um arquivo fora
+        de memória, do qual df_full é apenas uma amostra. Com lazy_profile o perfil exato só
+        é calculado na primeira pergunta que precisar dele.
+        """
+        out_of_core = total_rows is not None
+        total_rows = total_rows if out_of_core else len(df_full)
+
+        # A sessão passa a usar a cópia compartilhada (a amostra de um arquivo fora de memória é só dela)
+        previous_key = self._dataset_keys.pop(file_type, None)
+        if not out_of_core:
+            df_full = self.dataset_store.put(fingerprint['hash'], df_full, self.session_id)
+            self._dataset_keys[file_type] = fingerprint['hash']
+        self._release_dataset(previous_key)
+
+        # Guarda o DataFrame completo
+        self.dataframes[file_type] = df_full
+        st.session_state.agent.type = file_type
+        st.session_state.agent.dataframes[file_type] = df_full
+
+        # Perfil estatístico usado pelas respostas locais (sem LLM): exato ou, no modo aproximado, por sketches
+        self.profiles.pop(file_type, None)
+        self.sketches.pop(file_type, None)
+        self.sketch_profiles.pop(file_type, None)
+        if self.approximate_mode or out_of_core:
+            self._build_sketch_profile(file_type, sketch)
+        elif not lazy_profile:
+            with self.tracer.span('build_profile'):
+                self.profiles[file_type] = build_profile(df_full)
+
+        # Arquivos em memória também ficam disponíveis para a ferramenta SQL (sem cópia)
+        if self.sql_engine is not None and not out_of_core:
+            self.sql_engine.register_dataframe(file_type, df_full)
+
+        # Metadados do arquivo
+        self.file_info[file_type] = {
+            'path': source,
+            'shape': (total_rows, df_full.shape[1]),
+            'columns': df_full.columns.tolist(),
+            'fingerprint': fingerprint,
+            'out_of_core': out_of_core
+        }
+        self.summaries[file_type] = build_dataset_summary(df_full, total_rows if out_of_core else None,
+                                                          self.sketches.get(file_type))
+        self._refresh_invoice_index()
+
+        # O agente específico anterior aponta para os dados antigos
+        self.agents.pop(file_type, None)
+        self.last_file_type = file_type
+        return True
+
+    def _file_agent_type(self):
+        """Tipo de arquivo do agente específico: o último carregado que ainda está em memória"""
+        return self.last_file_type if self.last_file_type in self.dataframes else next(iter(self.dataframes), None)
+
+    def _file_agent(self):
+        """Agente específico do último arquivo carregado, criado na primeira consulta que o usa"""
+        file_type = self._file_agent_type()
+        if file_type is None:
+            return None
+        if file_type not in self.agents:
+            llm = self.create_llm()
+            if llm is None:
+                return None
+            with self.tracer.span('create_csv_agent', file_type=file_type):
+                self.agents[file_type] = self._create_dataframe_agent(llm, self.dataframes[file_type])
+        return self.agents[file_type]
+
+    def _create_dataframe_agent(self, llm, dataframes):
+        """Cria um agente LangChain sobre DataFrame(s) já carregados em memória, com a ferramenta SQL quando disponível"""
+        try:
+            from langchain_experimental.agents import create_pandas_dataframe_agent
+        except ImportError:
+            from langchain.agents import create_pandas_dataframe_agent
+        from langchain.agents.agent_types import AgentType
+
+        extra_tools = []
+        if self.sql_engine is not None and self.sql_engine.tables:
+            extra_tools.append(create_sql_tool(self.sql_engine))
+        return create_pandas_dataframe_agent(
+            llm,
+            dataframes,
+            verbose=True,
+            agent_type=AgentType.OPENAI_FUNCTIONS,
+            allow_dangerous_code=True,
+            extra_tools=extra_tools,
+            agent_executor_kwargs={'handle_parsing_errors': True}
+        )
+
+    def _agent_cache_key(self):
+        """Chave do cache de agentes: tipos carregados e impressões digitais dos arquivos"""
+        key = []
+        for file_type, info in sorted(self.file_info.items()):
+            fingerprint = info.get('fingerprint') or {}
+            # O mtime fica de fora: o mesmo conteúdo regravado em outro arquivo temporário ainda é um acerto
+            key.append((file_type, fingerprint.get('size'), fingerprint.get('hash')))
+        return tuple(key)
+
+    def _general_dataframes(self):
+        """DataFrames do agente geral, na ordem dos tipos; um único é exposto como 'df', vários como df1, df2, ..."""
+        return [self.dataframes[file_type] for file_type, _ in sorted(self.file_info.items())
+                if file_type in self.dataframes]
+
+    def _isolated_agent(self, use_general_agent, max_retries=None):
+        """
+        Agente novo para uma consulta concorrente: o python_repl_ast guarda as variáveis de cada
+        execução, então perguntas simultâneas no mesmo agente leriam e sobrescreveriam as das
+        outras. Os DataFrames entram como cópias rasas (sem copiar os dados; com copy-on-write,
+        alterações feitas pelo código do agente ficam nesta consulta).
+        """
+        if use_general_agent:
+            dataframes = [df.copy(deep=False) for df in self._general_dataframes()]
+        else:
+            file_type = self._file_agent_type()
+            dataframes = [self.dataframes[file_type].copy(deep=False)] if file_type is not None else []
+        if not dataframes:
+            return None
+        llm = self.create_llm(max_retries)
+        if llm is None:
+            return None
+        with self.tracer.span('create_isolated_agent'):
+            return self._create_dataframe_agent(llm, dataframes[0] if len(dataframes) == 1 else dataframes)
+
+    @traced('create_general_agent')
     def create_general_agent(self):
-        """Cria um agente geral que pode acessar todos os dataframes"""
+        """Retorna o agente geral sobre todos os dataframes, reaproveitando-o enquanto os arquivos não mudarem"""
+        span = current_span()
         try:
             if not self.dataframes:
                 print("Erro: Nenhum dataframe carregado")
                 return None
 
+            cache_key = self._agent_cache_key()
+            if cache_key in self._agent_cache:
+                self.agent_cache_stats['hits'] += 1
+                span.attributes['cache'] = 'hit'
+                return self._agent_cache[cache_key]
+
+            self.agent_cache_stats['misses'] += 1
+            span.attributes['cache'] = 'miss'
+
             llm = self.create_llm()
             if llm is None:
                 print("Erro: Não foi possível criar LLM")
                 return None
 
-            # Coleta TODOS os caminhos de arquivos válidos usando file_info
-            file_paths = []
-            for file_type, info in self.file_info.items():
-                if 'path' in info and os.path.exists(info['path']):
-                    file_paths.append(info['path'])
-
-            if not file_paths:
-                print("Erro: Nenhum arquivo válido encontrado")
+            dataframes = self._general_dataframes()
+            if not dataframes:
+                print("Erro: Nenhum dataframe válido encontrado")
                 return None
 
-            print(f"Criando agente geral com {len(file_paths)} arquivo(s): {file_paths}")
+            print(f"Criando agente geral com {len(dataframes)} dataframe(s): {sorted(self.file_info)}")
 
-            # Cria agente geral com todos os arquivos
-            general_agent = create_csv_agent(
-                llm,
-                file_paths,
-                verbose=True,
-                agent_type=AgentType.OPENAI_FUNCTIONS,
-                allow_dangerous_code=True,
-                handle_parsing_errors=True
-            )
+            general_agent = self._create_dataframe_agent(llm, dataframes[0] if len(dataframes) == 1 else dataframes)
 
+            # Apenas o agente do conjunto de arquivos atual é mantido
+            self._agent_cache.clear()
+            self._agent_cache[cache_key] = general_agent
             return general_agent
 
         except Exception as e:
@@ -138,35 +540,381 @@ class CSVAnalysisAgent:
             st.error(f"Erro ao criar agente geral: {str(e)}")
             return None
 
-    def query(self, question, use_general_agent=True):
-        """Executa uma consulta usando o agente apropriado"""
-        try:
-            if use_general_agent:
-                agent = self.create_general_agent()
-                if agent is None:
-                    return "Erro: Não foi possível criar o agente geral."
+    def unload_upload(self, entry):
+        """Descarta os dados carregados a partir de um upload removido do registro"""
+        for file_type in entry['file_types']:
+            path = self.file_info.get(file_type, {}).get('path', '')
+            # Só remove se o tipo ainda aponta para um arquivo desse upload
+            if path in entry['sources']:
+                self.dataframes.pop(file_type, None)
+                self.file_info.pop(file_type, None)
+                self.profiles.pop(file_type, None)
+                self.summaries.pop(file_type, None)
+                self.sketches.pop(file_type, None)
+                self.sketch_profiles.pop(file_type, None)
+                self.agents.pop(file_type, None)
+                if self.sql_engine is not None:
+                    self.sql_engine.drop(file_type)
+                self._release_dataset(self._dataset_keys.pop(file_type, None))
+        self._refresh_invoice_index()
+
+    def _release_dataset(self, key):
+        """Libera no repositório compartilhado um conjunto que a sessão não usa mais em nenhum tipo de arquivo"""
+        if key is not None and key not in self._dataset_keys.values():
+            self.dataset_store.release(key, self.session_id)
+
+    def browse_rows(self, file_type, start, count):
+        """
+        Janela de linhas do arquivo para a navegação paginada, sem passar o arquivo inteiro à interface.
+        Lê do cache colunar (memory-map) quando disponível; arquivos fora de memória sem cache vêm
+        do motor SQL e, em último caso, a janela é recortada do DataFrame em memória.
+
+        Returns:
+            pd.DataFrame: Linhas [start, start + count), indexadas pela posição no arquivo
+        """
+        info = self.file_info[file_type]
+        fingerprint = info.get('fingerprint') or {}
+        window = None
+        if self.columnar_cache is not None and fingerprint.get('hash'):
+            window = self.columnar_cache.read_rows(fingerprint['hash'], start, count)
+        if window is None and info.get('out_of_core') and self.sql_engine is not None:
+            window = self.sql_engine.fetch_rows(file_type, start, count)
+        if window is None:
+            window = self.dataframes[file_type].iloc[start:start + count]
+        window.index = pd.RangeIndex(start, start + len(window))
+        return window
+
+    def _refresh_invoice_index(self):
+        """
+        Monta o índice cabeçalho↔itens quando os dois arquivos estão carregados em memória.
+        Arquivos fora de memória ficam de fora: o join exato deles é feito pela ferramenta SQL.
+        """
+        header, items = self.dataframes.get('cabecalho'), self.dataframes.get('itens')
+        ready = (header is not None and items is not None and
+                 not any(self.file_info.get(file_type, {}).get('out_of_core') for file_type in ('cabecalho', 'itens')))
+        if ready and self.invoice_index is not None and (self.invoice_index.header is header and
+                                                         self.invoice_index.items is items):
+            return
+
+        self.invoice_index = None
+        if ready:
+            try:
+                self.invoice_index = InvoiceIndex.build(header, items)
+            except Exception as e:
+                print(f"Erro ao montar índice cabeçalho↔itens: {str(e)}")
+
+        # Os agregados também ficam disponíveis para a ferramenta SQL
+        if self.sql_engine is not None:
+            for name, table in (('agg_fornecedores', 'suppliers'), ('agg_produtos', 'products')):
+                aggregate = getattr(self.invoice_index, table, None)
+                if aggregate is None:
+                    self.sql_engine.drop(name)
+                else:
+                    self.sql_engine.register_dataframe(name, aggregate.reset_index())
+
+    def _build_sketch_profile(self, file_type, sketch=None):
+        """Guarda os sketches do arquivo e o perfil aproximado derivado deles"""
+        df = self.dataframes[file_type]
+        if sketch is None:
+            sketch = DatasetSketch.from_dataframe(df)
+        # Sketches montados na leitura veem os chunks antes da otimização de tipos
+        for col, column in sketch.columns.items():
+            if col in df.columns:
+                column.dtype = str(df[col].dtype)
+        self.sketches[file_type] = sketch
+        self.sketch_profiles[file_type] = build_sketch_profile(sketch)
+
+    def active_profiles(self):
+        """
+        Perfis do modo atual (exato ou aproximado) por tipo de arquivo.
+        Ao alternar o modo, os perfis que faltam são calculados sob demanda.
+        """
+        active = {}
+        for file_type, df in self.dataframes.items():
+            # Arquivos fora de memória só têm o perfil aproximado
+            if self.approximate_mode or self.file_info.get(file_type, {}).get('out_of_core'):
+                if file_type not in self.sketch_profiles:
+                    self._build_sketch_profile(file_type)
+                active[file_type] = self.sketch_profiles[file_type]
             else:
-                if not self.agents:
-                    return "Erro: Nenhum agente disponível."
-                agent = list(self.agents.values())[0]
+                if file_type not in self.profiles:
+                    self.profiles[file_type] = build_profile(df)
+                active[file_type] = self.profiles[file_type]
+        return {file_type: active[file_type] for file_type in self.file_info if file_type in active}
+
+    def _chart_target(self):
+        """Tipo de arquivo usado como 'df' no código de gráfico da última resposta"""
+        if self.chart_file_type in self.dataframes:
+            return self.chart_file_type
+        if 'csv' in self.dataframes:
+            return 'csv'
+        return next(iter(self.dataframes))
+
+    def chart_dataframe(self):
+        """DataFrame usado como 'df' no código de gráfico da última resposta"""
+        return self.dataframes[self._chart_target()]
+
+    @traced('render_chart', 'chart')
+    def render_chart(self, code):
+        """
+        Gera o gráfico da última resposta num processo separado, com limites de tempo e memória.
+        Com o arquivo no cache colunar, o worker mapeia os dados completos em vez de receber uma amostra.
+
+        Returns:
+            tuple: (bytes PNG, detalhes de ChartRenderer.render acrescidos de 'total_rows')
+        """
+        span = current_span()
+        file_type = self._chart_target()
+        df = self.dataframes[file_type]
+        info = self.file_info.get(file_type, {})
+        fingerprint = info.get('fingerprint') or {}
+        dataset_key = f"{file_type}:{fingerprint.get('hash')}"
+        arrow_path = None
+        if self.columnar_cache is not None and fingerprint.get('hash') and not info.get('out_of_core'):
+            arrow_path = self.columnar_cache.path_for(fingerprint['hash'])
+        png, details = get_chart_renderer().render(code, df, dataset_key, arrow_path)
+        details['total_rows'] = len(df)
+        span.attributes.update(file_type=file_type, rows=details['rows'], cached=details['cached'],
+                               reductions=len(details['notes']))
+        return png, details
+
+    def get_agent_cache_stats(self):
+        """Retorna os contadores de acertos/falhas do cache de agentes"""
+        return dict(self.agent_cache_stats, cached_agents=len(self._agent_cache))
+
+    @traced('resolve_query')
+    def _resolve_query(self, question, use_general_agent):
+        """
+        Resolve os atalhos da consulta antes de chamar o LLM
+
+        Returns:
+            tuple: ('answer', resposta) quando já há resposta (local, em cache ou erro) ou
+                ('agent', (agente, pergunta completa, chave dos dados)) quando é preciso consultar o LLM
+        """
+        self.last_response_source = None
+        self.chart_file_type = None
 
-            # Construímos contexto leve
+        # Perguntas padrão de análise exploratória são respondidas a partir do perfil pré-calculado
+        fast_path = answer_fast_path(question, self.active_profiles(), self.invoice_index)
+        if fast_path is not None:
+            response, self.chart_file_type = fast_path
+            self.last_response_source = 'fast_path'
+            return 'answer', response
+
+        # Respostas são válidas apenas para os mesmos dados, modelo, tipo de agente e modo (exato ou aproximado)
+        dataset_key = content_hash(repr((self._agent_cache_key(), use_general_agent, self.approximate_mode)).encode())
+        if self.response_cache is not None:
+            cached = self.response_cache.get(question, dataset_key, self.model_name)
+            if cached is not None:
+                response, tier = cached
+                self.last_response_source = f"cache_{tier}"
+                return 'answer', response
+
+        if use_general_agent:
+            agent = self.create_general_agent()
+            if agent is None:
+                return 'answer', "Erro: Não foi possível criar o agente geral."
+        else:
+            agent = self._file_agent()
+            if agent is None:
+                return 'answer', "Erro: Nenhum agente disponível."
+
+        # Construímos contexto leve
+        with self.tracer.span('build_context'):
             context = self._build_context()
 
-            # # Pergunta final enviada ao modelo
-            full_question = f"{context}\n\nPergunta: {question}"
+        # # Pergunta final enviada ao modelo
+        full_question = f"{context}\n\nPergunta: {question}"
+        return 'agent', (agent, full_question, dataset_key)
+
+    def _remember_response(self, question, dataset_key, response):
+        """Marca a resposta como vinda do LLM e a guarda no cache de respostas"""
+        self.last_response_source = 'llm'
+        if self.response_cache is not None and response and str(response).strip():
+            self.response_cache.put(question, dataset_key, self.model_name, response)
+
+    @traced('query', 'query', question='question')
+    def query(self, question, use_general_agent=True):
+        """Executa uma consulta: respostas locais para perguntas padrão, depois cache de respostas e, por fim, o LLM"""
+        span = current_span()
+        try:
+            kind, payload = self._resolve_query(question, use_general_agent)
+            span.attributes['source'] = self.last_response_source
+            if kind == 'answer':
+                return payload
+            agent, full_question, dataset_key = payload
 
             # Executa consulta no agente
-            response = agent.run(full_question)
+            with self.tracer.span('agent') as agent_span:
+                response = agent.run(full_question, callbacks=[self.tracer.callback(agent_span)])
+            self._remember_response(question, dataset_key, response)
+            span.attributes['source'] = self.last_response_source
             return response
 
         except Exception as e:
             error_msg = f"Erro ao processar consulta: {str(e)}"
             print(error_msg)
             return error_msg
+
+    @traced('query', 'query', question='question')
+    def stream_query(self, question, use_general_agent=True):
+        """
+        Executa uma consulta emitindo a resposta à medida que o LLM gera os tokens.
+
+        Args:
+            question: Pergunta do usuário
+            use_general_agent: Usa o agente geral sobre todos os dataframes
+
+        Yields:
+            tuple: ('token', texto) para trechos da resposta ou ('step', descrição) para
+                cada ferramenta acionada pelo agente
+        """
+        span = current_span()
+        try:
+            kind, payload = self._resolve_query(question, use_general_agent)
+            span.attributes['source'] = self.last_response_source
+        except Exception as e:
+            yield 'token', f"Erro ao processar consulta: {str(e)}"
+            return
+
+        if kind == 'answer':
+            yield 'token', payload
+            return
+
+        agent, full_question, dataset_key = payload
+        with self.tracer.span('agent') as agent_span:
+            events = queue.Queue()
+            callbacks = [StreamingEventsHandler(events), self.tracer.callback(agent_span)]
+
+            def run_agent():
+                try:
+                    result = agent.invoke({'input': full_question}, config={'callbacks': callbacks})
+                    events.put(('final', result.get('output', '')))
+                except Exception as e:
+                    events.put(('error', f"Erro ao processar consulta: {str(e)}"))
+                finally:
+                    events.put(None)
+
+            # O agente roda em outra thread; esta apenas repassa os eventos da fila
+            threading.Thread(target=run_agent, daemon=True).start()
+
+            streamed = []
+            final = None
+            while True:
+                event = events.get()
+                if event is None:
+                    break
+                event_kind, text = event
+                if event_kind == 'final':
+                    final = text
+                elif event_kind == 'error':
+                    print(text)
+                    yield 'token', text
+                else:
+                    if event_kind == 'token':
+                        streamed.append(text)
+                    yield event_kind, text
+
+        if final is not None:
+            # Sem tokens (ex.: resposta sem streaming), a resposta final é emitida de uma vez
+            if not streamed:
+                yield 'token', final
+            self._remember_response(question, dataset_key, final)
+            span.attributes['source'] = self.last_response_source
+
+    @traced('query', 'query', question='question')
+    async def aquery(self, question, use_general_agent=True, max_retries=None, base_delay=None):
+        """
+        Versão assíncrona de query, com novas tentativas em erros transitórios do LLM
+
+        Args:
+            question: Pergunta do usuário
+            use_general_agent: Usa o agente geral sobre todos os dataframes
+            max_retries: Novas tentativas em limite de requisições (padrão: BATCH_MAX_RETRIES)
+            base_delay: Espera inicial do backoff em segundos (padrão: BATCH_RETRY_BASE_SECONDS)
+
+        Returns:
+            dict: question, answer, source, seconds, attempts e error
+        """
+        span = current_span()
+        settings = batch_settings_from_env()
+        max_retries = settings['max_retries'] if max_retries is None else max_retries
+        base_delay = settings['base_delay'] if base_delay is None else base_delay
+        result = {'question': question, 'answer': '', 'source': 'erro', 'seconds': 0.0, 'attempts': 0, 'error': None}
+
+        start = time.perf_counter()
+        try:
+            kind, payload = self._resolve_query(question, use_general_agent)
+            if kind == 'answer':
+                result['answer'] = payload
+                result['source'] = self.last_response_source or 'erro'
+            else:
+                _, full_question, dataset_key = payload
+
+                async def attempt():
+                    # Cada tentativa roda num agente próprio: estado do python_repl_ast isolado das
+                    # outras perguntas e das tentativas anteriores. As novas tentativas ficam só aqui,
+                    # não também no cliente da OpenAI (max_retries=0)
+                    agent = self._isolated_agent(use_general_agent, max_retries=0)
+                    if agent is None:
+                        raise RuntimeError("Não foi possível criar o agente")
+                    return await agent.ainvoke({'input': full_question}, config={'callbacks': callbacks})
+
+                with self.tracer.span('agent') as agent_span:
+                    callbacks = [self.tracer.callback(agent_span)]
+                    output, result['attempts'] = await run_with_retry(attempt, max_retries, base_delay)
+                result['answer'] = output.get('output', '')
+                result['source'] = 'llm'
+                self._remember_response(question, dataset_key, result['answer'])
+        except Exception as e:
+            result['error'] = str(e)
+        result['seconds'] = time.perf_counter() - start
+        span.attributes.update(source=result['source'], attempts=result['attempts'])
+        return result
+
+    @traced('query_batch', 'query', questions=lambda args: len(args['questions']))
+    async def query_batch(self, questions, concurrency=None, use_general_agent=True, max_retries=None,
+                          on_result=None):
+        """
+        Responde várias perguntas independentes de forma concorrente
+
+        Args:
+            questions: Lista de perguntas
+            concurrency: Máximo de perguntas simultâneas no LLM (padrão: BATCH_CONCURRENCY)
+            use_general_agent: Usa o agente geral sobre todos os dataframes
+            max_retries: Novas tentativas por pergunta em erros transitórios
+            on_result: Função chamada com o resultado de cada pergunta assim que termina
+
+        Returns:
+            dict: results (na ordem das perguntas), seconds (tempo total) e concurrency
+        """
+        concurrency = concurrency or batch_settings_from_env()['concurrency']
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_one(question):
+            async with semaphore:
+                result = await self.aquery(question, use_general_agent, max_retries)
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(run_one(question) for question in questions))
+        return {'results': list(results), 'seconds': time.perf_counter() - start, 'concurrency': concurrency}
     
     def _build_context(self):
-        """Constrói contexto sobre os dados carregados"""
+        """
+        Constrói contexto sobre os dados carregados
+
+        Inclui o perfil estatístico de cada arquivo (tipos, nulos, faixas, distintos e valores
+        mais comuns) dentro de CONTEXT_MAX_TOKENS, para o agente não precisar inspecionar os
+        dados a cada pergunta. O texto é reaproveitado enquanto os dados não mudam.
+        """
+        max_tokens = int(os.getenv("CONTEXT_MAX_TOKENS", "1200"))
+        cache_key = (self._agent_cache_key(), max_tokens, self.approximate_mode)
+        if self._context_cache is not None and self._context_cache[0] == cache_key:
+            return self._context_cache[1]
+
         context_parts = []
         context_parts.append("Você é um assistente especializado em análise de dados de arquivos csv, sejam notas fiscais ou não.")
         context_parts.append("Responda sempre em português brasileiro.")
@@ -175,11 +923,92 @@ class CSVAnalysisAgent:
         context_parts.append("Seja preciso e forneça exemplos quando possível.")
         context_parts.append("\nDados disponíveis:")
         
+        profiles = self.active_profiles()
+        if max_tokens > 0 and profiles:
+            context_parts.append("As estatísticas abaixo já foram calculadas sobre os dados completos; use-as diretamente "
+                                 "e só execute código quando a pergunta exigir algo que não esteja aqui.")
+            context_parts.append(build_context_block(profiles, max_tokens))
+        else:
+            for file_type, info in self.file_info.items():
+                context_parts.append(f"- {file_type.title()}: {info['shape'][0]} registros, {info['shape'][1]} colunas")
+                context_parts.append(f"  Colunas: {', '.join(info['columns'][:5])}{'...' if len(info['columns']) > 5 else ''}")
+
+        if self.invoice_index is not None:
+            context_parts.append("\n" + self.invoice_index.context_text())
+
+        if self.sql_engine is not None and self.sql_engine.tables:
+            context_parts.append(f"\nA ferramenta sql_query (DuckDB) consulta os dados completos nas tabelas "
+                                 f"{', '.join(self.sql_engine.tables)}; use-a para agregações e joins grandes.")
         for file_type, info in self.file_info.items():
-            context_parts.append(f"- {file_type.title()}: {info['shape'][0]} registros, {info['shape'][1]} colunas")
-            context_parts.append(f"  Colunas: {', '.join(info['columns'][:5])}{'...' if len(info['columns']) > 5 else ''}")
+            if info.get('out_of_core'):
+                context_parts.append(f"O DataFrame de {file_type} é uma amostra aleatória de "
+                                     f"{len(self.dataframes[file_type])} linhas; para valores exatos use sql_query.")
         
-        return "\n".join(context_parts)
+        context = "\n".join(context_parts)
+        self._context_cache = (cache_key, context)
+        return context
+
+# Linhas de depuração que o modelo às vezes inclui e que não devem ser exibidas
+DEBUG_PREFIXES = ['tipo da resposta', 'conteúdo da resposta', 'debug:', '===']
+
+def stream_clean_response(events, on_step, result):
+    """
+    Filtra incrementalmente os eventos de stream_query para exibição com st.write_stream
+
+    Linhas de depuração são removidas assim que se completam e nada após o primeiro
+    bloco de código (```) é exibido; o texto bruto completo fica em result['raw'] para
+    a extração do código do gráfico.
+
+    Args:
+        events: Iterador de eventos ('token' ou 'step', texto)
+        on_step: Função chamada com a descrição de cada passo do agente
+        result: Dict preenchido com a resposta bruta em 'raw'
+
+    Yields:
+        str: Trechos de texto prontos para exibição
+    """
+    raw = []
+    pending = ''
+    in_code = False
+
+    def visible(line):
+        return not any(debug_prefix in line.lower() for debug_prefix in DEBUG_PREFIXES)
+
+    for kind, text in events:
+        if kind == 'step':
+            on_step(text)
+            continue
+
+        raw.append(text)
+        if in_code:
+            continue
+
+        pending += text
+        if "```" in pending:
+            # A partir do bloco de código o restante só é guardado, não exibido
+            pending = pending.split("```")[0]
+            in_code = True
+
+        # Emite apenas linhas completas, pois o filtro de depuração olha a linha inteira
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            if visible(line):
+                yield line + '\n'
+
+        if in_code:
+            break
+
+    if pending and visible(pending):
+        yield pending
+
+    # Consome o restante dos eventos para guardar a resposta completa
+    for kind, text in events:
+        if kind == 'step':
+            on_step(text)
+        else:
+            raw.append(text)
+
+    result['raw'] = ''.join(raw)
 
 def main():
     # Configuração da página
@@ -215,6 +1044,22 @@ def main():
     # Inicialização do agente
     if 'agent' not in st.session_state:
         st.session_state.agent = CSVAnalysisAgent(openai_api_key)
+
+    st.session_state.agent.approximate_mode = st.sidebar.toggle(
+        "⚡ Modo aproximado (sketches)",
+        value=st.session_state.agent.approximate_mode,
+        help="Responde distribuição, atípicos e frequências a partir de sketches de memória constante "
+             "(t-digest, Count-Min, HyperLogLog e amostra), informando as margens de erro"
+    )
+
+    # Registro de uploads já processados (um por sessão)
+    if 'upload_registry' not in st.session_state:
+        max_upload_mb = float(os.getenv("UPLOAD_CACHE_MAX_MB", "2048"))
+        st.session_state.upload_registry = UploadRegistry(
+            max_bytes=int(max_upload_mb * 1024 ** 2),
+            on_evict=st.session_state.agent.unload_upload
+        )
+        cleanup_orphaned_temp_files()
     
     # Upload de arquivos
     st.sidebar.markdown("---")
@@ -230,73 +1075,180 @@ def main():
     # Processamento dos arquivos
     if uploaded_files:
         validator = CsvValidator()
+        registry = st.session_state.upload_registry
+        new_uploads = []
         
         with st.spinner("🔄 Processando arquivos..."):
             for uploaded_file in uploaded_files:
-                # Salva arquivo temporário
-                with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{uploaded_file.name}") as tmp_file:
-                    tmp_file.write(uploaded_file.getvalue())
-                    tmp_path = tmp_file.name
+                data = uploaded_file.getvalue()
+                upload_key = content_hash(data)
+
+                # Upload já processado nesta sessão: não regrava nem relê o arquivo
+                entry = registry.get(upload_key)
+                if entry is not None:
+                    for file_type in entry['file_types']:
+                        st.sidebar.success(f"✅ {file_type.title()} carregado!")
+                    continue
+
+                temp_paths = []
+                jobs = []
                 
                 try:
                     if uploaded_file.name.endswith('.zip'):
-                        # Processa arquivo ZIP
-                        temp_dir = extract_zip_file(uploaded_file)  # Passa o objeto uploaded_file, não tmp_path
+                        # Processa arquivo ZIP direto da memória, sem extrair para disco
+                        zip_upload = open_zip_upload(data)
                         
-                        if temp_dir:  # Verifica se a extração foi bem-sucedida
-                            # Lista os arquivos CSV no diretório extraído
-                            csv_files = [f for f in os.listdir(temp_dir) if f.endswith('.csv')]
-                            
-                            for csv_file in csv_files:
-                                csv_path = os.path.join(temp_dir, csv_file)
-                                file_type = validator.identify_file_type(csv_path)
-                                if file_type != 'unknown':
-                                    success = st.session_state.agent.load_csv_data(csv_path, file_type)
-                                    if success:
-                                        st.sidebar.success(f"✅ {file_type.title()} carregado!")
-                                    else:
-                                        st.sidebar.error(f"❌ Erro ao carregar {file_type}")
+                        if zip_upload:  # Verifica se a abertura foi bem-sucedida
+                            zip_ref, csv_members = zip_upload
+                            with zip_ref:
+                                for info in csv_members:
+                                    # Lê só o início do membro para detectar formato e tipo
+                                    try:
+                                        with open_zip_member(zip_ref, info) as stream:
+                                            sniffed = validator.sniff(stream)
+                                    except Exception as e:
+                                        st.sidebar.error(f"❌ Erro ao analisar {info.filename}: {str(e)}")
+                                        continue
+                                    file_type = validator.classify(sniffed, info.filename)
+                                    if file_type != 'unknown':
+                                        job = {
+                                            'file_type': file_type,
+                                            'source': f"{uploaded_file.name}/{info.filename}",
+                                            'fingerprint': zip_member_fingerprint(upload_key, info),
+                                            'size': info.file_size,
+                                            'read_kwargs': {'encoding': sniffed['encoding'], 'sep': sniffed['delimiter']}
+                                        }
+                                        if st.session_state.agent.uses_out_of_core(info.file_size):
+                                            # O motor SQL lê o CSV do disco, então o membro é extraído
+                                            job['path'] = extract_zip_member(zip_ref, info)
+                                            temp_paths.append(job['path'])
+                                        else:
+                                            job.update(zip_data=data, member=info.filename)
+                                        jobs.append(job)
                         else:
-                            st.sidebar.error("❌ Erro ao extrair arquivo ZIP")
+                            st.sidebar.error("❌ Erro ao abrir arquivo ZIP")
                     
                     elif uploaded_file.name.endswith('.csv'):
+                        # Salva arquivo temporário
+                        with tempfile.NamedTemporaryFile(delete=False, prefix=TEMP_PREFIX,
+                                                         suffix=f"_{uploaded_file.name}") as tmp_file:
+                            tmp_file.write(data)
+                            tmp_path = tmp_file.name
+                        temp_paths.append(tmp_path)
+
                         # Processa arquivo CSV
                         file_type = validator.identify_file_type(tmp_path)
                         if file_type != 'unknown':
-                            success = st.session_state.agent.load_csv_data(tmp_path, file_type)
-                            if success:
-                                st.sidebar.success(f"✅ {file_type.title()} carregado!")
-                            else:
-                                st.sidebar.error(f"❌ Erro ao carregar {file_type}")
+                            # O sniffing fica em cache no validador: não relê o arquivo
+                            sniffed = validator.sniff(tmp_path)
+                            jobs.append({
+                                'file_type': file_type,
+                                'source': tmp_path,
+                                # O hash do upload já é o hash do conteúdo do arquivo temporário
+                                'fingerprint': {'size': len(data), 'mtime': os.stat(tmp_path).st_mtime_ns,
+                                                'hash': upload_key},
+                                'size': len(data),
+                                'path': tmp_path,
+                                'read_kwargs': {'encoding': sniffed['encoding'], 'sep': sniffed['delimiter']}
+                            })
                         else:
                             st.sidebar.warning(f"⚠️ Tipo de arquivo não identificado: {uploaded_file.name}")
                 
                 except Exception as e:
                     st.sidebar.error(f"❌ Erro ao processar {uploaded_file.name}: {str(e)}")
+
+                new_uploads.append((upload_key, uploaded_file.name, len(data), temp_paths, jobs))
+
+            # Carrega todos os CSVs novos de uma vez, em paralelo
+            all_jobs = [job for *_, jobs in new_uploads for job in jobs]
+            results = iter(st.session_state.agent.load_files_parallel(all_jobs))
+
+            for upload_key, upload_name, upload_size, temp_paths, jobs in new_uploads:
+                loaded_types = []
+                sources = []
+                for job in jobs:
+                    success, error = next(results)
+                    if success:
+                        loaded_types.append(job['file_type'])
+                        sources.append(job['source'])
+                        st.sidebar.success(f"✅ {job['file_type'].title()} carregado!")
+                    else:
+                        st.sidebar.error(f"❌ Erro ao carregar {os.path.basename(job['source'])}: {error}")
+
+                if loaded_types:
+                    registry.add(upload_key, upload_name, upload_size, temp_paths, loaded_types, sources)
+                else:
+                    # Nada foi carregado: descarta os temporários e tenta de novo na próxima execução
+                    for path in temp_paths:
+                        remove_temp_path(path)
     
     # Exibição dos dados carregados
     if st.session_state.agent.dataframes:
         st.markdown("---")
         st.header("📊 Dados Carregados")
         
-        # Tabs para diferentes tipos de dados
-        tabs = st.tabs([f"{file_type.title()} ({info['shape'][0]} registros)" 
-                       for file_type, info in st.session_state.agent.file_info.items()])
-        
-        for i, (file_type, df) in enumerate(st.session_state.agent.dataframes.items()):
+        # Tabs para diferentes tipos de dados; tudo vem do resumo calculado na carga
+        summaries = st.session_state.agent.summaries
+        tabs = st.tabs([f"{file_type.title()} ({summary['rows']} registros)"
+                        for file_type, summary in summaries.items()])
+
+        for i, (file_type, summary) in enumerate(summaries.items()):
             with tabs[i]:
-                st.dataframe(df.head(10), use_container_width=True)
-                
+                st.dataframe(summary['preview'], use_container_width=True)
+
+                if summary['sample']:
+                    st.caption("Arquivo fora de memória: a análise usa uma amostra; consultas exatas via SQL.")
+                if summary['dtype_warnings']:
+                    st.warning(f"⚠️ Colunas que deveriam ser numéricas foram lidas como texto: "
+                               f"{', '.join(map(str, summary['dtype_warnings']))}")
+
                 col1, col2, col3 = st.columns(3)
                 with col1:
-                    st.metric("Registros", df.shape[0])
+                    st.metric("Registros", summary['rows'])
                 with col2:
-                    st.metric("Colunas", df.shape[1])
+                    st.metric("Colunas", summary['columns'])
                 with col3:
-                    if 'valor_total' in df.columns:
-                        total_value = df['valor_total'].sum() if pd.api.types.is_numeric_dtype(df['valor_total']) else 0
-                        st.metric("Valor Total", f"R$ {total_value:,.2f}")
-    
+                    totals = {str(col).lower(): total for col, total in summary['totals'].items()}
+                    if 'valor_total' in totals:
+                        st.metric("Valor Total", f"R$ {totals['valor_total']:,.2f}")
+
+                # Navegação paginada: só a página atual é lida (do cache colunar) e enviada ao navegador
+                if st.toggle("🔎 Navegar por todas as linhas", key=f"browse_{file_type}"):
+                    col1, col2 = st.columns(2)
+                    page_size = col1.selectbox("Linhas por página", [100, 500, 1000, 5000],
+                                               key=f"browse_size_{file_type}")
+                    pages = max(-(-summary['rows'] // page_size), 1)
+                    page = col2.number_input(f"Página (de {pages})", min_value=1, max_value=pages, value=1,
+                                             key=f"browse_page_{file_type}")
+                    start = (int(page) - 1) * page_size
+                    try:
+                        window = st.session_state.agent.browse_rows(file_type, start, page_size)
+                        st.dataframe(window, use_container_width=True)
+                        st.caption(f"Linhas {start + 1}–{start + len(window)} de {summary['rows']}")
+                    except Exception as e:
+                        st.error(f"Erro ao ler as linhas: {str(e)}")
+
+        # Vínculo cabeçalho↔itens pré-calculado na carga
+        invoice_index = st.session_state.agent.invoice_index
+        if invoice_index is not None:
+            st.subheader("🔗 Notas × Itens")
+            summary = invoice_index.summary()
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Notas com itens", f"{summary['notas_com_itens']} de {summary['notas']}")
+            col2.metric("Itens vinculados", summary['itens_vinculados'])
+            col3.metric("Itens sem cabeçalho", summary['itens_sem_cabecalho'])
+            col4.metric("Fornecedores / Produtos", f"{summary['fornecedores']} / {summary['produtos']}")
+
+            col1, col2 = st.columns(2)
+            if invoice_index.suppliers is not None:
+                with col1:
+                    st.markdown("**Maiores fornecedores**")
+                    st.dataframe(invoice_index.top_suppliers(5), use_container_width=True)
+            if invoice_index.products is not None:
+                with col2:
+                    st.markdown("**Produtos de maior valor**")
+                    st.dataframe(invoice_index.top_products(5), use_container_width=True)
+
     # Interface de consulta
     st.markdown("---")
     st.header("💬 Faça sua Pergunta")
@@ -328,51 +1280,159 @@ def main():
         # Botão de consulta
         if st.button("🔍 Analisar", type="primary"):
             if user_question.strip():
-                with st.spinner("🤖 Analisando dados com GPT..."):
-                    try:
-                        resp = st.session_state.agent.query(user_question)
-                        response = resp.split("```")[0]
-
-                        # Limpa e exibe a resposta
-                        if response and str(response).strip():
-                            # Remove possíveis prefixos de debug
-                            clean_response = str(response).strip()
- 
-                            # Remove linhas que começam com "Tipo da resposta" ou similar
-                            lines = clean_response.split('\n')
-                            clean_lines = []
-                            for line in lines:
-                                if not any(debug_prefix in line.lower() for debug_prefix in 
-                                         ['tipo da resposta', 'conteúdo da resposta', 'debug:', '===']):
-                                    clean_lines.append(line)
-                            
-                            final_response = '\n'.join(clean_lines).strip()
-                             # Exibe a resposta final
-                            st.markdown(final_response)
-
-                        if resp.__len__() > 0:
-                            if "```" in resp:
-                                code_blocks = re.findall(r"```(?:python)?\s*([\s\S]*?)```", resp)
-                                if code_blocks:
-                                    code = code_blocks[0]
-                                    st.markdown("### Gráfico gerado")
-                                    try:
-                                        # executa o código num namespace que já tem 'df', 'plt' e 'st'
-                                        exec_globals = {"df": st.session_state.agent.dataframes['csv'], "plt": plt}
-                                        exec(code, exec_globals)
-                                        st.pyplot(plt.gcf())
-                                        plt.clf()
-                                    except Exception as e:
-                                        st.error(f"Erro ao montar gráfico a partir do código informado: {e}")
-                        else:
-                            st.error("Não foi possível obter uma resposta válida.")
-                    except Exception as e:
-                        st.error(f"Erro ao processar pergunta: {str(e)}")
+                status = st.status("🤖 Analisando dados com GPT...", expanded=False)
+                try:
+                    # Exibe a resposta à medida que os tokens chegam
+                    result = {}
+                    # closing: se a execução for interrompida no meio, o trecho da consulta fecha aqui
+                    with closing(st.session_state.agent.stream_query(user_question)) as events:
+                        st.write_stream(stream_clean_response(events, status.write, result))
+                    status.update(label="✅ Análise concluída", state="complete")
+                    resp = result.get('raw', '')
+
+                    if st.session_state.agent.last_response_source == 'fast_path':
+                        st.caption("⚡ Resposta calculada localmente, sem consultar o GPT")
+                    elif (st.session_state.agent.last_response_source or '').startswith('cache'):
+                        st.caption("⚡ Resposta obtida do cache")
+
+                    if resp.__len__() > 0:
+                        if "```" in resp:
+                            code_blocks = re.findall(r"```(?:python)?\s*([\s\S]*?)```", resp)
+                            if code_blocks:
+                                code = code_blocks[0]
+                                st.markdown("### Gráfico gerado")
+                                try:
+                                    # O código roda num worker isolado, que já tem 'df', 'plt', 'sns', 'pd' e 'np'
+                                    png, details = st.session_state.agent.render_chart(code)
+                                    st.image(png)
+                                    if details['rows'] < details['total_rows']:
+                                        st.caption(f"Gráfico gerado sobre amostra estratificada de {details['rows']} "
+                                                   f"de {details['total_rows']} linhas")
+                                    for note in details['notes']:
+                                        st.caption(f"📉 {note}")
+                                except ChartError as e:
+                                    st.error(f"Erro ao montar gráfico a partir do código informado: {e}")
+                    else:
+                        st.error("Não foi possível obter uma resposta válida.")
+                except Exception as e:
+                    status.update(label="❌ Erro na análise", state="error")
+                    st.error(f"Erro ao processar pergunta: {str(e)}")
             else:
                 st.warning("⚠️ Por favor, digite uma pergunta.")
+
+        # Relatório automático: todas as perguntas de exemplo respondidas em paralelo
+        with st.expander("📋 Relatório automático de análise exploratória"):
+            sample_questions = get_sample_questions()
+            concurrency = st.slider("Perguntas simultâneas", 1, 16, batch_settings_from_env()['concurrency'])
+            if st.button(f"Gerar relatório ({len(sample_questions)} perguntas)"):
+                progress_bar = st.progress(0.0, text="Respondendo perguntas...")
+                done = []
+
+                def on_result(result):
+                    done.append(result)
+                    progress_bar.progress(len(done) / len(sample_questions),
+                                          text=f"{len(done)}/{len(sample_questions)} perguntas respondidas")
+
+                try:
+                    batch = asyncio.run(st.session_state.agent.query_batch(
+                        sample_questions, concurrency=concurrency, on_result=on_result
+                    ))
+                    st.session_state.batch_report = build_batch_report(batch)
+                except Exception as e:
+                    st.error(f"Erro ao gerar relatório: {str(e)}")
+                progress_bar.empty()
+
+            if st.session_state.get('batch_report'):
+                st.download_button("⬇️ Baixar relatório", st.session_state.batch_report,
+                                   file_name="relatorio_eda.md", mime="text/markdown")
+                st.markdown(st.session_state.batch_report)
     else:
         st.info("📁 Faça upload de arquivos CSV ou ZIP para começar a análise.")
     
+    # Painel de desempenho: etapas, memória, chamadas ao LLM e ferramentas das últimas consultas e cargas
+    tracer = st.session_state.agent.tracer
+    if tracer.enabled:
+        st.sidebar.markdown("---")
+        with st.sidebar.expander("⏱️ Desempenho"):
+            traces = tracer.recent(20)
+            if not traces:
+                st.caption("Nenhuma consulta ou carga registrada ainda.")
+            else:
+                last = traces[0]
+                totals = last.totals()
+                st.markdown(f"**Último: {last.name}** ({last.seconds:.2f}s)")
+                col1, col2 = st.columns(2)
+                col1.metric("Chamadas ao LLM", totals['llm_calls'])
+                col2.metric("Tokens (prompt/resposta)", f"{totals['prompt_tokens']}/{totals['completion_tokens']}")
+
+                stages = []
+                for depth, span in flatten_spans(last):
+                    span_totals = span.totals()
+                    stages.append({
+                        'Etapa': '· ' * depth + span.name,
+                        'Segundos': round(span.seconds or 0, 3),
+                        'Δ RSS (MB)': None if span.rss_delta_mb is None else round(span.rss_delta_mb, 1),
+                        'LLM': span_totals['llm_calls'],
+                        'Ferramentas': span_totals['tool_steps'],
+                    })
+                st.dataframe(pd.DataFrame(stages), hide_index=True, use_container_width=True)
+                if last.peak_rss_mb is not None:
+                    st.caption(f"Pico de memória do processo: {last.peak_rss_mb:.0f} MB")
+
+                steps = [step for _, span in flatten_spans(last) for step in span.tool_steps]
+                for step in steps:
+                    st.caption(f"🛠️ {step['tool']} ({step['seconds']:.2f}s): {step['input'][:80]}")
+
+                st.markdown("**Histórico**")
+                history = []
+                for span in traces:
+                    span_totals = span.totals()
+                    history.append({
+                        'Tipo': span.kind,
+                        'Detalhe': str(span.attributes.get('question') or span.attributes.get('file')
+                                       or span.attributes.get('file_type') or span.name)[:40],
+                        'Segundos': round(span.seconds or 0, 2),
+                        'LLM': span_totals['llm_calls'],
+                        'Tokens': span_totals['prompt_tokens'] + span_totals['completion_tokens'],
+                    })
+                st.dataframe(pd.DataFrame(history), hide_index=True, use_container_width=True)
+                st.download_button("⬇️ Exportar traços (JSONL)", tracer.to_jsonl(), file_name="traces.jsonl",
+                                   mime="application/jsonl")
+
+            pool_stats = get_llm_pool().get_stats()
+            if pool_stats['requests']:
+                st.caption(f"🔌 LLM: {pool_stats['upstream']} chamada(s) ao servidor, {pool_stats['coalesced']} "
+                           f"juntada(s) a uma idêntica em andamento, pico de {pool_stats['peak_in_flight']}/"
+                           f"{pool_stats['max_concurrency']} simultâneas, {pool_stats['wait_seconds']:.1f}s na fila")
+
+            if warmup_state['stages']:
+                status = "concluído" if warmup_state['done'] else "em andamento"
+                stages = ', '.join(f"{name}: {seconds:.2f}s" if isinstance(seconds, float) else f"{name}: {seconds}"
+                                   for name, seconds in warmup_state['stages'].items())
+                st.caption(f"🔥 Pré-aquecimento {status} ({stages})")
+
+    # Memória dos DataFrames compartilhados por todas as sessões do processo (visão de operação)
+    store_stats = st.session_state.agent.dataset_store.get_stats()
+    if store_stats['datasets']:
+        with st.sidebar.expander("🗄️ Dados compartilhados"):
+            col1, col2 = st.columns(2)
+            col1.metric("Residentes (MB)", f"{store_stats['resident_mb']:.0f}",
+                        help=f"Em uso por sessões: {store_stats['referenced_mb']:.0f} MB")
+            col2.metric("Orçamento (MB)", f"{store_stats['budget_mb']:.0f}")
+            if store_stats['over_budget']:
+                st.warning("Conjuntos em uso acima do orçamento: nenhum pode ser despejado enquanto houver sessões.")
+            st.dataframe(pd.DataFrame([{
+                'Conjunto': item['key'],
+                'Linhas': item['rows'],
+                'MB': round(item['mb'], 1),
+                'Sessões': item['sessions'],
+                'Origem': item['source'],
+                'Ocioso (s)': round(item['idle_seconds']),
+            } for item in store_stats['items']]), hide_index=True, use_container_width=True)
+            st.caption(f"{store_stats['sessions']} sessão(ões) ativas · {store_stats['shared']} carga(s) evitadas "
+                       f"por compartilhamento · {store_stats['disk_loads']} do disco · "
+                       f"{store_stats['evictions']} despejo(s), {store_stats['spills']} gravados no cache colunar")
+
     # Informações adicionais
     st.sidebar.markdown("---")
     st.sidebar.markdown("### 📚 Sobre")
@@ -392,5 +1452,8 @@ def main():
     - [Streamlit Documentation](https://docs.streamlit.io/)
     """)
 
+    # A página já foi desenhada: carrega em segundo plano o que a primeira pergunta vai precisar
+    start_warmup(openai_api_key)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
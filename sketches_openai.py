@@ -0,0 +1,345 @@
+import numpy as np
+import pandas as pd
+
+
+# Abaixo desta quantidade de linhas a contagem de distintos exata é barata o suficiente
+HLL_MIN_ROWS = 200000
+
+# Colunas numéricas com até esta quantidade de distintos são tratadas como categóricas (valores mais frequentes)
+LOW_CARDINALITY = 50
+
+
+def hash_series(series: pd.Series) -> np.ndarray:
+    """
+    Gera hashes de 64 bits (vetorizados) dos valores não nulos de uma coluna
+
+    Args:
+        series: Coluna do DataFrame
+
+    Returns:
+        np.ndarray: Hashes uint64, um por valor não nulo
+    """
+    return pd.util.hash_pandas_object(series.dropna(), index=False).to_numpy(dtype=np.uint64)
+
+
+def _rank(remainder: np.ndarray) -> np.ndarray:
+    """
+    Posição do primeiro bit 1 (zeros à esquerda + 1) nos 32 bits mais altos de cada hash
+
+    Os 32 bits cabem exatamente num float64, então frexp devolve o tamanho em bits
+    sem laço em Python; posições além de 32 têm probabilidade desprezível (2^-32).
+    """
+    high = ((remainder >> np.uint64(32)) | np.uint64(1)).astype(np.float64)
+    return (33 - np.frexp(high)[1]).astype(np.uint8)
+
+
+class HyperLogLog:
+    """Estimador de quantidade de valores distintos (HyperLogLog) com memória fixa de 2^p bytes"""
+
+    def __init__(self, p: int = 14):
+        """
+        Args:
+            p: Bits de índice; o erro padrão é cerca de 1,04 / sqrt(2^p) (0,8% para p=14)
+        """
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add_hashes(self, hashes: np.ndarray) -> None:
+        """Adiciona hashes uint64 (ver hash_series)"""
+        if not len(hashes):
+            return
+        p = np.uint64(self.p)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        np.maximum.at(self.registers, index, _rank(hashes << p))
+
+    def add_series(self, series: pd.Series) -> None:
+        """Adiciona os valores não nulos de uma coluna"""
+        self.add_hashes(hash_series(series))
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        """Combina outro sketch com o mesmo p (ex.: de outro chunk)"""
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        """Estimativa da quantidade de valores distintos"""
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        # Correção para cardinalidades pequenas (linear counting)
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * np.log(self.m / zeros)
+        return int(round(estimate))
+
+
+def distinct_count(series: pd.Series) -> tuple:
+    """
+    Quantidade de valores distintos: exata em colunas pequenas, HyperLogLog nas grandes
+
+    Args:
+        series: Coluna do DataFrame
+
+    Returns:
+        tuple: (quantidade, True se for aproximada)
+    """
+    if len(series) < HLL_MIN_ROWS:
+        return int(series.nunique(dropna=True)), False
+    sketch = HyperLogLog()
+    sketch.add_series(series)
+    return sketch.count(), True
+
+
+class TDigest:
+    """Quantis aproximados (t-digest com função de escala k1), com memória proporcional à compressão"""
+
+    def __init__(self, compression: int = 200):
+        """
+        Args:
+            compression: Parâmetro δ; mais centróides (e mais precisão nas caudas) quanto maior
+        """
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values: np.ndarray) -> None:
+        """Adiciona um lote de valores (NaN são ignorados)"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        # Ordenar só os valores (sem argsort) e intercalar os centróides já ordenados é bem mais barato
+        values = np.sort(values)
+        positions = np.searchsorted(values, self.means)
+        self._compress(np.insert(values, positions, self.means),
+                       np.insert(np.ones(len(values)), positions, self.weights), presorted=True)
+
+    def merge(self, other: 'TDigest') -> None:
+        """Combina outro digest (ex.: de outro chunk)"""
+        if not other.count:
+            return
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(np.concatenate([self.means, other.means]),
+                       np.concatenate([self.weights, other.weights]))
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray, presorted: bool = False) -> None:
+        """Funde centróides vizinhos que cabem na mesma unidade da escala k1"""
+        if not presorted:
+            order = np.argsort(means)
+            means, weights = means[order], weights[order]
+        total = weights.sum()
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        groups = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def _positions(self) -> tuple:
+        """Pontos (posto acumulado, valor) para interpolação, incluindo mínimo e máximo"""
+        ranks = np.r_[0.0, np.cumsum(self.weights) - self.weights / 2, self.count]
+        values = np.r_[self.min, self.means, self.max]
+        return ranks, values
+
+    def quantile(self, q: float) -> float:
+        """Valor aproximado do quantil q (0 a 1)"""
+        if not self.count:
+            return float('nan')
+        ranks, values = self._positions()
+        return float(np.interp(q * self.count, ranks, values))
+
+    def cdf(self, x: float) -> float:
+        """Fração aproximada dos valores menores ou iguais a x"""
+        if not self.count:
+            return float('nan')
+        ranks, values = self._positions()
+        return float(np.interp(x, values, ranks) / self.count)
+
+
+class CountMinSketch:
+    """Contagem aproximada de frequências (Count-Min) com candidatos aos mais frequentes"""
+
+    def __init__(self, epsilon: float = 0.001, delta: float = 0.01, capacity: int = 50, seed: int = 7):
+        """
+        Args:
+            epsilon: Superestimativa máxima das contagens, como fração do total
+            delta: Probabilidade de a superestimativa passar de epsilon
+            capacity: Quantidade de candidatos a mais frequentes mantidos
+            seed: Semente das funções de hash das linhas
+        """
+        self.epsilon = epsilon
+        self.delta = delta
+        self.width = int(np.ceil(np.e / epsilon))
+        self.depth = int(np.ceil(np.log(1 / delta)))
+        self.capacity = capacity
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.total = 0
+        rng = np.random.default_rng(seed)
+        self._mult = rng.integers(1, 2 ** 63, self.depth, dtype=np.uint64) | np.uint64(1)
+        self._add = rng.integers(0, 2 ** 63, self.depth, dtype=np.uint64)
+        self.candidates = {}
+
+    def _columns(self, hashes: np.ndarray, row: int) -> np.ndarray:
+        """Coluna da tabela de cada hash na linha informada"""
+        mixed = hashes * self._mult[row] + self._add[row]
+        return ((mixed >> np.uint64(32)) % np.uint64(self.width)).astype(np.int64)
+
+    def estimate_hashes(self, hashes: np.ndarray) -> np.ndarray:
+        """Contagem estimada (limite superior) de cada hash"""
+        return np.min([self.table[row, self._columns(hashes, row)] for row in range(self.depth)], axis=0)
+
+    def update(self, series: pd.Series, hashes: np.ndarray) -> None:
+        """
+        Adiciona os valores de um chunk
+
+        Args:
+            series: Valores não nulos do chunk
+            hashes: Hashes de series (ver hash_series)
+        """
+        if not len(hashes):
+            return
+        self.total += len(hashes)
+        for row in range(self.depth):
+            self.table[row] += np.bincount(self._columns(hashes, row), minlength=self.width)
+
+        # Os mais frequentes do chunk disputam as vagas de candidatos com os atuais
+        chunk_top = series.value_counts().head(self.capacity)
+        top_values = pd.Series(chunk_top.index, dtype=series.dtype)
+        for value, value_hash in zip(top_values, hash_series(top_values)):
+            self.candidates[int(value_hash)] = value
+
+        if len(self.candidates) > self.capacity:
+            keys = np.fromiter(self.candidates.keys(), dtype=np.uint64, count=len(self.candidates))
+            keep = keys[np.argsort(-self.estimate_hashes(keys), kind='stable')[:self.capacity]]
+            self.candidates = {int(key): self.candidates[int(key)] for key in keep}
+
+    def top_k(self, k: int) -> list:
+        """
+        Valores mais frequentes com a contagem estimada
+
+        Returns:
+            list: (valor, contagem) em ordem decrescente
+        """
+        if not self.candidates:
+            return []
+        keys = np.fromiter(self.candidates.keys(), dtype=np.uint64, count=len(self.candidates))
+        estimates = self.estimate_hashes(keys)
+        order = np.argsort(-estimates, kind='stable')[:k]
+        return [(self.candidates[int(keys[i])], int(estimates[i])) for i in order]
+
+
+class ReservoirSample:
+    """Amostra aleatória uniforme de tamanho fixo das linhas vistas até agora"""
+
+    def __init__(self, size: int = 10000, seed: int = 42):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.sample = None
+        self.keys = np.empty(0)
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """Adiciona um chunk: cada linha recebe uma prioridade aleatória e ficam as menores"""
+        keys = self.rng.random(len(chunk))
+        if self.sample is not None and len(self.keys) >= self.size:
+            # Só linhas com prioridade abaixo da pior da amostra podem entrar
+            mask = keys < self.keys.max()
+            chunk, keys = chunk[mask], keys[mask]
+            if not len(keys):
+                return
+
+        frames = [chunk] if self.sample is None else [self.sample, chunk]
+        combined = pd.concat(frames, ignore_index=True)
+        keys = np.concatenate([self.keys, keys])
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size)[:self.size]
+            combined, keys = combined.iloc[keep].reset_index(drop=True), keys[keep]
+        self.sample, self.keys = combined, keys
+
+
+class ColumnSketch:
+    """Sketches de uma coluna: contagens e momentos exatos, HyperLogLog, t-digest e Count-Min"""
+
+    def __init__(self, numeric: bool, dtype):
+        self.numeric = numeric
+        self.dtype = str(dtype)
+        self.count = 0
+        self.nulls = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.total = 0.0
+        self.hll = HyperLogLog()
+        self.digest = TDigest() if numeric else None
+        self.frequent = CountMinSketch()
+
+    def update(self, series: pd.Series) -> None:
+        """Adiciona os valores de um chunk da coluna"""
+        if self.numeric and not pd.api.types.is_numeric_dtype(series):
+            series = pd.to_numeric(series, errors='coerce')
+        values = series.dropna()
+        self.nulls += len(series) - len(values)
+        if not len(values):
+            return
+
+        hashes = hash_series(values)
+        self.hll.add_hashes(hashes)
+        # Mais frequentes só interessam em colunas de texto ou numéricas de baixa cardinalidade
+        if not self.numeric or self.hll.count() <= LOW_CARDINALITY:
+            self.frequent.update(values, hashes)
+
+        if self.numeric:
+            array = values.to_numpy(dtype=np.float64)
+            self.digest.update(array)
+            # Média e variância combinadas por chunk (Chan et al.), estáveis numericamente
+            n, chunk_mean = len(array), float(array.mean())
+            delta = chunk_mean - self.mean
+            total = self.count + n
+            self.m2 += float(((array - chunk_mean) ** 2).sum()) + delta ** 2 * self.count * n / total
+            self.mean += delta * n / total
+            self.total += float(array.sum())
+        self.count += len(values)
+
+
+class DatasetSketch:
+    """Sketches de todas as colunas de um CSV, atualizados chunk a chunk com memória constante"""
+
+    def __init__(self, reservoir_size: int = 10000):
+        self.rows = 0
+        self.columns = {}
+        self.reservoir = ReservoirSample(reservoir_size)
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """Adiciona um chunk lido do CSV"""
+        self.rows += len(chunk)
+        for col in chunk.columns:
+            if col not in self.columns:
+                series = chunk[col]
+                numeric = pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+                self.columns[col] = ColumnSketch(numeric, series.dtype)
+            self.columns[col].update(chunk[col])
+        self.reservoir.update(chunk)
+
+    def memory_bytes(self) -> int:
+        """Memória aproximada ocupada pelos sketches e pela amostra"""
+        total = 0
+        for column in self.columns.values():
+            total += column.hll.registers.nbytes + column.frequent.table.nbytes
+            if column.digest is not None:
+                total += column.digest.means.nbytes + column.digest.weights.nbytes
+        if self.reservoir.sample is not None:
+            total += int(self.reservoir.sample.memory_usage(deep=True).sum())
+        return total
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, chunk_rows: int = 50000) -> 'DatasetSketch':
+        """Constrói os sketches percorrendo um DataFrame já carregado em fatias"""
+        sketch = cls()
+        for start in range(0, len(df), chunk_rows):
+            sketch.update(df.iloc[start:start + chunk_rows])
+        return sketch
@@ -0,0 +1,213 @@
+import os
+import re
+import threading
+from typing import Optional
+
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except ImportError:
+    pa = None
+
+
+# Apenas consultas de leitura são aceitas pela ferramenta do agente
+READ_ONLY_SQL = re.compile(r'^\s*(select|with|from|describe|summarize|show|pivot)\b', re.IGNORECASE)
+
+# Linhas devolvidas ao agente por consulta
+TOOL_MAX_ROWS = 50
+
+
+def _sql_literal(value: str) -> str:
+    """Texto como literal SQL entre aspas simples"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _sql_identifier(name: str) -> str:
+    """Nome de tabela entre aspas duplas"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+class SqlEngine:
+    """Motor SQL embutido (DuckDB) sobre os arquivos carregados, com leitura preguiçosa e spill em disco"""
+
+    def __init__(self, memory_limit: Optional[str] = None, temp_directory: Optional[str] = None,
+                 threads: Optional[int] = None):
+        """
+        Args:
+            memory_limit: Limite de memória do DuckDB (ex.: '4GB'); acima dele as operações usam o disco
+            temp_directory: Pasta para o spill de joins e agregações grandes
+            threads: Quantidade de threads do DuckDB (padrão: todos os núcleos)
+        """
+        self.con = duckdb.connect(':memory:')
+        if memory_limit:
+            self.con.execute(f"SET memory_limit = {_sql_literal(memory_limit)}")
+        if temp_directory:
+            os.makedirs(temp_directory, exist_ok=True)
+            self.con.execute(f"SET temp_directory = {_sql_literal(temp_directory)}")
+        if threads:
+            self.con.execute(f"SET threads = {int(threads)}")
+        self.con.execute("SET preserve_insertion_order = false")
+        # Tabelas registradas: nome -> origem ('csv', 'arrow' ou 'dataframe')
+        self.tables = {}
+        # Objetos registrados via register() só existem nesta conexão, então todas as consultas passam por ela
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional['SqlEngine']:
+        """
+        Cria o motor a partir de SQL_ENGINE, DUCKDB_MEMORY_LIMIT, DUCKDB_TEMP_DIR e DUCKDB_THREADS
+
+        Returns:
+            SqlEngine: Instância configurada ou None se o DuckDB não estiver instalado ou SQL_ENGINE=0
+        """
+        if duckdb is None or os.getenv("SQL_ENGINE", "1") == "0":
+            return None
+        try:
+            return cls(
+                memory_limit=os.getenv("DUCKDB_MEMORY_LIMIT") or None,
+                temp_directory=os.getenv("DUCKDB_TEMP_DIR", ".duckdb_tmp"),
+                threads=int(os.getenv("DUCKDB_THREADS", "0")) or None
+            )
+        except Exception:
+            return None
+
+    def register_csv(self, name: str, path: str, encoding: str = 'utf-8', sep: str = ',') -> None:
+        """
+        Registra um CSV como view; o arquivo só é lido nas consultas, com projeção e filtros empurrados para a leitura
+
+        Args:
+            name: Nome da tabela (ex.: 'itens')
+            path: Caminho do CSV
+            encoding: Codificação detectada pelo sniffing
+            sep: Delimitador detectado pelo sniffing
+        """
+        # O DuckDB descarta o BOM sozinho
+        encoding = 'utf-8' if encoding.lower().replace('_', '-') in ('utf-8', 'utf-8-sig', 'utf8') else encoding
+        with self._lock:
+            self._drop(name)
+            self.con.execute(
+                f"CREATE VIEW {_sql_identifier(name)} AS SELECT * FROM read_csv("
+                f"{_sql_literal(path)}, delim={_sql_literal(sep)}, header=true, "
+                f"encoding={_sql_literal(encoding)})"
+            )
+            self.tables[name] = 'csv'
+
+    def register_arrow(self, name: str, path: str) -> None:
+        """Registra um arquivo Arrow IPC do cache colunar, mapeado em memória (sem cópia)"""
+        table = pa_ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        with self._lock:
+            self._drop(name)
+            self.con.register(name, table)
+            self.tables[name] = 'arrow'
+
+    def register_dataframe(self, name: str, df: pd.DataFrame) -> None:
+        """Registra um DataFrame já em memória; o DuckDB lê as colunas dele sem copiar"""
+        # Como tabela Arrow, colunas de texto (já em Arrow no pandas) não são convertidas para objetos Python
+        data = pa.Table.from_pandas(df, preserve_index=False) if pa is not None else df
+        with self._lock:
+            self._drop(name)
+            self.con.register(name, data)
+            self.tables[name] = 'dataframe'
+
+    def _drop(self, name: str) -> None:
+        """Remove a tabela, qualquer que seja a forma em que foi registrada (chamar com o lock)"""
+        kind = self.tables.pop(name, None)
+        if kind == 'csv':
+            self.con.execute(f"DROP VIEW IF EXISTS {_sql_identifier(name)}")
+        elif kind is not None:
+            self.con.unregister(name)
+
+    def drop(self, name: str) -> None:
+        """Remove a tabela do motor"""
+        with self._lock:
+            self._drop(name)
+
+    def query(self, sql: str) -> pd.DataFrame:
+        """Executa uma consulta e devolve o resultado como DataFrame"""
+        with self._lock:
+            return self.con.execute(sql).df()
+
+    def fetch_rows(self, name: str, start: int, count: int) -> pd.DataFrame:
+        """
+        Janela de linhas da tabela na ordem do arquivo, para a navegação paginada
+
+        Args:
+            name: Nome da tabela
+            start: Primeira linha (base 0)
+            count: Quantidade de linhas
+
+        Returns:
+            pd.DataFrame: Linhas da janela
+        """
+        with self._lock:
+            # Sem ORDER BY, só a ordem de inserção garante páginas consistentes
+            self.con.execute("SET preserve_insertion_order = true")
+            try:
+                return self.con.execute(
+                    f"SELECT * FROM {_sql_identifier(name)} LIMIT {int(count)} OFFSET {int(start)}"
+                ).df()
+            finally:
+                self.con.execute("SET preserve_insertion_order = false")
+
+    def schema_text(self) -> str:
+        """Tabelas e colunas registradas, em uma linha por tabela, para o prompt do agente"""
+        lines = []
+        with self._lock:
+            for name in self.tables:
+                columns = self.con.execute(f"DESCRIBE {_sql_identifier(name)}").fetchall()
+                lines.append(f"{name}({', '.join(f'{column[0]} {column[1]}' for column in columns)})")
+        return '\n'.join(lines)
+
+    def run_tool(self, sql: str) -> str:
+        """
+        Executa a consulta pedida pelo agente
+
+        Args:
+            sql: Consulta SQL (somente leitura)
+
+        Returns:
+            str: Resultado em markdown (até TOOL_MAX_ROWS linhas) ou a mensagem de erro, para o agente corrigir
+        """
+        sql = sql.strip().strip('`').strip()
+        if sql.lower().startswith('sql'):
+            sql = sql[3:].strip()
+        if not READ_ONLY_SQL.match(sql):
+            return "Erro: apenas consultas de leitura (SELECT/WITH/DESCRIBE/SUMMARIZE) são permitidas."
+        try:
+            result = self.query(f"SELECT * FROM ({sql.rstrip(';')}) AS resultado LIMIT {TOOL_MAX_ROWS + 1}")
+        except Exception as e:
+            return f"Erro ao executar SQL: {str(e)}"
+        truncated = len(result) > TOOL_MAX_ROWS
+        text = result.head(TOOL_MAX_ROWS).to_markdown(index=False)
+        return text + (f"\n\n(mostrando as primeiras {TOOL_MAX_ROWS} linhas)" if truncated else '')
+
+
+def create_sql_tool(engine: SqlEngine):
+    """
+    Ferramenta LangChain que dá ao agente acesso SQL às tabelas do motor
+
+    Args:
+        engine: Motor SQL com as tabelas já registradas
+
+    Returns:
+        Tool: Ferramenta 'sql_query'
+    """
+    from langchain_core.tools import Tool
+
+    return Tool(
+        name="sql_query",
+        func=engine.run_tool,
+        description=(
+            "Executa uma consulta SQL (dialeto DuckDB, somente leitura) sobre os dados completos e devolve "
+            "até 50 linhas. Prefira esta ferramenta para agregações, filtros e joins em dados grandes, por "
+            "exemplo entre cabecalho e itens via cabecalho.numero = itens.numero_nf. "
+            f"Tabelas disponíveis:\n{engine.schema_text()}"
+        )
+    )
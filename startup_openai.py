@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+import warnings
+
+import pandas as pd
+from dotenv import load_dotenv
+
+
+# O Streamlit reexecuta o script a cada interação, mas os módulos importados permanecem:
+# o estado abaixo vale para o processo inteiro
+_configured = False
+_warmup_thread = None
+_lock = threading.Lock()
+
+# Resultado do pré-aquecimento: etapa -> segundos (ou mensagem de erro)
+warmup_state = {'done': False, 'stages': {}}
+
+
+def configure_process() -> None:
+    """
+    Lê o .env, silencia os avisos e liga o copy-on-write do pandas uma única vez por processo,
+    não a cada reexecução do script
+
+    As sessões recebem visões do mesmo DataFrame (DatasetStore); sem copy-on-write, uma escrita
+    no lugar feita pelo código do agente (df.loc[...] = ..., fillna(inplace=True)) alteraria os
+    dados de todas. No pandas 3 ele é sempre ligado e a opção está obsoleta.
+    """
+    global _configured
+    with _lock:
+        if _configured:
+            return
+        load_dotenv()
+        warnings.filterwarnings("ignore")
+        if int(pd.__version__.split('.')[0]) < 3:
+            pd.set_option("mode.copy_on_write", True)
+        _configured = True
+
+
+def _warm_up(openai_api_key) -> None:
+    """Importa a pilha do agente, instancia o cliente da OpenAI e sobe os workers de gráfico"""
+    def stage(name, function):
+        start = time.perf_counter()
+        try:
+            function()
+            warmup_state['stages'][name] = round(time.perf_counter() - start, 3)
+        except Exception as e:
+            warmup_state['stages'][name] = f"erro: {str(e)}"
+
+    def import_agent_stack():
+        try:
+            from langchain_experimental.agents import create_pandas_dataframe_agent  # noqa: F401
+        except ImportError:
+            from langchain.agents import create_pandas_dataframe_agent  # noqa: F401
+        from langchain.agents.agent_types import AgentType  # noqa: F401
+
+    def create_client():
+        # O primeiro ChatOpenAI carrega os módulos do SDK da OpenAI sob demanda; com a chave real,
+        # a instância criada é a mesma que as consultas vão usar
+        from llm_pool_openai import get_llm_pool
+        get_llm_pool().chat_model(openai_api_key or "sk-warmup")
+
+    def start_chart_workers():
+        from charts_openai import get_chart_renderer
+        get_chart_renderer().warm_up()
+
+    stage('agente (langchain)', import_agent_stack)
+    stage('cliente OpenAI', create_client)
+    stage('workers de gráfico', start_chart_workers)
+    warmup_state['done'] = True
+
+
+def start_warmup(openai_api_key=None) -> bool:
+    """
+    Dispara o pré-aquecimento em segundo plano, uma vez por processo (PREWARM=0 desativa)
+
+    Chamado depois da primeira renderização da página: a interface aparece sem esperar
+    LangChain, o SDK da OpenAI e os workers de gráfico, que ficam prontos até a primeira pergunta.
+
+    Returns:
+        bool: True se o pré-aquecimento foi iniciado nesta chamada
+    """
+    global _warmup_thread
+    if os.getenv("PREWARM", "1") == "0":
+        return False
+    with _lock:
+        if _warmup_thread is not None:
+            return False
+        _warmup_thread = threading.Thread(target=_warm_up, args=(openai_api_key,), name='warmup', daemon=True)
+        _warmup_thread.start()
+        return True
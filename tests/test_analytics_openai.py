@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from analytics_openai import answer_fast_path, build_profile, classify_intent
+from utils_openai import get_sample_questions
+
+
+@pytest.fixture
+def profiles():
+    df = pd.DataFrame({
+        'nome_fornecedor': ['A', 'B', 'A', 'C'],
+        'valor_total': [100.0, 50.0, 25.0, 10.0],
+        'quantidade': [1, 2, 3, 4],
+        'cfop': ['5102', '5102', '6102', '5102'],
+    })
+    return {'cabecalho': build_profile(df)}
+
+
+@pytest.mark.parametrize('question, intent', [
+    ("Qual é o fornecedor que teve maior montante recebido?", 'top_suppliers'),
+    ("Quais são os 5 fornecedores com maior valor total?", 'top_suppliers'),
+    ("Qual é a soma total de todos os valores das notas fiscais?", 'total_value'),
+    ("Quais são as medidas de tendência central (média, mediana)?", 'central'),
+    ("Qual o intervalo de cada variável (mínimo, máximo)?", 'range'),
+    ("Existe correlação entre as variáveis?", 'correlation'),
+    ("Existem valores atípicos nos dados?", 'outliers'),
+])
+def test_sample_questions_use_fast_path(question, intent):
+    assert question in get_sample_questions()
+    assert classify_intent(question) == intent
+
+
+@pytest.mark.parametrize('question', [
+    "Qual o maior fornecedor de parafusos em 2023?",
+    "Quais os 10 maiores fornecedores?",
+    "Qual a média e a mediana de valor_total por fornecedor?",
+    "Qual a correlação entre quantidade e valor só para o CFOP 5102?",
+    "Qual o intervalo de tempo entre emissão e pagamento?",
+])
+def test_qualified_questions_go_to_llm(question, profiles):
+    assert classify_intent(question) is None
+    assert answer_fast_path(question, profiles) is None
+
+
+def test_fast_path_answers_from_profile(profiles):
+    answer, _ = answer_fast_path("Qual é o fornecedor que teve maior montante recebido?", profiles)
+    assert '**A**' in answer
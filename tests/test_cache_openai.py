@@ -0,0 +1,146 @@
+import pandas as pd
+import pytest
+
+import cache_openai
+from cache_openai import ResponseCache, normalize_question
+
+
+class FakeClock:
+    """Relógio controlado pelo teste, no lugar do módulo time do cache"""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+# Embeddings fixos: perguntas parecidas apontam quase na mesma direção
+EMBEDDINGS = {
+    'qual o total por fornecedor': [1.0, 0.0, 0.0],
+    'quanto cada fornecedor vendeu no total': [0.95, 0.31, 0.0],
+    'qual a media de quantidade': [0.0, 1.0, 0.0],
+    'quais colunas tem nulos': [0.5, 0.0, 0.87],
+}
+
+
+def fake_embed(text):
+    return EMBEDDINGS[text]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_openai, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    def make(**kwargs):
+        return ResponseCache(str(tmp_path / 'cache.sqlite3'), **kwargs)
+    return make
+
+
+def test_exact_hit_ignores_accents_case_and_punctuation(clock, make_cache):
+    cache = make_cache()
+    cache.put("Qual é a média de quantidade?", 'dados-1', 'gpt', "42")
+
+    assert cache.get("qual e a media de quantidade", 'dados-1', 'gpt') == ("42", 'exact')
+    assert cache.get("Qual é a média de quantidade?", 'dados-1', 'outro-modelo') is None
+    assert cache.stats == {'exact_hits': 1, 'semantic_hits': 0, 'misses': 1}
+
+
+def test_semantic_hit_respects_threshold(clock, make_cache):
+    cache = make_cache(embed_fn=fake_embed, similarity_threshold=0.9)
+    cache.put("Qual o total por fornecedor?", 'dados-1', 'gpt', "tabela de totais")
+
+    # Similaridade de cosseno ~0,95: acima do limiar
+    assert cache.get("Quanto cada fornecedor vendeu no total?", 'dados-1', 'gpt') == ("tabela de totais", 'semantic')
+    # ~0,5 e 0: abaixo do limiar
+    assert cache.get("Quais colunas têm nulos?", 'dados-1', 'gpt') is None
+    assert cache.get("Qual a média de quantidade?", 'dados-1', 'gpt') is None
+    assert cache.stats == {'exact_hits': 0, 'semantic_hits': 1, 'misses': 2}
+
+
+def test_semantic_tier_is_scoped_to_dataset(clock, make_cache):
+    cache = make_cache(embed_fn=fake_embed, similarity_threshold=0.9)
+    cache.put("Qual o total por fornecedor?", 'dados-1', 'gpt', "tabela de totais")
+
+    assert cache.get("Quanto cada fornecedor vendeu no total?", 'dados-2', 'gpt') is None
+
+
+def test_entries_expire_after_ttl(clock, make_cache):
+    cache = make_cache(ttl_seconds=60)
+    cache.put("Qual a média de quantidade?", 'dados-1', 'gpt', "42")
+
+    clock.now += 59
+    assert cache.get("Qual a média de quantidade?", 'dados-1', 'gpt') == ("42", 'exact')
+    clock.now += 2
+    assert cache.get("Qual a média de quantidade?", 'dados-1', 'gpt') is None
+
+
+def test_least_recently_used_entries_are_trimmed(clock, make_cache):
+    cache = make_cache(max_entries=2)
+    cache.put("pergunta a", 'dados-1', 'gpt', "a")
+    clock.now += 1
+    cache.put("pergunta b", 'dados-1', 'gpt', "b")
+    clock.now += 1
+    # Usar "a" a torna mais recente que "b"
+    assert cache.get("pergunta a", 'dados-1', 'gpt') == ("a", 'exact')
+    clock.now += 1
+    cache.put("pergunta c", 'dados-1', 'gpt', "c")
+
+    assert cache.get("pergunta a", 'dados-1', 'gpt') == ("a", 'exact')
+    assert cache.get("pergunta b", 'dados-1', 'gpt') is None
+    assert cache.get("pergunta c", 'dados-1', 'gpt') == ("c", 'exact')
+
+
+def test_cache_persists_across_instances(clock, make_cache):
+    make_cache().put("Qual a média de quantidade?", 'dados-1', 'gpt', "42")
+
+    assert make_cache().get("qual a media de quantidade", 'dados-1', 'gpt') == ("42", 'exact')
+
+
+def test_normalize_question():
+    assert normalize_question("  Qual  É a MÉDIA?! ") == "qual e a media"
+
+
+class FakeAgent:
+    """Agente falso no lugar do LLM: conta as chamadas e responde sem rede"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def run(self, question, callbacks=None):
+        self.calls += 1
+        return f"resposta {self.calls}"
+
+
+def test_agent_reuses_answer_until_dataset_fingerprint_changes(tmp_path, monkeypatch):
+    monkeypatch.setenv('RESPONSE_CACHE_PATH', str(tmp_path / 'agent_cache.sqlite3'))
+    monkeypatch.setenv('RESPONSE_CACHE_MAX_ENTRIES', '100')
+    monkeypatch.setenv('RESPONSE_CACHE_SEMANTIC_THRESHOLD', '0')
+    monkeypatch.setenv('SQL_ENGINE', '0')
+    main_openai = pytest.importorskip('main_openai')
+
+    agent = main_openai.CSVAnalysisAgent('sk-fake')
+    fake = FakeAgent()
+    monkeypatch.setattr(agent, 'create_general_agent', lambda: fake)
+    df = pd.DataFrame({'fornecedor': ['A', 'B'], 'valor': [1.0, 2.0]})
+    agent.dataframes['itens'] = df
+    agent.file_info['itens'] = {'path': 'itens.csv', 'shape': df.shape, 'columns': list(df.columns),
+                                'fingerprint': {'size': 10, 'hash': 'conteudo-1'}, 'out_of_core': False}
+    question = "Quem é o fornecedor preferido do time de compras?"
+
+    assert agent.query(question) == "resposta 1"
+    assert agent.last_response_source == 'llm'
+    assert agent.query(question) == "resposta 1"
+    assert agent.last_response_source == 'cache_exact'
+    assert fake.calls == 1
+
+    # Mesmo nome de arquivo, conteúdo novo: a resposta anterior não vale mais
+    agent.file_info['itens']['fingerprint'] = {'size': 12, 'hash': 'conteudo-2'}
+    assert agent.query(question) == "resposta 2"
+    assert agent.last_response_source == 'llm'
+    assert fake.calls == 2
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from benchmark_openai import FakeChatHandler, start_fake_chat_server
+from llm_pool_openai import LLMPool
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    """Sobe o servidor falso e devolve o OPENAI_BASE_URL original ao final"""
+    monkeypatch.setenv('OPENAI_BASE_URL', '')
+    servers = []
+
+    def start(**kwargs):
+        server = start_fake_chat_server(**kwargs)
+        FakeChatHandler.requests_seen = FakeChatHandler.peak_active = 0
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def test_identical_concurrent_calls_reach_server_once(fake_server):
+    server = fake_server(latency=0.5)
+    pool = LLMPool(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1")
+    model = pool.chat_model('sk-fake')
+    messages = [HumanMessage("Qual fornecedor tem o maior valor total?")]
+    callers = 5
+    answers = [None] * callers
+    barrier = threading.Barrier(callers)
+
+    def ask(i):
+        barrier.wait()
+        answers[i] = model.invoke(messages).content
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert FakeChatHandler.requests_seen == 1
+    assert pool.get_stats()['coalesced'] == callers - 1
+    assert answers[0] and len(set(answers)) == 1
+
+
+def test_async_batches_on_separate_event_loops_reuse_pool(fake_server):
+    server = fake_server(latency=0.05, keep_alive=True)
+    pool = LLMPool(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1")
+    model = pool.chat_model('sk-fake', max_retries=0)
+
+    async def batch(tag):
+        return await asyncio.gather(*(model.ainvoke(f"{tag} pergunta {i}") for i in range(4)))
+
+    # Cada clique em "Responder em lote" roda num asyncio.run novo, com o mesmo cliente do pool
+    first = asyncio.run(batch('primeiro'))
+    second = asyncio.run(batch('segundo'))
+
+    assert [answer.content for answer in first] == [f"Resposta sintética para: primeiro pergunta {i}"
+                                                   for i in range(4)]
+    assert [answer.content for answer in second] == [f"Resposta sintética para: segundo pergunta {i}"
+                                                    for i in range(4)]
+    assert FakeChatHandler.requests_seen == 8
+    # O pool de conexões do primeiro loop é descartado quando o segundo começa
+    assert len(pool.http_async_client._transport._transports) <= 1
+    assert pool.get_stats()['in_flight'] == 0
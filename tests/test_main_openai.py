@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+import llm_pool_openai
+from benchmark_openai import FakeChatHandler, _load_benchmark_agent, generate_items_csv, start_fake_chat_server
+
+
+@pytest.fixture
+def batch_agent(monkeypatch, tmp_path):
+    """Agente com um CSV pequeno carregado, falando com o servidor falso em vez da OpenAI"""
+    # Sem cache de respostas: todas as perguntas precisam chegar ao modelo
+    monkeypatch.setenv('RESPONSE_CACHE_MAX_ENTRIES', '0')
+    monkeypatch.setenv('OPENAI_API_KEY', 'sk-fake')
+    monkeypatch.setenv('BATCH_RETRY_BASE_SECONDS', '0.01')
+    monkeypatch.setenv('OPENAI_BASE_URL', '')
+    servers = []
+
+    def make(**kwargs):
+        servers.append(start_fake_chat_server(**kwargs))
+        # O pool do processo guarda o endereço do servidor de quando foi criado
+        monkeypatch.setattr(llm_pool_openai, '_pool', None)
+        agent = _load_benchmark_agent(generate_items_csv(str(tmp_path / 'itens.csv'), 200))
+        FakeChatHandler.requests_seen = FakeChatHandler.peak_active = 0
+        return agent
+
+    yield make
+    for server in servers:
+        server.shutdown()
+
+
+# Perguntas que não casam com as respostas locais, para irem todas ao LLM
+QUESTIONS = [f"Pergunta sintética número {i}" for i in range(6)]
+
+
+def test_batch_retries_rate_limits_and_keeps_question_order(batch_agent):
+    agent = batch_agent(latency=0.05, rate_limit_every=3)
+
+    batch = asyncio.run(agent.query_batch(QUESTIONS, concurrency=3, max_retries=5))
+
+    results = batch['results']
+    assert [result['question'] for result in results] == QUESTIONS
+    assert all(result['error'] is None for result in results)
+    assert all(result['answer'].endswith(question) for result, question in zip(results, QUESTIONS))
+    assert sum(result['attempts'] - 1 for result in results) > 0
+
+
+def test_batch_respects_concurrency_cap(batch_agent):
+    agent = batch_agent(latency=0.2)
+
+    batch = asyncio.run(agent.query_batch(QUESTIONS, concurrency=2))
+
+    assert all(result['error'] is None for result in batch['results'])
+    assert FakeChatHandler.requests_seen == len(QUESTIONS)
+    assert 1 < FakeChatHandler.peak_active <= 2
+
+
+def test_batches_back_to_back_with_keep_alive(batch_agent):
+    agent = batch_agent(latency=0.05, keep_alive=True)
+
+    # Cada clique em "Responder em lote" roda num asyncio.run novo
+    first = asyncio.run(agent.query_batch(QUESTIONS[:3], concurrency=3))
+    second = asyncio.run(agent.query_batch(QUESTIONS[3:], concurrency=3))
+
+    for batch in (first, second):
+        assert all(result['error'] is None and result['attempts'] == 1 for result in batch['results'])
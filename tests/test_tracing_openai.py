@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from tracing_openai import Tracer, current_span, traced
+
+
+class Worker:
+    """Objeto mínimo com um tracer, como o CSVAnalysisAgent"""
+
+    def __init__(self):
+        self.tracer = Tracer()
+
+    @traced('stream', 'query', question='question')
+    def stream(self, question):
+        current_span().attributes['started'] = True
+        with self.tracer.span('inner'):
+            pass
+        yield 'a'
+        received = yield 'b'
+        yield received or 'c'
+        return 'fim'
+
+    @traced('answer', 'query')
+    async def answer(self):
+        return current_span().name
+
+    @traced('plain')
+    def plain(self, value):
+        if value is None:
+            raise ValueError("sem valor")
+        return current_span().name
+
+
+def test_generator_span_is_current_only_while_it_runs():
+    worker = Worker()
+
+    with worker.tracer.span('consumer'):
+        events = worker.stream('pergunta')
+        for _ in events:
+            # Quem consome não vê o trecho do gerador entre um item e outro
+            assert current_span().name == 'consumer'
+            with worker.tracer.span('render'):
+                pass
+
+    (root,) = worker.tracer.traces
+    assert [child.name for child in root.children] == ['stream', 'render', 'render', 'render']
+    stream = root.children[0]
+    assert [child.name for child in stream.children] == ['inner']
+    assert stream.attributes == {'question': 'pergunta', 'started': True}
+    assert stream.seconds is not None and stream.error is None
+
+
+def test_generator_send_and_return_value_pass_through():
+    worker = Worker()
+    events = worker.stream('pergunta')
+
+    assert next(events) == 'a'
+    assert next(events) == 'b'
+    assert events.send('enviado') == 'enviado'
+    with pytest.raises(StopIteration) as stop:
+        next(events)
+    assert stop.value.value == 'fim'
+    assert current_span() is None
+    assert [trace.name for trace in worker.tracer.traces] == ['stream']
+
+
+def test_closed_generator_finishes_its_span():
+    worker = Worker()
+    events = worker.stream('pergunta')
+
+    next(events)
+    assert current_span() is None
+    assert not worker.tracer.traces
+    events.close()
+
+    (trace,) = worker.tracer.traces
+    assert trace.seconds is not None
+    assert trace.error.startswith('GeneratorExit')
+
+
+def test_coroutine_and_function_spans():
+    worker = Worker()
+
+    assert asyncio.run(worker.answer()) == 'answer'
+    assert worker.plain(1) == 'plain'
+    with pytest.raises(ValueError):
+        worker.plain(None)
+
+    assert [(trace.name, trace.error) for trace in worker.tracer.traces] == [
+        ('answer', None), ('plain', None), ('plain', 'ValueError: sem valor')]
@@ -0,0 +1,364 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Caracteres guardados da entrada de cada ferramenta (código gerado pelo agente pode ser longo)
+TOOL_INPUT_CHARS = 300
+
+# Trecho em andamento no contexto atual: trechos abertos dentro dele viram filhos
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+def _rss_mb() -> Optional[float]:
+    """Memória residente atual do processo (MB), lida de /proc; None fora do Linux"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Pico de memória residente do processo desde o início (MB)"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Span:
+    """Trecho cronometrado de uma consulta ou carga, com os trechos filhos, chamadas ao LLM e ferramentas"""
+
+    def __init__(self, name: str, kind: str = 'stage', parent: Optional['Span'] = None, **attributes):
+        """
+        Args:
+            name: Nome do trecho (ex.: 'load_csv_data', 'llm')
+            kind: Categoria ('query', 'ingest', 'chart' ou 'stage')
+            parent: Trecho pai, se houver
+            attributes: Metadados livres (arquivo, pergunta, origem da resposta...)
+        """
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.attributes = attributes
+        self.started_at = time.time()
+        self.seconds = None
+        self.error = None
+        self.children = []
+        self.llm_calls = []
+        self.tool_steps = []
+        self._start = time.perf_counter()
+        self._rss_start = _rss_mb()
+        self._peak_start = _peak_rss_mb()
+        self.rss_delta_mb = None
+        self.peak_rss_mb = None
+        self.peak_growth_mb = None
+        # Callbacks do LangChain chegam de outras threads
+        self._lock = threading.Lock()
+
+    def finish(self, error: Optional[str] = None) -> None:
+        """Fecha o trecho registrando tempo de parede e memória"""
+        self.seconds = time.perf_counter() - self._start
+        self.error = error
+        rss, peak = _rss_mb(), _peak_rss_mb()
+        if rss is not None and self._rss_start is not None:
+            self.rss_delta_mb = rss - self._rss_start
+        if peak is not None:
+            self.peak_rss_mb = peak
+            # Só é positivo quando o trecho levou o processo a um pico novo
+            self.peak_growth_mb = peak - self._peak_start
+
+    def add_llm_call(self, call: dict) -> None:
+        with self._lock:
+            self.llm_calls.append(call)
+
+    def add_tool_step(self, step: dict) -> None:
+        with self._lock:
+            self.tool_steps.append(step)
+
+    def totals(self) -> dict:
+        """Chamadas ao LLM, tokens e passos de ferramenta do trecho e de todos os filhos"""
+        totals = {'llm_calls': len(self.llm_calls), 'llm_seconds': sum(call['seconds'] for call in self.llm_calls),
+                  'prompt_tokens': sum(call.get('prompt_tokens') or 0 for call in self.llm_calls),
+                  'completion_tokens': sum(call.get('completion_tokens') or 0 for call in self.llm_calls),
+                  'tool_steps': len(self.tool_steps)}
+        for child in self.children:
+            for key, value in child.totals().items():
+                totals[key] += value
+        return totals
+
+    def to_dict(self) -> dict:
+        """Trecho e filhos como dict serializável em JSON"""
+        def rounded(value):
+            return None if value is None else round(value, 4)
+
+        return {
+            'id': self.id,
+            'parent_id': self.parent.id if self.parent is not None else None,
+            'name': self.name,
+            'kind': self.kind,
+            'started_at': self.started_at,
+            'seconds': rounded(self.seconds),
+            'rss_delta_mb': rounded(self.rss_delta_mb),
+            'peak_rss_mb': rounded(self.peak_rss_mb),
+            'peak_growth_mb': rounded(self.peak_growth_mb),
+            'error': self.error,
+            'attributes': {key: value if isinstance(value, (int, float, bool, type(None))) else str(value)
+                           for key, value in self.attributes.items()},
+            'totals': self.totals(),
+            'llm_calls': list(self.llm_calls),
+            'tool_steps': list(self.tool_steps),
+            'children': [child.to_dict() for child in self.children],
+        }
+
+
+def current_span() -> Optional[Span]:
+    """Trecho em andamento no contexto atual (None fora de qualquer trecho)"""
+    return _current_span.get()
+
+
+def traced(name: str, kind: str = 'stage', **attributes):
+    """
+    Decorador de método: executa o método inteiro dentro de self.tracer.span(name, kind)
+
+    Para trechos que cobrem o método todo, sem reindentar o corpo; etapas internas continuam
+    com `with self.tracer.span(...)`. Aceita métodos comuns, geradores e corrotinas. Dentro do
+    método, current_span() devolve o trecho para acrescentar atributos. Em geradores, o trecho
+    fica aberto até o fim da iteração ou até close(), mas só é o atual enquanto o gerador executa.
+
+    Args:
+        name: Nome do trecho
+        kind: Categoria ('query', 'ingest', 'chart' ou 'stage')
+        attributes: Atributo -> nome do parâmetro do método, ou função que recebe o dict
+            de argumentos (ex.: file=lambda args: os.path.basename(args['file_path']))
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        def open_span(self, args, kwargs):
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            values = {key: source(bound.arguments) if callable(source) else bound.arguments[source]
+                      for key, source in attributes.items()}
+            return self.tracer.span(name, kind, **values)
+
+        if inspect.iscoroutinefunction(method):
+            async def wrapper(self, *args, **kwargs):
+                with open_span(self, args, kwargs):
+                    return await method(self, *args, **kwargs)
+        elif inspect.isgeneratorfunction(method):
+            def wrapper(self, *args, **kwargs):
+                def body():
+                    with open_span(self, args, kwargs):
+                        return (yield from method(self, *args, **kwargs))
+
+                # O gerador roda num contexto próprio: o trecho só é o atual enquanto ele executa,
+                # e os trechos que quem consome abre entre um item e outro não viram filhos dele
+                context = contextvars.copy_context()
+                generator = body()
+                try:
+                    item = context.run(next, generator)
+                    while True:
+                        try:
+                            sent = yield item
+                        except GeneratorExit:
+                            context.run(generator.close)
+                            raise
+                        except BaseException as e:
+                            item = context.run(generator.throw, e)
+                        else:
+                            item = context.run(generator.send, sent)
+                except StopIteration as stop:
+                    return stop.value
+        else:
+            def wrapper(self, *args, **kwargs):
+                with open_span(self, args, kwargs):
+                    return method(self, *args, **kwargs)
+        return functools.wraps(method)(wrapper)
+    return decorator
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Registra no trecho as chamadas ao LLM (tempo e tokens) e os passos de ferramenta do agente"""
+
+    def __init__(self, span: Span):
+        self.span = span
+        self._started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        seconds = time.perf_counter() - self._started.pop(run_id, time.perf_counter())
+        prompt_tokens, completion_tokens = _token_usage(response)
+        self.span.add_llm_call({
+            'model': _model_name(response),
+            'seconds': round(seconds, 4),
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+        })
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        seconds = time.perf_counter() - self._started.pop(run_id, time.perf_counter())
+        self.span.add_llm_call({'model': None, 'seconds': round(seconds, 4), 'prompt_tokens': None,
+                                'completion_tokens': None, 'error': str(error)})
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = (serialized or {}).get('name') or kwargs.get('name') or 'ferramenta'
+        self._started[run_id] = (time.perf_counter(), name, str(input_str)[:TOOL_INPUT_CHARS])
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._finish_tool(run_id, None)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish_tool(run_id, str(error))
+
+    def _finish_tool(self, run_id, error: Optional[str]) -> None:
+        start, name, tool_input = self._started.pop(run_id, (time.perf_counter(), 'ferramenta', ''))
+        step = {'tool': name, 'input': tool_input, 'seconds': round(time.perf_counter() - start, 4)}
+        if error:
+            step['error'] = error
+        self.span.add_tool_step(step)
+
+
+def _token_usage(response) -> tuple:
+    """Tokens de prompt e de resposta de um LLMResult (None quando a API não informa)"""
+    usage = (response.llm_output or {}).get('token_usage') or {}
+    if usage:
+        return usage.get('prompt_tokens'), usage.get('completion_tokens')
+    # Com streaming, o uso chega na mensagem agregada (usage_metadata)
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+            if metadata:
+                return metadata.get('input_tokens'), metadata.get('output_tokens')
+    return None, None
+
+
+def _model_name(response) -> Optional[str]:
+    """Modelo que respondeu, do llm_output ou, com streaming, dos metadados da mensagem"""
+    model = (response.llm_output or {}).get('model_name')
+    if model:
+        return model
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, 'message', None), 'response_metadata', None) or {}
+            if metadata.get('model_name'):
+                return metadata['model_name']
+    return None
+
+
+class Tracer:
+    """Coleta os trechos das consultas e cargas de uma sessão e os exporta em JSONL"""
+
+    def __init__(self, enabled: bool = True, max_traces: int = 200, export_path: Optional[str] = None):
+        """
+        Args:
+            enabled: Desligado, os trechos continuam funcionando mas não são guardados
+            max_traces: Traços (trechos raiz) mantidos em memória para o painel
+            export_path: Arquivo JSONL onde cada traço concluído é acrescentado (None desativa)
+        """
+        self.enabled = enabled
+        self.export_path = export_path
+        self.traces = deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'Tracer':
+        """Cria o coletor a partir de TRACING, TRACE_MAX_TRACES e TRACE_EXPORT_PATH"""
+        return cls(
+            enabled=os.getenv("TRACING", "1") != "0",
+            max_traces=int(os.getenv("TRACE_MAX_TRACES", "200")),
+            export_path=os.getenv("TRACE_EXPORT_PATH") or None
+        )
+
+    @contextmanager
+    def span(self, name: str, kind: str = 'stage', **attributes):
+        """
+        Abre um trecho filho do trecho em andamento (ou um traço novo, se não houver)
+
+        Args:
+            name: Nome do trecho
+            kind: Categoria ('query', 'ingest', 'chart' ou 'stage')
+            attributes: Metadados livres
+
+        Yields:
+            Span: O trecho, para acrescentar atributos ou ligar um TracingCallbackHandler
+        """
+        parent = _current_span.get()
+        span = Span(name, kind, parent, **attributes)
+        if parent is not None:
+            with parent._lock:
+                parent.children.append(span)
+        token = _current_span.set(span)
+        error = None
+        try:
+            yield span
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.finish(error)
+            _current_span.reset(token)
+            if parent is None:
+                self._record(span)
+
+    def callback(self, span: Span) -> TracingCallbackHandler:
+        """Callback do LangChain que registra LLM e ferramentas no trecho"""
+        return TracingCallbackHandler(span)
+
+    def _record(self, span: Span) -> None:
+        """Guarda um traço concluído e o acrescenta ao arquivo de exportação"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.traces.append(span)
+            if self.export_path:
+                try:
+                    with open(self.export_path, 'a', encoding='utf-8') as export:
+                        export.write(json.dumps(span.to_dict(), ensure_ascii=False) + '\n')
+                except OSError as e:
+                    print(f"Erro ao exportar traço: {str(e)}")
+
+    def recent(self, n: int = 20, kind: Optional[str] = None) -> list:
+        """Traços mais recentes primeiro, opcionalmente só de uma categoria"""
+        with self._lock:
+            traces = list(self.traces)
+        return [span for span in reversed(traces) if kind is None or span.kind == kind][:n]
+
+    def to_jsonl(self) -> str:
+        """Todos os traços guardados, um JSON por linha"""
+        with self._lock:
+            traces = list(self.traces)
+        return ''.join(json.dumps(span.to_dict(), ensure_ascii=False) + '\n' for span in traces)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.traces.clear()
+
+
+def flatten_spans(span: Span, depth: int = 0) -> list:
+    """Linhas (profundidade, trecho) do traço em pré-ordem, para exibir a árvore como tabela"""
+    rows = [(depth, span)]
+    for child in span.children:
+        rows.extend(flatten_spans(child, depth + 1))
+    return rows
@@ -1,9 +1,51 @@
 import pandas as pd
+import numpy as np
+import io
 import os
+import contextlib
+import codecs
+import csv
+import gzip
+import hashlib
+import shutil
 import tempfile
+import threading
+import time
+import weakref
 import zipfile
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
 import streamlit as st
-from typing import Union, Optional
+from typing import Union, Optional, Callable, IO, Iterator
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except ImportError:
+    pa = None
+
+# Colunas de baixa cardinalidade que são convertidas para 'category' na ingestão
+CATEGORY_COLUMNS = ['situacao', 'unidade', 'cfop']
+
+# Extensões de membros de ZIP tratados como CSV
+ZIP_CSV_SUFFIXES = ('.csv', '.csv.gz')
+
+# Quantidade de bytes lidos do início do arquivo para detectar formato e tipo
+SNIFF_SAMPLE_BYTES = 64 * 1024
+
+# Delimitadores aceitos na detecção automática
+SNIFF_DELIMITERS = ',;|\t'
+
+# Abaixo deste volume total a ingestão paralela usa threads, pois iniciar processos não compensa
+PROCESS_INGEST_MIN_BYTES = 32 * 1024 ** 2
+
+# Prefixo dos arquivos/diretórios temporários criados pela aplicação
+TEMP_PREFIX = "csvagent_"
+
+# Versão do formato do cache colunar; incrementar quando a ingestão mudar os tipos gerados
+COLUMNAR_CACHE_VERSION = 2
 
 class CsvValidator:
     """Classe para validar e identificar tipos de arquivos de notas fiscais"""
@@ -22,49 +64,116 @@ class CsvValidator:
             'quantidade', 'unidade', 'valor_unitario', 'valor_total',
             'ncm', 'cfop'
         ]
-    
-    def identify_file_type(self, file_path: str) -> str:
+
+        # Índice de palavras-chave: cada trecho de uma palavra-chave aponta para as palavras que o
+        # contêm, então uma coluna que aparece dentro de uma palavra-chave é resolvida numa consulta
+        self._header_index = self._build_keyword_index(self.header_columns)
+        self._item_index = self._build_keyword_index(self.item_columns)
+
+        # Resultado do sniffing por (caminho, tamanho, mtime)
+        self._sniff_cache = {}
+
+    @staticmethod
+    def _build_keyword_index(keywords: list) -> dict:
+        """Mapeia cada substring das palavras-chave para o conjunto de palavras-chave que a contêm"""
+        index = {}
+        for keyword in keywords:
+            for start in range(len(keyword) + 1):
+                for end in range(start, len(keyword) + 1):
+                    index.setdefault(keyword[start:end], set()).add(keyword)
+        return index
+
+    @staticmethod
+    def _count_keywords(index: dict, columns: list) -> int:
+        """Conta quantas palavras-chave distintas contêm alguma das colunas"""
+        return len(set().union(*(index.get(column, ()) for column in columns)))
+
+    def sniff(self, file_path: Union[str, IO[bytes]], sample_bytes: int = SNIFF_SAMPLE_BYTES) -> dict:
         """
-        Identifica se o arquivo é de cabeçalho ou itens de nota fiscal
-        
+        Lê apenas o início do arquivo e detecta codificação, delimitador e cabeçalho
+
+        Para caminhos, o resultado fica em cache enquanto o arquivo não mudar, de
+        modo que identificação, validação e informações de colunas compartilham
+        uma única leitura.
+
         Args:
-            file_path: Caminho para o arquivo CSV
-            
+            file_path: Caminho para o arquivo CSV ou stream binário já aberto
+            sample_bytes: Quantidade de bytes lidos do início do arquivo
+
         Returns:
-            str: 'cabecalho', 'itens' ou 'unknown'
+            dict: 'encoding', 'delimiter', 'columns', 'rows' (linhas de amostra),
+                'sample_text' (amostra decodificada até a última linha completa) e 'empty'
         """
-        try:
-            # Carrega apenas as primeiras linhas para análise
-            df = pd.read_csv(file_path, nrows=5)
+        cache_key = None
+        if isinstance(file_path, (str, os.PathLike)):
+            stat = os.stat(file_path)
+            cache_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+            if cache_key in self._sniff_cache:
+                return self._sniff_cache[cache_key]
+            with open(file_path, 'rb') as fh:
+                sample = fh.read(sample_bytes)
+        else:
+            sample = file_path.read(sample_bytes)
+
+        result = sniff_csv_sample(sample, complete=len(sample) < sample_bytes)
+        if cache_key is not None:
+            self._sniff_cache[cache_key] = result
+        return result
 
-            columns = [col.lower().replace(' ', '_') for col in df.columns]
+    def classify(self, sniffed: dict, file_name: str) -> str:
+        """
+        Classifica o arquivo a partir do resultado do sniffing e do nome
 
-            # Verifica se é arquivo de cabeçalho
-            header_match = sum(1 for col in self.header_columns if any(hcol in col for hcol in columns))
+        Args:
+            sniffed: Resultado de sniff()
+            file_name: Nome (ou caminho) do arquivo
 
-            # Verifica se é arquivo de itens
-            item_match = sum(1 for col in self.item_columns if any(icol in col for icol in columns))
-            
-            # Verifica pelo nome do arquivo também
-            filename = os.path.basename(file_path).lower()
+        Returns:
+            str: 'cabecalho', 'itens', 'csv' ou 'unknown'
+        """
+        columns = [col.lower().replace(' ', '_') for col in sniffed['columns']]
+
+        # Verifica se é arquivo de cabeçalho
+        header_match = self._count_keywords(self._header_index, columns)
+
+        # Verifica se é arquivo de itens
+        item_match = self._count_keywords(self._item_index, columns)
+        
+        # Verifica pelo nome do arquivo também
+        filename = os.path.basename(file_name).lower()
 
-            if 'cabecalho' in filename or 'header' in filename or header_match >= 3:
+        if 'cabecalho' in filename or 'header' in filename or header_match >= 3:
+            return 'cabecalho'
+        elif 'item' in filename or 'itens' in filename or item_match >= 3:
+            return 'itens'
+        else:
+            # Análise adicional baseada no conteúdo
+            if 'numero' in columns and 'serie' in columns:
                 return 'cabecalho'
-            elif 'item' in filename or 'itens' in filename or item_match >= 3:
+            elif 'quantidade' in columns and 'valor_unitario' in columns:
                 return 'itens'
+            elif columns.__len__() > 0:
+                return 'csv'
             else:
-                # Análise adicional baseada no conteúdo
-                if 'numero' in columns and 'serie' in columns:
-                    return 'cabecalho'
-                elif 'quantidade' in columns and 'valor_unitario' in columns:
-                    return 'itens'
-                elif columns.__len__() > 0:
-                    return 'csv'
-                else:
-                    return 'unknown'
+                return 'unknown'
+    
+    def identify_file_type(self, file_path: Union[str, IO[bytes]], file_name: Optional[str] = None) -> str:
+        """
+        Identifica se o arquivo é de cabeçalho ou itens de nota fiscal
+        
+        Args:
+            file_path: Caminho para o arquivo CSV ou stream binário já aberto
+            file_name: Nome do arquivo, quando file_path é um stream
+            
+        Returns:
+            str: 'cabecalho', 'itens' ou 'unknown'
+        """
+        try:
+            # Lê apenas os primeiros KB do arquivo
+            return self.classify(self.sniff(file_path), file_name or file_path)
                     
         except Exception as e:
-            st.error(f"Erro ao analisar arquivo {file_path}: {str(e)}")
+            st.error(f"Erro ao analisar arquivo {file_name or file_path}: {str(e)}")
             return 'unknown'
     
     def validate_csv_structure(self, file_path: str, file_type: str) -> bool:
@@ -79,11 +188,14 @@ class CsvValidator:
             bool: True se válido, False caso contrário
         """
         try:
-            df = pd.read_csv(file_path)
+            sniffed = self.sniff(file_path)
             
-            if df.empty:
+            if sniffed['empty']:
                 st.error(f"Arquivo {file_path} está vazio")
                 return False
+
+            # As validações de tipo usam as linhas de amostra já lidas no sniffing
+            df = pd.DataFrame(sniffed['rows'], columns=sniffed['columns'])
             
             # Validações específicas por tipo
             if file_type == 'cabecalho':
@@ -99,33 +211,24 @@ class CsvValidator:
         
     def _validate_header_structure(self, df: pd.DataFrame) -> bool:
         """Valida estrutura específica do cabeçalho"""
-        required_numeric_cols = ['valor_total', 'valor_liquido']
-        
-        for col in df.columns:
-            col_lower = col.lower().replace(' ', '_')
-            if any(req_col in col_lower for req_col in required_numeric_cols):
-                if not pd.api.types.is_numeric_dtype(df[col]):
-                    try:
-                        # Tenta converter strings com vírgula para float
-                        df[col] = df[col].astype(str).str.replace(',', '.').astype(float)
-                    except:
-                        st.warning(f"Coluna {col} deveria ser numérica")
-        
-        return True
+        return self._coerce_numeric_columns(df, ['valor_total', 'valor_liquido'])
     
     def _validate_items_structure(self, df: pd.DataFrame) -> bool:
         """Valida estrutura específica dos itens"""
-        required_numeric_cols = ['quantidade', 'valor_unitario', 'valor_total']
-        
+        return self._coerce_numeric_columns(df, ['quantidade', 'valor_unitario', 'valor_total'])
+
+    def _coerce_numeric_columns(self, df: pd.DataFrame, required_numeric_cols: list) -> bool:
+        """Converte para float as colunas que deveriam ser numéricas, avisando quando não for possível"""
         for col in df.columns:
             col_lower = col.lower().replace(' ', '_')
             if any(req_col in col_lower for req_col in required_numeric_cols):
                 if not pd.api.types.is_numeric_dtype(df[col]):
-                    try:
-                        # Tenta converter strings com vírgula para float
-                        df[col] = df[col].astype(str).str.replace(',', '.').astype(float)
-                    except:
+                    # Converte strings no formato brasileiro (vírgula decimal) para float
+                    converted = parse_currency_series(df[col])
+                    if (converted.isna() & df[col].notna()).any():
                         st.warning(f"Coluna {col} deveria ser numérica")
+                    else:
+                        df[col] = converted
         
         return True
     
@@ -140,7 +243,9 @@ class CsvValidator:
             dict: Informações sobre as colunas
         """
         try:
-            df = pd.read_csv(file_path, nrows=100)  # Amostra para análise
+            # Amostra para análise, a partir do texto já lido no sniffing
+            sniffed = self.sniff(file_path)
+            df = pd.read_csv(io.StringIO(sniffed['sample_text']), sep=sniffed['delimiter'], nrows=100)
             
             info = {
                 'total_columns': len(df.columns),
@@ -164,48 +269,906 @@ class CsvValidator:
             st.error(f"Erro ao analisar colunas do arquivo {file_path}: {str(e)}")
             return {}
 
-def extract_zip_file(uploaded_file) -> Optional[str]:
+def sniff_csv_sample(sample: bytes, complete: bool = False) -> dict:
     """
-    Extrai arquivo ZIP para diretório temporário
-    
+    Detecta codificação, delimitador e cabeçalho a partir dos primeiros bytes de um CSV
+
     Args:
-        uploaded_file: Arquivo ZIP carregado via Streamlit
-        
+        sample: Bytes do início do arquivo
+        complete: True se a amostra contém o arquivo inteiro
+
     Returns:
-        str: Caminho do diretório temporário ou None em caso de erro
+        dict: 'encoding', 'delimiter', 'columns', 'rows', 'sample_text' e 'empty'
     """
+    # UTF-8 (com ou sem BOM) é tentado primeiro; exportações de NF costumam vir em latin-1
+    if sample.startswith(codecs.BOM_UTF8):
+        encoding = 'utf-8-sig'
+    else:
+        encoding = 'utf-8'
     try:
-        # Cria diretório temporário
-        temp_dir = tempfile.mkdtemp()
-        
-        # Salva o arquivo ZIP temporariamente
-        zip_path = os.path.join(temp_dir, "uploaded.zip")
-        with open(zip_path, "wb") as f:
-            f.write(uploaded_file.getvalue())
-        
-        # Extrai o arquivo ZIP
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(temp_dir)
-        
-        # Remove o arquivo ZIP
-        os.remove(zip_path)
-        
-        # Verifica se há arquivos CSV
-        csv_files = [f for f in os.listdir(temp_dir) if f.endswith('.csv')]
-        
-        if not csv_files:
+        # Decodificador incremental tolera um caractere multibyte cortado no fim da amostra
+        text = codecs.getincrementaldecoder(encoding)().decode(sample, final=complete)
+    except UnicodeDecodeError:
+        encoding = 'latin-1'
+        text = sample.decode(encoding)
+
+    # Descarta a última linha se ela pode estar incompleta
+    if not complete and '\n' in text:
+        text = text[:text.rfind('\n') + 1]
+
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return {'encoding': encoding, 'delimiter': ',', 'columns': [], 'rows': [],
+                'sample_text': text, 'empty': True}
+
+    try:
+        delimiter = csv.Sniffer().sniff('\n'.join(lines[:20]), delimiters=SNIFF_DELIMITERS).delimiter
+    except csv.Error:
+        delimiter = ','
+
+    parsed = list(csv.reader(lines, delimiter=delimiter))
+    columns = [col.strip() for col in parsed[0]]
+    rows = [row for row in parsed[1:] if len(row) == len(columns)]
+
+    return {
+        'encoding': encoding,
+        'delimiter': delimiter,
+        'columns': columns,
+        'rows': rows,
+        'sample_text': text,
+        'empty': len(parsed) < 2
+    }
+
+def open_zip_upload(data: bytes) -> Optional[tuple]:
+    """
+    Abre um ZIP enviado diretamente da memória, sem gravá-lo em disco
+
+    Args:
+        data: Bytes do arquivo ZIP carregado via Streamlit
+
+    Returns:
+        tuple: (ZipFile aberto, lista de ZipInfo dos CSVs) ou None em caso de erro
+    """
+    try:
+        zip_ref = zipfile.ZipFile(io.BytesIO(data), 'r')
+
+        # Procura CSVs (inclusive .csv.gz) em qualquer subdiretório
+        csv_members = list_zip_csv_members(zip_ref)
+
+        if not csv_members:
+            zip_ref.close()
             st.error("Nenhum arquivo CSV encontrado no ZIP")
             return None
-        
-        st.success(f"Encontrados {len(csv_files)} arquivo(s) CSV: {', '.join(csv_files)}")
-        return temp_dir
-        
+
+        st.success(f"Encontrados {len(csv_members)} arquivo(s) CSV: "
+                   f"{', '.join(info.filename for info in csv_members)}")
+        return zip_ref, csv_members
+
     except zipfile.BadZipFile:
         st.error("Arquivo ZIP inválido ou corrompido")
         return None
     except Exception as e:
-        st.error(f"Erro ao extrair arquivo ZIP: {str(e)}")
+        st.error(f"Erro ao abrir arquivo ZIP: {str(e)}")
+        return None
+
+def list_zip_csv_members(zip_ref: zipfile.ZipFile) -> list:
+    """
+    Lista os membros CSV de um ZIP, incluindo subdiretórios e arquivos .csv.gz
+
+    Args:
+        zip_ref: ZIP aberto
+
+    Returns:
+        list: ZipInfo dos membros CSV, ignorando metadados do macOS
+    """
+    members = []
+    for info in zip_ref.infolist():
+        name = info.filename
+        if info.is_dir() or '__MACOSX/' in name or os.path.basename(name).startswith('.'):
+            continue
+        if name.lower().endswith(ZIP_CSV_SUFFIXES):
+            members.append(info)
+    return members
+
+def open_zip_member(zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo) -> IO[bytes]:
+    """
+    Abre um membro do ZIP como stream, descomprimindo .csv.gz em tempo de leitura
+
+    Args:
+        zip_ref: ZIP aberto
+        info: Membro a ser aberto
+
+    Returns:
+        IO[bytes]: Stream binário com o conteúdo CSV
+    """
+    stream = zip_ref.open(info)
+    if info.filename.lower().endswith('.gz'):
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    return stream
+
+def extract_zip_member(zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo) -> str:
+    """
+    Extrai um membro do ZIP (descomprimindo .csv.gz) para um arquivo temporário, em streaming
+
+    Usado quando o CSV precisa existir em disco, como no motor SQL fora de memória.
+
+    Args:
+        zip_ref: ZIP aberto
+        info: Membro a ser extraído
+
+    Returns:
+        str: Caminho do arquivo temporário (prefixo TEMP_PREFIX)
+    """
+    name = os.path.basename(info.filename)
+    if name.lower().endswith('.gz'):
+        name = name[:-3]
+    with open_zip_member(zip_ref, info) as stream, \
+            tempfile.NamedTemporaryFile(delete=False, prefix=TEMP_PREFIX, suffix=f"_{name}") as tmp_file:
+        shutil.copyfileobj(stream, tmp_file, 1024 * 1024)
+        return tmp_file.name
+
+def zip_member_fingerprint(zip_hash: str, info: zipfile.ZipInfo) -> dict:
+    """
+    Impressão digital de um membro do ZIP sem relê-lo
+
+    O hash combina o hash do ZIP inteiro com o nome e o CRC do membro.
+
+    Args:
+        zip_hash: Hash do conteúdo do ZIP (content_hash)
+        info: Membro do ZIP
+
+    Returns:
+        dict: Chaves 'size', 'mtime' e 'hash', como em file_fingerprint
+    """
+    return {
+        'size': info.file_size,
+        'mtime': None,
+        'hash': content_hash(f"{zip_hash}:{info.filename}:{info.CRC}".encode())
+    }
+
+def file_fingerprint(file_path: str, block_size: int = 1024 * 1024) -> dict:
+    """
+    Calcula a impressão digital de um arquivo (tamanho, mtime e hash do conteúdo)
+
+    Args:
+        file_path: Caminho para o arquivo
+        block_size: Tamanho dos blocos lidos para o hash
+
+    Returns:
+        dict: Chaves 'size', 'mtime' e 'hash'
+    """
+    stat = os.stat(file_path)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as fh:
+        for block in iter(lambda: fh.read(block_size), b""):
+            digest.update(block)
+
+    return {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'hash': digest.hexdigest()
+    }
+
+def optimize_dtypes(df: pd.DataFrame, category_columns: Optional[list] = None) -> pd.DataFrame:
+    """
+    Reduz o uso de memória do DataFrame convertendo tipos quando é seguro
+
+    Inteiros são reduzidos para int32 quando cabem na faixa, floats para
+    float32 apenas quando todos os valores sobrevivem à conversão sem perda,
+    e as colunas categóricas conhecidas viram 'category'.
+
+    Args:
+        df: DataFrame a ser otimizado (alterado no próprio objeto)
+        category_columns: Nomes de colunas a converter para 'category'
+
+    Returns:
+        pd.DataFrame: O mesmo DataFrame com tipos reduzidos
+    """
+    if category_columns is None:
+        category_columns = CATEGORY_COLUMNS
+
+    for col in df.columns:
+        series = df[col]
+        col_lower = str(col).lower().strip().replace(' ', '_')
+
+        if col_lower in category_columns:
+            df[col] = series.astype('category')
+        elif pd.api.types.is_integer_dtype(series) and series.dtype.itemsize > 4:
+            if series.empty or (series.min() >= np.iinfo(np.int32).min and series.max() <= np.iinfo(np.int32).max):
+                df[col] = series.astype(np.int32)
+        elif pd.api.types.is_float_dtype(series) and series.dtype.itemsize > 4:
+            values = series.to_numpy()
+            downcast = values.astype(np.float32)
+            # Só reduz se a conversão de ida e volta for exata (NaN conta como igual)
+            if np.array_equal(downcast.astype(np.float64), values, equal_nan=True):
+                df[col] = downcast
+
+    return df
+
+def iter_csv_chunks(source: Union[str, IO[bytes]], chunk_size: int = 50000,
+                    progress_callback: Optional[Callable[[float], None]] = None,
+                    encoding: str = "utf-8", total_bytes: Optional[int] = None,
+                    **read_kwargs) -> Iterator[pd.DataFrame]:
+    """
+    Percorre um CSV em chunks, sem materializar o arquivo inteiro
+
+    Args:
+        source: Caminho para o arquivo CSV ou stream binário já aberto
+        chunk_size: Quantidade de linhas por chunk
+        progress_callback: Função chamada com a fração lida do arquivo (0 a 1)
+        encoding: Codificação do arquivo
+        total_bytes: Tamanho descomprimido do conteúdo, usado no progresso de streams
+        **read_kwargs: Argumentos extras repassados para pd.read_csv
+
+    Yields:
+        pd.DataFrame: Cada chunk lido, com os tipos inferidos pelo pandas
+    """
+    if isinstance(source, (str, os.PathLike)):
+        total_bytes = total_bytes or os.path.getsize(source)
+        opened = open(source, "rb")
+    else:
+        opened = contextlib.nullcontext(source)
+
+    with opened as fh:
+        for chunk in pd.read_csv(fh, encoding=encoding, chunksize=chunk_size, **read_kwargs):
+            yield chunk
+            if progress_callback is not None and total_bytes:
+                progress_callback(min(fh.tell() / total_bytes, 1.0))
+
+def _rewind(source: Union[str, IO[bytes]]) -> bool:
+    """Volta ao início para reler a fonte; False se ela for um stream que não permite seek"""
+    if isinstance(source, (str, os.PathLike)):
+        return True
+    if not source.seekable():
+        return False
+    source.seek(0)
+    return True
+
+def read_csv_chunked(source: Union[str, IO[bytes]], chunk_size: int = 50000,
+                     progress_callback: Optional[Callable[[float], None]] = None,
+                     encoding: str = "utf-8", total_bytes: Optional[int] = None,
+                     chunk_callback: Optional[Callable[[pd.DataFrame], None]] = None,
+                     **read_kwargs) -> pd.DataFrame:
+    """
+    Lê um CSV em chunks e materializa o DataFrame uma única vez
+
+    Os chunks são acumulados em lista e concatenados ao final, evitando a
+    cópia do DataFrame acumulado a cada chunk (custo quadrático). A codificação
+    vem do sniffing dos primeiros 64KB: se um byte inválido em UTF-8 aparecer
+    depois disso, o arquivo é relido em latin-1.
+
+    Args:
+        source: Caminho para o arquivo CSV ou stream binário já aberto
+        chunk_size: Quantidade de linhas por chunk
+        progress_callback: Função chamada com a fração lida do arquivo (0 a 1)
+        encoding: Codificação do arquivo
+        total_bytes: Tamanho descomprimido do conteúdo, usado no progresso de streams
+        chunk_callback: Função chamada com cada chunk lido (ex.: atualização de sketches),
+            depois que a leitura termina sem erro de codificação
+        **read_kwargs: Argumentos extras repassados para pd.read_csv
+
+    Returns:
+        pd.DataFrame: DataFrame completo com tipos otimizados
+    """
+    try:
+        chunks = list(iter_csv_chunks(source, chunk_size, progress_callback, encoding, total_bytes, **read_kwargs))
+    except UnicodeDecodeError:
+        if not encoding.lower().startswith('utf') or not _rewind(source):
+            raise
+        chunks = list(iter_csv_chunks(source, chunk_size, progress_callback, 'latin-1', total_bytes, **read_kwargs))
+
+    if chunk_callback is not None:
+        for chunk in chunks:
+            chunk_callback(chunk)
+
+    if not chunks:
+        return pd.DataFrame()
+
+    df = chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
+    del chunks
+
+    if progress_callback is not None:
+        progress_callback(1.0)
+
+    return optimize_dtypes(df)
+
+def appended_tail_offset(file_path: str, previous: dict, block_size: int = 1024 * 1024) -> Optional[int]:
+    """
+    Verifica se o arquivo é o arquivo anterior com linhas novas no final
+
+    O início do arquivo (até o tamanho anterior) precisa ter exatamente o hash anterior,
+    e o corte precisa cair numa quebra de linha.
+
+    Args:
+        file_path: Caminho do arquivo novo
+        previous: Impressão digital do arquivo anterior ('size' e 'hash' do conteúdo)
+        block_size: Tamanho dos blocos lidos para o hash
+
+    Returns:
+        int: Posição (bytes) onde começam as linhas novas ou None se não for uma extensão
+    """
+    prefix_size = previous.get('size') or 0
+    if prefix_size <= 0 or os.path.getsize(file_path) <= prefix_size:
+        return None
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as fh:
+        remaining = prefix_size
+        last = b""
+        while remaining > 0:
+            block = fh.read(min(block_size, remaining))
+            if not block:
+                return None
+            digest.update(block)
+            last = block[-1:]
+            remaining -= len(block)
+        following = fh.read(1)
+
+    # Sem quebra de linha no fim do arquivo anterior, a última linha dele teria sido alterada
+    if digest.hexdigest() != previous.get('hash') or (last != b"\n" and following not in (b"\n", b"\r")):
         return None
+    return prefix_size
+
+
+def _cast_like(raw: pd.Series, dtype) -> pd.Series:
+    """
+    Converte valores lidos como texto para o tipo de uma coluna já carregada, com o resultado que a
+    leitura do arquivo inteiro (read_csv + optimize_dtypes) daria
+
+    Só são aceitas as ampliações que essa leitura também faria (int32 -> int64 quando o valor não
+    cabe, float32 -> float64 quando a conversão perderia precisão).
+
+    Raises:
+        ValueError: Se os valores novos mudariam o tipo da coluna (ex.: texto numa coluna numérica,
+            vazio numa coluna inteira)
+    """
+    if isinstance(dtype, pd.CategoricalDtype):
+        categories = dtype.categories.dtype
+        if pd.api.types.is_string_dtype(categories) or pd.api.types.is_object_dtype(categories):
+            return raw
+        return _cast_like(raw, categories)
+    if pd.api.types.is_bool_dtype(dtype):
+        values = raw.str.lower().map({'true': True, 'false': False})
+        if values.isna().any():
+            raise ValueError("valores não booleanos numa coluna booleana")
+        return values.astype(bool)
+    if pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_float_dtype(dtype):
+        values = pd.to_numeric(raw)
+        if pd.api.types.is_integer_dtype(dtype):
+            if not pd.api.types.is_integer_dtype(values):
+                raise ValueError("valores não inteiros ou vazios numa coluna inteira")
+            limits = np.iinfo(dtype)
+            if values.empty or (values.min() >= limits.min and values.max() <= limits.max):
+                return values.astype(dtype)
+            return values.astype(np.int64)
+        values = values.astype(np.float64)
+        if dtype == np.float32 and not np.array_equal(values.astype(np.float32).astype(np.float64),
+                                                      values.to_numpy(), equal_nan=True):
+            return values
+        return values.astype(dtype)
+    if pd.api.types.is_string_dtype(dtype) or pd.api.types.is_object_dtype(dtype):
+        return raw.astype(dtype)
+    raise ValueError(f"tipo {dtype} não suportado na leitura incremental")
+
+def read_csv_tail(file_path: str, offset: int, like: pd.DataFrame, chunk_size: int = 50000,
+                  encoding: str = "utf-8", **read_kwargs) -> pd.DataFrame:
+    """
+    Lê apenas as linhas de um CSV a partir de uma posição, com as colunas e os tipos do arquivo já carregado
+
+    As linhas novas são lidas como texto e convertidas para o tipo de cada coluna, para que o
+    resultado anexado seja o mesmo da leitura do arquivo inteiro.
+
+    Args:
+        file_path: Caminho do CSV
+        offset: Posição (bytes) do início das linhas novas
+        like: DataFrame já carregado, de onde vêm os nomes (o cabeçalho não é relido) e os tipos
+        chunk_size: Quantidade de linhas por chunk
+        encoding: Codificação do arquivo
+        **read_kwargs: Argumentos extras repassados para pd.read_csv (ex.: sep)
+
+    Returns:
+        pd.DataFrame: Linhas novas com os tipos das colunas carregadas
+
+    Raises:
+        ValueError: Se as linhas novas mudariam o tipo de alguma coluna; o arquivo deve ser relido inteiro
+    """
+    columns = list(like.columns)
+    with open(file_path, "rb") as fh:
+        fh.seek(offset)
+        chunks = list(iter_csv_chunks(fh, chunk_size, encoding=encoding, header=None, names=columns,
+                                      dtype=str, **read_kwargs))
+    if not chunks:
+        return like.iloc[:0]
+    raw = chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
+    return pd.DataFrame({col: _cast_like(raw[col], like[col].dtype) for col in columns})
+
+def append_rows(df: pd.DataFrame, tail: pd.DataFrame) -> pd.DataFrame:
+    """
+    Anexa linhas novas a um DataFrame já tipado
+
+    Colunas categóricas unem as categorias em vez de virarem object; nas demais os tipos
+    só são ampliados quando os valores novos não cabem (ex.: int32 -> int64, vindo de read_csv_tail).
+
+    Args:
+        df: DataFrame carregado
+        tail: Linhas novas, com as mesmas colunas
+
+    Returns:
+        pd.DataFrame: Novo DataFrame com todas as linhas
+    """
+    columns = {}
+    for col in df.columns:
+        old, new = df[col], tail[col]
+        if isinstance(old.dtype, pd.CategoricalDtype):
+            values = new.cat.categories if isinstance(new.dtype, pd.CategoricalDtype) else pd.Index(new.dropna().unique())
+            new = new.astype(pd.CategoricalDtype(old.cat.categories.union(values)))
+            old = old.cat.set_categories(new.cat.categories)
+        columns[col] = pd.concat([old, new], ignore_index=True)
+    return pd.DataFrame(columns)
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Anexa um bloco de memória compartilhada criado pelo processo principal, sem assumir sua posse"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: workers 'spawn' compartilham o resource_tracker do processo principal
+        return shared_memory.SharedMemory(name=name)
+
+def _read_zip_member_from_shm(shm: shared_memory.SharedMemory, size: int, member: str,
+                              chunk_size: int, read_kwargs: dict) -> pd.DataFrame:
+    """Lê um membro de ZIP direto da memória compartilhada, sem copiar o ZIP"""
+    buffer = pa.py_buffer(shm.buf).slice(0, size)
+    with pa.BufferReader(buffer) as reader, zipfile.ZipFile(reader, 'r') as zip_ref:
+        with open_zip_member(zip_ref, zip_ref.getinfo(member)) as stream:
+            return read_csv_chunked(stream, chunk_size=chunk_size, **read_kwargs)
+
+def _read_job_dataframe(job: dict, chunk_size: int) -> pd.DataFrame:
+    """Lê o DataFrame de um job de ingestão (arquivo em disco ou membro de ZIP)"""
+    read_kwargs = job.get('read_kwargs') or {}
+    if 'path' in job:
+        return read_csv_chunked(job['path'], chunk_size=chunk_size, **read_kwargs)
+
+    with zipfile.ZipFile(io.BytesIO(job['zip_data']), 'r') as zip_ref:
+        with open_zip_member(zip_ref, zip_ref.getinfo(job['member'])) as stream:
+            return read_csv_chunked(stream, chunk_size=chunk_size, **read_kwargs)
+
+def _ingest_job_process(job: dict, chunk_size: int) -> bytes:
+    """
+    Executa um job de ingestão em processo separado
+
+    Returns:
+        bytes: DataFrame serializado em Arrow IPC (stream)
+    """
+    if 'zip_shm' in job:
+        shm = _attach_shared_memory(job['zip_shm'])
+        try:
+            df = _read_zip_member_from_shm(shm, job['zip_size'], job['member'], chunk_size,
+                                           job.get('read_kwargs') or {})
+        finally:
+            try:
+                shm.close()
+            except BufferError:
+                # Ainda há buffers presos a um traceback; o mapeamento é liberado pelo GC
+                pass
+    else:
+        df = _read_job_dataframe(job, chunk_size)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    del df
+    sink = pa.BufferOutputStream()
+    with pa_ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+# Pool de processos da ingestão, compartilhado pelas sessões do processo e dimensionado uma única
+# vez (INGEST_WORKERS ou número de CPUs); cada ingestão limita o próprio paralelismo pela
+# quantidade de jobs em andamento, sem redimensionar o pool das outras sessões
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """Pool de processos reaproveitado entre ingestões (spawn, seguro dentro do servidor Streamlit)"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            workers = int(os.getenv("INGEST_WORKERS", "0")) or os.cpu_count() or 1
+            _process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+        return _process_pool
+
+def _reset_process_pool(pool: ProcessPoolExecutor) -> bool:
+    """
+    Descarta o pool quebrado para a próxima ingestão começar num pool novo
+
+    Args:
+        pool: Pool em que a falha ocorreu
+
+    Returns:
+        bool: False se outra sessão já tinha trocado o pool (a falha veio do pool antigo)
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if pool is not _process_pool:
+            return False
+        _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+    return True
+
+def _submit_bounded(pool: ProcessPoolExecutor, jobs: list, chunk_size: int, max_workers: int) -> list:
+    """Envia os jobs ao pool com no máximo max_workers em andamento ao mesmo tempo"""
+    slots = threading.BoundedSemaphore(max_workers)
+    futures = []
+    for job in jobs:
+        slots.acquire()
+        try:
+            future = pool.submit(_ingest_job_process, job, chunk_size)
+        except (BrokenProcessPool, RuntimeError) as e:
+            # Pool quebrado ou encerrado por outra sessão depois de obtido
+            slots.release()
+            future = Future()
+            future.set_exception(BrokenProcessPool(str(e)))
+        else:
+            future.add_done_callback(lambda _: slots.release())
+        futures.append(future)
+    return futures
+
+def ingest_jobs(jobs: list, mode: str = 'auto', max_workers: Optional[int] = None,
+                chunk_size: int = 50000) -> list:
+    """
+    Lê vários CSVs independentes em paralelo
+
+    Cada job é um dict com 'path' (arquivo em disco) ou 'zip_data' e 'member'
+    (membro de um ZIP em memória), e opcionalmente 'read_kwargs' para pd.read_csv. No modo 'process' os ZIPs são publicados
+    uma única vez em memória compartilhada e os DataFrames voltam dos workers
+    como buffers Arrow IPC.
+
+    Args:
+        jobs: Lista de jobs de ingestão
+        mode: 'process', 'thread' ou 'auto' (processos apenas para volumes grandes)
+        max_workers: Limite de jobs lidos ao mesmo tempo (padrão: número de CPUs); no modo 'process'
+            também limitado pelo tamanho do pool compartilhado (INGEST_WORKERS)
+        chunk_size: Linhas por chunk na leitura
+
+    Returns:
+        list: (DataFrame ou None, mensagem de erro ou None) para cada job, na mesma ordem
+    """
+    if not jobs:
+        return []
+
+    max_workers = max(1, min(len(jobs), max_workers or os.cpu_count() or 1))
+
+    if mode == 'auto':
+        total_bytes = sum(job.get('size', 0) for job in jobs)
+        mode = 'process' if len(jobs) > 1 and total_bytes >= PROCESS_INGEST_MIN_BYTES else 'thread'
+    if mode == 'process' and pa is None:
+        mode = 'thread'
+
+    results = []
+
+    if mode == 'thread':
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_read_job_dataframe, job, chunk_size) for job in jobs]
+            for future in futures:
+                try:
+                    results.append((future.result(), None))
+                except Exception as e:
+                    results.append((None, str(e)))
+        return results
+
+    # Publica cada ZIP distinto uma vez em memória compartilhada
+    segments = {}
+    process_jobs = []
+    try:
+        for job in jobs:
+            if 'zip_data' not in job:
+                process_jobs.append(job)
+                continue
+            data = job['zip_data']
+            if id(data) not in segments:
+                shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+                shm.buf[:len(data)] = data
+                segments[id(data)] = shm
+            shm = segments[id(data)]
+            process_jobs.append({'zip_shm': shm.name, 'zip_size': len(data), 'member': job['member'],
+                                 'read_kwargs': job.get('read_kwargs')})
+
+        results = [None] * len(process_jobs)
+        for attempt in range(2):
+            pending = [i for i, result in enumerate(results) if result is None]
+            if not pending:
+                break
+            pool = _get_process_pool()
+            futures = _submit_bounded(pool, [process_jobs[i] for i in pending], chunk_size, max_workers)
+            for i, future in zip(pending, futures):
+                try:
+                    payload = future.result()
+                    table = pa_ipc.open_stream(pa.py_buffer(payload)).read_all()
+                    results[i] = (table.to_pandas(split_blocks=True), None)
+                except (BrokenProcessPool, CancelledError) as e:
+                    # Um worker morreu (ex.: falta de memória) e o pool é recriado. Jobs de um pool que
+                    # outra falha (desta ou de outra sessão) já descartou vão uma vez para o pool novo
+                    if not _reset_process_pool(pool) and attempt == 0:
+                        continue
+                    results[i] = (None, str(e) or "o processo de ingestão foi encerrado")
+                except Exception as e:
+                    results[i] = (None, str(e))
+    finally:
+        for shm in segments.values():
+            shm.close()
+            shm.unlink()
+
+    return results
+
+def content_hash(data: bytes) -> str:
+    """
+    Calcula o hash do conteúdo de um upload
+
+    Args:
+        data: Bytes do arquivo
+
+    Returns:
+        str: Hash hexadecimal (mesmo algoritmo de file_fingerprint)
+    """
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def remove_temp_path(path: str) -> None:
+    """Remove arquivo ou diretório temporário, ignorando erros"""
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+    except OSError:
+        pass
+
+# Registros de upload vivos no processo (um por sessão): a limpeza de temporários não apaga o que eles usam
+_live_registries = weakref.WeakSet()
+_live_registries_lock = threading.Lock()
+
+class UploadRegistry:
+    """Registro de uploads já processados, endereçado pelo hash do conteúdo e com despejo LRU"""
+
+    def __init__(self, max_bytes: int = 2 * 1024 ** 3, on_evict: Optional[Callable[[dict], None]] = None):
+        """
+        Args:
+            max_bytes: Limite da soma dos tamanhos dos uploads mantidos
+            on_evict: Função chamada com a entrada removida do registro
+        """
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        with _live_registries_lock:
+            _live_registries.add(self)
+
+    def get(self, key: str) -> Optional[dict]:
+        """Retorna a entrada do upload e a marca como usada recentemente"""
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            entry['last_used'] = time.time()
+        return entry
+
+    def add(self, key: str, name: str, size: int, paths: list, file_types: list,
+            sources: Optional[list] = None) -> dict:
+        """
+        Registra um upload processado e despeja os mais antigos se o limite for excedido
+
+        Args:
+            key: Hash do conteúdo
+            name: Nome original do arquivo
+            size: Tamanho em bytes
+            paths: Arquivos/diretórios temporários associados ao upload
+            file_types: Tipos carregados a partir do upload
+            sources: Origens registradas em file_info['path'] (padrão: paths)
+
+        Returns:
+            dict: Entrada registrada
+        """
+        if key in self.entries:
+            self._evict(key)
+
+        entry = {
+            'name': name,
+            'size': size,
+            'paths': list(paths),
+            'file_types': list(file_types),
+            'sources': list(sources if sources is not None else paths),
+            'last_used': time.time()
+        }
+        self.entries[key] = entry
+        self.total_bytes += size
+
+        # Nunca despeja a entrada recém-adicionada
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            self._evict(next(iter(self.entries)))
+
+        return entry
+
+    def _evict(self, key: str) -> None:
+        """Remove a entrada e apaga seus arquivos temporários"""
+        entry = self.entries.pop(key)
+        self.total_bytes -= entry['size']
+        for path in entry['paths']:
+            remove_temp_path(path)
+        if self.on_evict is not None:
+            self.on_evict(entry)
+
+    def clear(self) -> None:
+        """Remove todas as entradas"""
+        for key in list(self.entries):
+            self._evict(key)
+
+    def referenced_paths(self) -> set:
+        """Caminhos temporários ainda em uso pelo registro"""
+        return {path for entry in self.entries.values() for path in entry['paths']}
+
+def cleanup_orphaned_temp_files(keep_paths: Optional[set] = None, max_age_hours: float = 24) -> int:
+    """
+    Apaga arquivos temporários da aplicação que ficaram para trás
+
+    Os caminhos de qualquer UploadRegistry vivo no processo nunca são removidos: uma sessão
+    aberta há mais de max_age_hours continua usando seus temporários.
+
+    Args:
+        keep_paths: Caminhos que ainda estão em uso e não podem ser removidos
+        max_age_hours: Idade mínima (pelo mtime) para considerar o arquivo órfão
+
+    Returns:
+        int: Quantidade de itens removidos
+    """
+    with _live_registries_lock:
+        registries = list(_live_registries)
+    keep_paths = set(keep_paths or set()).union(*(registry.referenced_paths() for registry in registries))
+    keep_paths = {os.path.abspath(path) for path in keep_paths}
+    temp_root = tempfile.gettempdir()
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+
+    for name in os.listdir(temp_root):
+        if not name.startswith(TEMP_PREFIX):
+            continue
+        path = os.path.join(temp_root, name)
+        try:
+            if os.path.abspath(path) in keep_paths or os.path.getmtime(path) > cutoff:
+                continue
+        except OSError:
+            continue
+        remove_temp_path(path)
+        removed += 1
+
+    return removed
+
+class ColumnarCache:
+    """Cache em disco dos DataFrames já tipados, em Arrow IPC (Feather v2) sem compressão"""
+
+    def __init__(self, cache_dir: str, max_bytes: int = 10 * 1024 ** 3):
+        """
+        Args:
+            cache_dir: Diretório onde os arquivos .arrow são gravados
+            max_bytes: Limite do tamanho total do diretório de cache
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional['ColumnarCache']:
+        """
+        Cria o cache a partir de CSV_CACHE_DIR e CSV_CACHE_MAX_MB
+
+        Returns:
+            ColumnarCache: Instância configurada ou None se o cache estiver desativado
+        """
+        max_mb = float(os.getenv("CSV_CACHE_MAX_MB", "10240"))
+        if pa is None or max_mb <= 0:
+            return None
+        try:
+            return cls(os.getenv("CSV_CACHE_DIR", ".csv_cache"), int(max_mb * 1024 ** 2))
+        except OSError:
+            return None
+
+    def path_for(self, key: str) -> str:
+        """Caminho do arquivo de cache para o hash informado"""
+        return os.path.join(self.cache_dir, f"v{COLUMNAR_CACHE_VERSION}_{key}.arrow")
+
+    def load(self, key: str) -> Optional[pd.DataFrame]:
+        """
+        Lê o DataFrame do cache por memory-map
+
+        Colunas numéricas sem nulos são expostas sem cópia a partir do mapeamento.
+
+        Args:
+            key: Hash do conteúdo do CSV de origem
+
+        Returns:
+            pd.DataFrame: DataFrame em cache ou None se não existir
+        """
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with pa.memory_map(path, 'r') as source:
+                table = pa_ipc.open_file(source).read_all()
+            df = table.to_pandas(split_blocks=True)
+            # Atualiza o mtime para o despejo LRU
+            os.utime(path)
+            return df
+        except (OSError, pa.ArrowException):
+            remove_temp_path(path)
+            return None
+
+    def read_rows(self, key: str, start: int, count: int) -> Optional[pd.DataFrame]:
+        """
+        Lê só uma janela de linhas do arquivo em cache
+
+        O arquivo é mapeado em memória e apenas a janela é convertida para pandas, então o
+        custo não depende do tamanho do arquivo.
+
+        Args:
+            key: Hash do conteúdo do CSV de origem
+            start: Primeira linha (base 0)
+            count: Quantidade de linhas
+
+        Returns:
+            pd.DataFrame: Linhas da janela ou None se o arquivo não estiver em cache
+        """
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with pa.memory_map(path, 'r') as source:
+                table = pa_ipc.open_file(source).read_all()
+                return table.slice(start, count).to_pandas()
+        except (OSError, pa.ArrowException):
+            return None
+
+    def store(self, key: str, df: pd.DataFrame) -> bool:
+        """
+        Grava o DataFrame no cache e despeja os arquivos mais antigos se necessário
+
+        Args:
+            key: Hash do conteúdo do CSV de origem
+            df: DataFrame já tipado
+
+        Returns:
+            bool: True se gravado
+        """
+        path = self.path_for(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            with pa_ipc.new_file(tmp_path, table.schema) as writer:
+                writer.write_table(table)
+            # Troca atômica para que leitores nunca vejam arquivo incompleto
+            os.replace(tmp_path, path)
+        except (OSError, pa.ArrowException, ValueError, TypeError):
+            remove_temp_path(tmp_path)
+            return False
+
+        self.evict(keep=path)
+        return True
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Remove os arquivos menos usados até o cache caber em max_bytes"""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.arrow'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            remove_temp_path(path)
+            total -= size
 
 def format_currency(value: Union[float, int]) -> str:
     """
@@ -239,6 +1202,49 @@ def parse_currency(value: str) -> float:
     except:
         return 0.0
 
+def parse_currency_series(series: pd.Series, fill_value: Optional[float] = None) -> pd.Series:
+    """
+    Converte uma coluna de valores em formato brasileiro para float, de forma vetorizada
+
+    Aceita "R$ 1.234,56", "1234,56", "1.234" (milhar) e "10.5" (decimal com ponto).
+    Colunas já numéricas são devolvidas sem alteração.
+
+    Args:
+        series: Coluna a converter
+        fill_value: Valor para células vazias ou inválidas (padrão: NaN)
+
+    Returns:
+        pd.Series: Coluna numérica
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        result = series
+    elif isinstance(series.dtype, pd.CategoricalDtype):
+        # Converte apenas as categorias distintas e reaproveita os códigos
+        categories = parse_currency_series(pd.Series(series.cat.categories)).to_numpy(dtype=float)
+        codes = series.cat.codes.to_numpy()
+        values = np.where(codes >= 0, categories[codes] if len(categories) else np.nan, np.nan)
+        result = pd.Series(values, index=series.index, name=series.name)
+    else:
+        # Substituições literais são bem mais rápidas que uma regex equivalente
+        text = (series.astype('string')
+                .str.replace('R$', '', regex=False)
+                .str.replace('\xa0', '', regex=False)
+                .str.replace(' ', '', regex=False))
+        # Ponto é separador de milhar quando há vírgula decimal ou quando só agrupa milhares
+        thousands = (text.str.contains(',', regex=False) |
+                     text.str.fullmatch(r'-?\d{1,3}(?:\.\d{3})+')).fillna(False).astype(bool)
+        text = text.mask(thousands, text.str.replace('.', '', regex=False))
+        text = text.str.replace(',', '.', regex=False)
+        try:
+            result = text.astype(float)
+        except ValueError:
+            # Há células inválidas: converte elemento a elemento, marcando-as como NaN
+            result = pd.to_numeric(text, errors='coerce').astype(float)
+
+    if fill_value is not None:
+        result = result.fillna(fill_value)
+    return result
+
 def validate_date_format(date_str: str) -> bool:
     """
     Valida se a data está no formato esperado (AAAA-MM-DD HH:MM:SS)
@@ -282,7 +1288,7 @@ def clean_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     for col in cleaned_df.columns:
         if 'valor' in col.lower() or 'preco' in col.lower():
             try:
-                cleaned_df[col] = cleaned_df[col].apply(lambda x: parse_currency(x) if pd.notna(x) else 0.0)
+                cleaned_df[col] = parse_currency_series(cleaned_df[col], fill_value=0.0)
             except:
                 pass
     